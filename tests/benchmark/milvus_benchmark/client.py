@@ -1,12 +1,18 @@
 import random
 import logging
 import time
+import json
 # import traceback
 from multiprocessing import Process
+import numpy as np
 from pymilvus import Milvus, DataType
+from pymilvus.client import ts_utils
+from pymilvus.client.prepare import Prepare
+from pymilvus.client.types import get_consistency_level
 import utils as util
 import config
 from milvus_benchmark.runners import utils
+from milvus_benchmark.runners import filters
 
 logger = logging.getLogger("milvus_benchmark.client")
 
@@ -25,6 +31,7 @@ INDEX_MAP = {
 epsilon = 0.1
 DEFAULT_WARM_QUERY_TOPK = 1
 DEFAULT_WARM_QUERY_NQ = 1
+BINARY_METRIC_TYPES = ["HAMMING", "JACCARD", "TANIMOTO", "SUBSTRUCTURE", "SUPERSTRUCTURE"]
 
 
 def time_wrapper(func):
@@ -53,6 +60,64 @@ def time_wrapper(func):
     return wrapper
 
 
+class PreparedSearch(object):
+    """
+    A search request built once and replayed by MilvusClient.search_prepared:
+    the requests are built by the request builder of pymilvus from a float32 (or packed uint8 for binary) ndarray,
+    in the same batches of nq as MilvusClient.query, so that no encoding is left for the requests.
+    Only the guarantee timestamp is set again at every replay, from the consistency level of the collection.
+    """
+
+    def __init__(self, handler, collection_name, anns_field, data, param, limit, expression=None,
+                 guarantee_timestamp=None, partition_names=None, round_decimal=-1):
+        start_time = time.perf_counter()
+        self.collection_name = collection_name
+        self.anns_field = anns_field
+        self.metric_type = param["metric_type"]
+        self.binary = self.metric_type in BINARY_METRIC_TYPES
+        self.vectors = self.as_array(data, self.binary)
+        self.nq = len(self.vectors)
+        self.topk = limit
+        self.expression = expression
+        self.guarantee_timestamp = guarantee_timestamp
+        self.round_decimal = round_decimal
+        schema = handler.describe_collection(collection_name)
+        self.collection_id = schema["collection_id"]
+        self.auto_id = schema["auto_id"]
+        self.consistency_level = get_consistency_level(schema["consistency_level"])
+        data = [row.tobytes() for row in self.vectors] if self.binary else self.vectors
+        self.requests = Prepare.search_requests_with_expr(collection_name, data, anns_field, param, limit,
+                                                          expression, partition_names, None, round_decimal,
+                                                          schema=schema, **self.search_kwargs())
+        # the client side cost of the requests, paid once instead of in every search
+        self.encode_time = time.perf_counter() - start_time
+
+    @staticmethod
+    def as_array(data, binary=False):
+        """ The query vectors as a C-contiguous little endian float32 ndarray, or uint8 of packed bits for binary """
+        if binary:
+            if len(data) and isinstance(data[0], bytes):
+                return np.frombuffer(b"".join(data), dtype=np.uint8).reshape(len(data), -1)
+            return np.ascontiguousarray(data, dtype=np.uint8)
+        return np.ascontiguousarray(data, dtype="<f4")
+
+    def search_kwargs(self):
+        """ The guarantee timestamp of a search sent now, the same as pymilvus sets for MilvusClient.query """
+        kwargs = {}
+        if self.guarantee_timestamp is not None:
+            kwargs["guarantee_timestamp"] = self.guarantee_timestamp
+        ts_utils.construct_guarantee_ts(self.consistency_level, self.collection_id, kwargs)
+        return kwargs
+
+    @property
+    def size(self):
+        return sum(request.ByteSize() for request in self.requests)
+
+    def __str__(self):
+        return "PreparedSearch %s nq: %d, topk: %d, expression: %s, %d requests of %d bytes" % (
+            self.collection_name, self.nq, self.topk, self.expression, len(self.requests), self.size)
+
+
 class MilvusClient(object):
     def __init__(self, collection_name=None, host=None, port=None, timeout=300):
         self._collection_name = collection_name
@@ -63,6 +128,8 @@ class MilvusClient(object):
             host = config.SERVER_HOST_DEFAULT
         if not port:
             port = config.SERVER_PORT_DEFAULT
+        self._host = host
+        self._port = port
         # retry connect remote server
         i = 0
         while time.time() < start_time + timeout:
@@ -297,7 +364,7 @@ class MilvusClient(object):
         """ This method corresponds to the search method of milvus """
         tmp_collection_name = self._collection_name if collection_name is None else collection_name
 
-        params = util.search_param_analysis(vector_query, filter_query)
+        params = util.search_param_analysis(vector_query, filters.filter_expression(filter_query))
         params.update({"timeout": timeout})
 
         if guarantee_timestamp is not None:
@@ -314,6 +381,30 @@ class MilvusClient(object):
         # result = self._milvus.search(tmp_collection_name, query, timeout=timeout)
         return result
 
+    def prepare_search(self, vector_query, filter_query=None, collection_name=None, guarantee_timestamp=None):
+        """ Build the search request of query once, to be replayed by search_prepared """
+        tmp_collection_name = self._collection_name if collection_name is None else collection_name
+        params = util.search_param_analysis(vector_query, filters.filter_expression(filter_query))
+        if params is False:
+            raise Exception("Search params not supported: %s, %s" % (str(vector_query), str(filter_query)))
+        prepared = PreparedSearch(self._milvus.handler, tmp_collection_name, params["anns_field"], params["data"],
+                                  params["param"], params["limit"], expression=params["expression"],
+                                  guarantee_timestamp=guarantee_timestamp)
+        logger.debug("%s encoded in %.4fs" % (str(prepared), prepared.encode_time))
+        return prepared
+
+    @time_wrapper
+    def search_prepared(self, prepared, timeout=300):
+        """
+        Send the requests of a PreparedSearch on the handler of this connection, a prepared search can be replayed
+        by any connection, the result is the same as the one of query
+        """
+        kwargs = prepared.search_kwargs()
+        for request in prepared.requests:
+            request.guarantee_timestamp = kwargs["guarantee_timestamp"] if "guarantee_timestamp" in kwargs else 0
+        return self._milvus.handler._execute_search_requests(prepared.requests, timeout, auto_id=prepared.auto_id,
+                                                             round_decimal=prepared.round_decimal)
+
     @time_wrapper
     def warm_query(self, index_field_name, search_param, metric_type, times=2):
         query_vectors = [[random.random() for _ in range(self._dimension)] for _ in range(DEFAULT_WARM_QUERY_NQ)]
@@ -339,13 +430,9 @@ class MilvusClient(object):
     @time_wrapper
     def load_and_query(self, vector_query, filter_query=None, collection_name=None, timeout=120):
         tmp_collection_name = self._collection_name if collection_name is None else collection_name
-        must_params = [vector_query]
-        if filter_query:
-            must_params.extend(filter_query)
-
         self.load_collection(tmp_collection_name)
 
-        params = util.search_param_analysis(vector_query, filter_query)
+        params = util.search_param_analysis(vector_query, filters.filter_expression(filter_query))
         params.update({"timeout": timeout})
         result = self._milvus.search(tmp_collection_name, **params)
 
@@ -5,7 +5,10 @@ import numpy as np
 
 from milvus_benchmark import parser
 from milvus_benchmark.runners import utils
+from milvus_benchmark.runners import ground_truth
+from milvus_benchmark.runners import filters as filter_compiler
 from milvus_benchmark.runners.base import BaseRunner
+from milvus_benchmark.runners.dataset import iter_hdf5_batches
 
 logger = logging.getLogger("milvus_benchmark.runners.accuracy")
 INSERT_INTERVAL = 50000
@@ -31,27 +34,20 @@ class AccuracyRunner(BaseRunner):
             "collection_size": collection_size
         }
         index_info = self.milvus.describe_index(index_field_name, collection_name)
-        filters = collection["filters"] if "filters" in collection else []
-        filter_query = []
+        # compiled once for all the cases, with the selectivity of every filter
+        filters = filter_compiler.get_case_filters(collection, collection_size)
         top_ks = collection["top_ks"]
         nqs = collection["nqs"]
         guarantee_timestamp = collection["guarantee_timestamp"] if "guarantee_timestamp" in collection else None
+        # auto: the precomputed sift neighbors if they match the case, else the exact neighbors computed locally
+        ground_truth_type = collection["ground_truth"] if "ground_truth" in collection else "auto"
         search_params = collection["search_params"]
         search_params = utils.generate_combinations(search_params)
         cases = list()
         case_metrics = list()
         self.init_metric(self.name, collection_info, index_info, search_info=None)
         for search_param in search_params:
-            if not filters:
-                filters.append(None)
-            for filter in filters:
-                filter_param = []
-                if isinstance(filter, dict) and "range" in filter:
-                    filter_query.append(eval(filter["range"]))
-                    filter_param.append(filter["range"])
-                if isinstance(filter, dict) and "term" in filter:
-                    filter_query.append(eval(filter["term"]))
-                    filter_param.append(filter["term"])
+            for filter_query in filters:
                 for nq in nqs:
                     query_vectors = base_query_vectors[0:nq]
                     for top_k in top_ks:
@@ -68,9 +64,9 @@ class AccuracyRunner(BaseRunner):
                             "nq": nq,
                             "topk": top_k,
                             "search_param": search_param,
-                            "filter": filter_param,
                             "guarantee_timestamp": guarantee_timestamp
                         }
+                        case_metric.search.update(filter_compiler.filter_metric(filter_query))
                         vector_query = {"vector": {index_field_name: search_info}}
                         case = {
                             "collection_name": collection_name,
@@ -82,12 +78,27 @@ class AccuracyRunner(BaseRunner):
                             "collection_size": collection_size,
                             "filter_query": filter_query,
                             "vector_query": vector_query,
-                            "guarantee_timestamp": guarantee_timestamp
+                            "guarantee_timestamp": guarantee_timestamp,
+                            "ground_truth": ground_truth_type
                         }
                         cases.append(case)
                         case_metrics.append(case_metric)
         return cases, case_metrics
 
+    @staticmethod
+    def get_true_ids(case_param, top_k):
+        collection_size = case_param["collection_size"]
+        data_type = case_param["data_type"]
+        filter_query = case_param["filter_query"]
+        ground_truth_type = case_param["ground_truth"] if "ground_truth" in case_param else "auto"
+        if ground_truth_type != "exact" and \
+                ground_truth.has_precomputed_ground_truth(data_type, collection_size, filter_query):
+            return utils.get_ground_truth_ids(collection_size)
+        search_info = case_param["vector_query"]["vector"][case_param["index_field_name"]]
+        return ground_truth.get_dataset_ground_truth(data_type, case_param["dimension"], collection_size,
+                                                     search_info["query"], top_k, case_param["metric_type"],
+                                                     filter_query=filter_query)
+
     def prepare(self, **case_param):
         collection_name = case_param["collection_name"]
         self.milvus.set_collection(collection_name)
@@ -96,17 +107,18 @@ class AccuracyRunner(BaseRunner):
         self.milvus.load_collection(timeout=600)
 
     def run_case(self, case_metric, **case_param):
-        collection_size = case_param["collection_size"]
         nq = case_metric.search["nq"]
         top_k = case_metric.search["topk"]
         query_res = self.milvus.query(case_param["vector_query"], filter_query=case_param["filter_query"],
                                       guarantee_timestamp=case_param["guarantee_timestamp"])
-        true_ids = utils.get_ground_truth_ids(collection_size)
-        logger.debug({"true_ids": [len(true_ids[0]), len(true_ids[0])]})
+        true_ids = self.get_true_ids(case_param, top_k)
+        logger.debug({"true_ids": list(true_ids.shape)})
         result_ids = self.milvus.get_ids(query_res)
         logger.debug({"result_ids": len(result_ids[0])})
-        acc_value = utils.get_recall_value(true_ids[:nq, :top_k].tolist(), result_ids)
+        acc_value = utils.get_recall_value(true_ids[:nq, :top_k], result_ids)
         tmp_result = {"acc": acc_value}
+        recall_values = utils.get_recall_values(true_ids[:nq], result_ids)
+        tmp_result.update({"recall@%d" % k: v for k, v in recall_values.items() if k < top_k})
         return tmp_result
 
 
@@ -140,8 +152,8 @@ class AccAccuracyRunner(AccuracyRunner):
             "metric_type": metric_type,
             "dataset_name": collection_name
         }
-        filters = collection["filters"] if "filters" in collection else []
-        filter_query = []
+        # the ids of the train vectors are [0, rows), their scalar fields hold the ids
+        filters = filter_compiler.get_case_filters(collection, dataset["train"].shape[0])
         # Convert list data into a set of dictionary data
         search_params = utils.generate_combinations(search_params)
         index_params = utils.generate_combinations(index_params)
@@ -158,16 +170,7 @@ class AccAccuracyRunner(AccuracyRunner):
                     "index_param": index_param
                 }
                 for search_param in search_params:
-                    if not filters:
-                        filters.append(None)
-                    for filter in filters:
-                        filter_param = []
-                        if isinstance(filter, dict) and "range" in filter:
-                            filter_query.append(eval(filter["range"]))
-                            filter_param.append(filter["range"])
-                        if isinstance(filter, dict) and "term" in filter:
-                            filter_query.append(eval(filter["term"]))
-                            filter_param.append(filter["term"])
+                    for filter_query in filters:
                         for nq in nqs:
                             query_vectors = utils.normalize(metric_type, np.array(dataset["test"][:nq]))
                             for top_k in top_ks:
@@ -185,9 +188,9 @@ class AccAccuracyRunner(AccuracyRunner):
                                     "nq": nq,
                                     "topk": top_k,
                                     "search_param": search_param,
-                                    "filter": filter_param,
                                     "guarantee_timestamp": guarantee_timestamp
                                 }
+                                case_metric.search.update(filter_compiler.filter_metric(filter_query))
                                 vector_query = {"vector": {index_field_name: search_info}}
                                 case = {
                                     "collection_name": collection_name,
@@ -226,36 +229,27 @@ class AccAccuracyRunner(AccuracyRunner):
             self.milvus.drop()
         dataset = case_param["dataset"]
         self.milvus.create_collection(dimension, data_type=vector_type)
-        # Get the data set train for inserting into the collection
-        insert_vectors = utils.normalize(metric_type, np.array(dataset["train"]))
-        if len(insert_vectors) != dataset["train"].shape[0]:
-            raise Exception("Row count of insert vectors: %d is not equal to dataset size: %d" % (
-                len(insert_vectors), dataset["train"].shape[0]))
-        logger.debug("The row count of entities to be inserted: %d" % len(insert_vectors))
-        # Insert batch once
-        # milvus_instance.insert(insert_vectors)
+        # Get the data set train for inserting into the collection, read chunk by chunk
+        train = dataset["train"]
+        logger.debug("The row count of entities to be inserted: %d" % train.shape[0])
         info = self.milvus.get_info(collection_name)
-        loops = len(insert_vectors) // INSERT_INTERVAL + 1
-        for i in range(loops):
-            start = i * INSERT_INTERVAL
-            end = min((i + 1) * INSERT_INTERVAL, len(insert_vectors))
-            if start < end:
-                # Insert up to INSERT_INTERVAL=50000 at a time
-                tmp_vectors = insert_vectors[start:end]
+        start = 0
+        for batch in iter_hdf5_batches(train, INSERT_INTERVAL):
+            # Insert up to INSERT_INTERVAL=50000 at a time
+            for offset in range(0, len(batch), INSERT_INTERVAL):
+                tmp_vectors = utils.normalize(metric_type, batch[offset:offset + INSERT_INTERVAL])
+                end = start + len(tmp_vectors)
                 ids = [i for i in range(start, end)]
-                if not isinstance(tmp_vectors, list):
-                    entities = utils.generate_entities(info, tmp_vectors.tolist(), ids)
-                    res_ids = self.milvus.insert(entities)
-                else:
-                    entities = utils.generate_entities(tmp_vectors, ids)
-                    res_ids = self.milvus.insert(entities)
+                entities = utils.generate_entities(info, tmp_vectors, ids)
+                res_ids = self.milvus.insert(entities)
                 assert res_ids == ids
+                start = end
         logger.debug("End insert, start flush")
         self.milvus.flush()
         logger.debug("End flush")
         res_count = self.milvus.count()
         logger.info("Table: %s, row count: %d" % (collection_name, res_count))
-        if res_count != len(insert_vectors):
+        if res_count != train.shape[0]:
             raise Exception("Table row count is not equal to insert vectors")
         if self.milvus.describe_index(index_field_name):
             self.milvus.drop_index(index_field_name)
@@ -283,8 +277,10 @@ class AccAccuracyRunner(AccuracyRunner):
                                       guarantee_timestamp=case_param["guarantee_timestamp"])
         result_ids = self.milvus.get_ids(query_res)
         # Calculate the accuracy of the result of query
-        acc_value = utils.get_recall_value(true_ids[:nq, :top_k].tolist(), result_ids)
+        acc_value = utils.get_recall_value(true_ids[:nq, :top_k], result_ids)
         tmp_result = {"acc": acc_value}
+        recall_values = utils.get_recall_values(true_ids[:nq], result_ids)
+        tmp_result.update({"recall@%d" % k: v for k, v in recall_values.items() if k < top_k})
         # Return accuracy results for reporting
         return tmp_result
 
@@ -3,11 +3,13 @@ import pdb
 import logging
 import traceback
 import grpc
-import numpy as np
 
 from milvus_benchmark.env import get_env
 from milvus_benchmark.client import MilvusClient
 from . import utils
+from .dataset import DatasetReader
+from .insert_pipeline import InsertPipeline
+from .ground_truth import generate_local_vectors
 
 logger = logging.getLogger("milvus_benchmark.runners.base")
 
@@ -73,7 +75,7 @@ class BaseRunner(object):
         # start insert vectors
         end_id = start_id + len(vectors)
         logger.debug("Start id: %s, end id: %s" % (start_id, end_id))
-        ids = [k for k in range(start_id, end_id)]
+        ids = list(range(start_id, end_id))
         entities = utils.generate_entities(info, vectors, ids)
         ni_start_time = time.time()
         try:
@@ -88,9 +90,25 @@ class BaseRunner(object):
         logger.debug(milvus.count())
         return ni_end_time-ni_start_time
 
+    @staticmethod
+    def iter_insert_batches(data_type, dimension, size, ni):
+        """ Yield (start_id, vectors) of the data to be inserted """
+        if data_type == "local" or not data_type:
+            # seeded by id, so that the exact ground truth can generate the same vectors again
+            for start_id in range(0, size, ni):
+                yield start_id, generate_local_vectors(start_id, ni, dimension)
+        else:
+            # batches are views over the memory-mapped files
+            reader = DatasetReader(data_type, dimension)
+            for start_id, vectors in reader.iter_batches(size, ni):
+                yield start_id, vectors
+
     # TODO: need to improve
-    def insert(self, milvus, collection_name, data_type, dimension, size, ni):
-        """ insert data to collection before testing """
+    def insert(self, milvus, collection_name, data_type, dimension, size, ni, workers=1):
+        """
+        insert data to collection before testing
+        workers: the count of connections inserting concurrently
+        """
         total_time = 0.0
         rps = 0.0
         ni_time = 0.0
@@ -102,51 +120,14 @@ class BaseRunner(object):
             """
             logger.error("Not invalid collection size or ni")
             return False
-        i = 0
         info = milvus.get_info(collection_name)
-        if data_type == "local" or not data_type:
-            # insert local
-            info = milvus.get_info(collection_name)
-            while i < (size // vectors_per_file):
-                vectors = []
-                for j in range(vectors_per_file // ni):
-                    # vectors = src_vectors[j * ni:(j + 1) * ni]
-                    vectors = utils.generate_vectors(ni, dimension)
-                    if vectors:
-                        start_id = i * vectors_per_file + j * ni
-                        ni_time = self.insert_core(milvus, info, start_id, vectors)
-                        total_time = total_time+ni_time
-                i += 1
-        else:
-            # insert from file
-            while i < (size // vectors_per_file):
-                vectors = []
-                if vectors_per_file >= ni:
-                    # Get the path of the specified file
-                    file_name = utils.gen_file_name(i, dimension, data_type)
-                    # logger.info("Load npy file: %s start" % file_name)
-                    # Load file content
-                    data = np.load(file_name)
-                    # logger.info("Load npy file: %s end" % file_name)
-                    for j in range(vectors_per_file // ni):
-                        vectors = data[j * ni:(j + 1) * ni].tolist()
-                        if vectors:
-                            start_id = i * vectors_per_file + j * ni
-                            ni_time = self.insert_core(milvus, info, start_id, vectors)
-                            total_time = total_time+ni_time
-                    i += 1
-                else:
-                    vectors.clear()
-                    loops = ni // vectors_per_file
-                    for j in range(loops):
-                        file_name = utils.gen_file_name(loops * i + j, dimension, data_type)
-                        data = np.load(file_name)
-                        vectors.extend(data.tolist())
-                    if vectors:
-                        start_id = i * vectors_per_file
-                        ni_time = self.insert_core(milvus, info, start_id, vectors)
-                        total_time = total_time+ni_time
-                    i += loops
+        batches = self.iter_insert_batches(data_type, dimension, size, ni)
+        if workers > 1:
+            pipeline = InsertPipeline(self.hostname, self.port, collection_name, workers)
+            return pipeline.run(info, batches, size, ni)
+        for start_id, vectors in batches:
+            ni_time = self.insert_core(milvus, info, start_id, vectors)
+            total_time = total_time+ni_time
         rps = round(size / total_time, 2)
         ni_time = round(total_time / (size / ni), 2)
         result = {
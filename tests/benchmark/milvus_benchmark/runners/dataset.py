@@ -0,0 +1,88 @@
+import os
+import logging
+import numpy as np
+
+from . import utils
+
+logger = logging.getLogger("milvus_benchmark.runners.dataset")
+
+def load_npy(file_name):
+    """ Memory-map a npy file, rows are only read from disk when they are sliced and sent """
+    return np.load(file_name, mmap_mode='r')
+
+
+def iter_npy_batches(data, ni):
+    """ Yield views of ni rows over a (memory-mapped) array, no data is copied """
+    for start in range(0, data.shape[0], ni):
+        yield data[start:start + ni]
+
+
+def iter_hdf5_batches(dataset, ni):
+    """
+    Yield batches of about ni rows from a h5py dataset
+    the batch size is rounded up to the chunk rows, so every chunk is decompressed only once
+    """
+    rows = dataset.shape[0]
+    batch_size = ni
+    if dataset.chunks:
+        chunk_rows = dataset.chunks[0]
+        batch_size = max(chunk_rows, (ni // chunk_rows) * chunk_rows)
+    for start in range(0, rows, batch_size):
+        yield dataset[start:min(start + batch_size, rows)]
+
+
+def prefetch_file(file_name):
+    """
+    Ask the kernel to read the file ahead into the page cache, so that the following mmap access hits it,
+    the read is done by the kernel and returns at once: a thread of this process is a greenlet once locust
+    patched the standard library, and a blocking read loop in it would stall the hub instead
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return False
+    try:
+        fd = os.open(file_name, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+    except OSError as e:
+        logger.warning("Prefetch file: %s failed: %s" % (file_name, str(e)))
+        return False
+    return True
+
+
+class DatasetReader(object):
+    """
+    Read the vectors of the given data type from the npy files on NAS,
+    yield (start_id, vectors) batches of ni rows for insert
+    """
+
+    def __init__(self, data_type, dimension, prefetch=True):
+        self.data_type = data_type
+        self.dimension = dimension
+        self.prefetch = prefetch
+        self.vectors_per_file = utils.get_len_vectors_per_file(data_type, dimension)
+
+    def file_name(self, index):
+        return utils.gen_file_name(index, self.dimension, self.data_type)
+
+    def _prefetch(self, index, file_count):
+        if self.prefetch and index < file_count:
+            prefetch_file(self.file_name(index))
+
+    def iter_batches(self, size, ni):
+        file_count = size // self.vectors_per_file
+        if self.vectors_per_file >= ni:
+            for i in range(file_count):
+                data = load_npy(self.file_name(i))
+                self._prefetch(i + 1, file_count)
+                for j, vectors in enumerate(iter_npy_batches(data[:self.vectors_per_file], ni)):
+                    yield i * self.vectors_per_file + j * ni, vectors
+        else:
+            # one batch spans several files, the only case that needs a copy
+            loops = ni // self.vectors_per_file
+            for i in range(0, file_count, loops):
+                for j in range(loops):
+                    self._prefetch(i + loops + j, file_count)
+                vectors = np.concatenate([load_npy(self.file_name(i + j)) for j in range(loops)])
+                yield i * self.vectors_per_file, vectors
@@ -0,0 +1,367 @@
+import ast
+import json
+import logging
+import operator
+import numpy as np
+
+logger = logging.getLogger("milvus_benchmark.runners.filters")
+
+# suite operator -> expression operator and numpy comparison
+COMPARE_OPERATORS = [("GT", ">", np.greater), ("GTE", ">=", np.greater_equal), ("LT", "<", np.less),
+                     ("LTE", "<=", np.less_equal), ("EQ", "==", np.equal), ("NE", "!=", np.not_equal)]
+ARRAY_FUNCTIONS = ["array_contains", "array_contains_any", "array_contains_all"]
+# the functions and operators a filter written as a python literal may use, like the filters of the 0.11 suites
+SPEC_FUNCTIONS = {"float": float, "int": int, "range": range, "min": min, "max": max, "abs": abs, "len": len,
+                  "list": list}
+SPEC_BINARY_OPERATORS = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+                         ast.Div: operator.truediv, ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod,
+                         ast.Pow: operator.pow}
+SPEC_UNARY_OPERATORS = {ast.USub: operator.neg, ast.UAdd: operator.pos}
+DEFAULT_SELECTIVITY_FIELD = "int64"
+# the values of a term filter, [float(i) for i in range(collection_size)] of sift_10m is an expression of 109MB,
+# a longer list has to be written as a range
+MAX_TERM_VALUES = 100000
+
+
+def _range_comprehension(node, names):
+    """ [i for i in range(...)] and [float(i) / int(i) for i in range(...)] as an ndarray, not a list of millions """
+    if len(node.generators) != 1:
+        return None
+    generator = node.generators[0]
+    if generator.ifs or generator.is_async or not isinstance(generator.target, ast.Name):
+        return None
+    it = generator.iter
+    if not (isinstance(it, ast.Call) and isinstance(it.func, ast.Name) and it.func.id == "range") or it.keywords:
+        return None
+    elt, dtype = node.elt, np.int64
+    if isinstance(elt, ast.Call) and isinstance(elt.func, ast.Name) and elt.func.id in ["float", "int"] \
+            and len(elt.args) == 1 and not elt.keywords:
+        dtype = np.float64 if elt.func.id == "float" else np.int64
+        elt = elt.args[0]
+    if not (isinstance(elt, ast.Name) and elt.id == generator.target.id):
+        return None
+    args = [int(_eval_spec_node(arg, names)) for arg in it.args]
+    # checked before the values are generated
+    check_term_size(len(range(*args)))
+    return np.arange(*args, dtype=dtype)
+
+
+def _eval_spec_node(node, names):
+    if isinstance(node, ast.Expression):
+        return _eval_spec_node(node.body, names)
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return [_eval_spec_node(e, names) for e in node.elts]
+    if isinstance(node, ast.Dict):
+        return {_eval_spec_node(k, names): _eval_spec_node(v, names) for k, v in zip(node.keys, node.values)}
+    if isinstance(node, ast.Name):
+        if node.id not in names or names[node.id] is None:
+            raise Exception("Filter name: %s not defined" % node.id)
+        return names[node.id]
+    if isinstance(node, ast.BinOp) and type(node.op) in SPEC_BINARY_OPERATORS:
+        return SPEC_BINARY_OPERATORS[type(node.op)](_eval_spec_node(node.left, names),
+                                                     _eval_spec_node(node.right, names))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in SPEC_UNARY_OPERATORS:
+        return SPEC_UNARY_OPERATORS[type(node.op)](_eval_spec_node(node.operand, names))
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in SPEC_FUNCTIONS \
+            and not node.keywords:
+        return SPEC_FUNCTIONS[node.func.id](*[_eval_spec_node(arg, names) for arg in node.args])
+    if isinstance(node, ast.ListComp):
+        values = _range_comprehension(node, names)
+        if values is not None:
+            return values
+        if len(node.generators) == 1 and isinstance(node.generators[0].target, ast.Name):
+            generator = node.generators[0]
+            res = []
+            for value in _eval_spec_node(generator.iter, names):
+                scope = dict(names)
+                scope[generator.target.id] = value
+                if all(_eval_spec_node(condition, scope) for condition in generator.ifs):
+                    res.append(_eval_spec_node(node.elt, scope))
+            return res
+    raise Exception("Filter syntax not supported: %s" % ast.dump(node))
+
+
+def check_term_size(size):
+    if size > MAX_TERM_VALUES:
+        raise Exception("Filter: %d values in a term, more than %d, write it as a range" % (size, MAX_TERM_VALUES))
+
+
+def parse_spec(text, collection_size=None):
+    """ A filter written as a python literal, evaluated without eval(), collection_size is the only name defined """
+    try:
+        tree = ast.parse(text.strip(), mode="eval")
+    except SyntaxError as e:
+        raise Exception("Filter: %s not parsed: %s" % (text, str(e)))
+    return _eval_spec_node(tree, {"collection_size": collection_size})
+
+
+def format_value(value):
+    """ A value in the expression syntax of milvus """
+    if isinstance(value, np.ndarray):
+        if value.ndim == 1 and value.dtype.kind in "iuf":
+            # the values of a long term filter at once
+            return "[%s]" % ", ".join(map(repr if value.dtype.kind == "f" else str, value.tolist()))
+        value = value.tolist()
+    if isinstance(value, (list, tuple)):
+        return "[%s]" % ", ".join(format_value(v) for v in value)
+    if isinstance(value, (bool, np.bool_)):
+        return "true" if value else "false"
+    if isinstance(value, (int, np.integer)):
+        return str(int(value))
+    if isinstance(value, (float, np.floating)):
+        return repr(float(value))
+    if isinstance(value, str):
+        return json.dumps(value)
+    raise Exception("Filter value: %s not supported" % str(value))
+
+
+def field_expression(field, path=None):
+    """ A field, or a JSON path into a field: field["a"]["b"] """
+    return field + "".join("[%s]" % format_value(key) for key in (path or []))
+
+
+class FilterNode(object):
+    """
+    A compiled filter:
+        ("compare", field, path, op, value)    field op value, op in GT, GTE, LT, LTE, EQ, NE
+        ("in", field, path, values, negate)    field in [...] or field not in [...]
+        ("array", function, field, value)    array_contains(field, value), array_contains_any/all(field, [...])
+        ("expr", text)    an expression as it is
+        ("and", children), ("or", children), ("not", child)
+    """
+
+    def __init__(self, kind, *args):
+        self.kind = kind
+        self.args = args
+
+    def expression(self):
+        if self.kind == "compare":
+            field, path, op, value = self.args
+            return "%s %s %s" % (field_expression(field, path), dict((o, e) for o, e, _ in COMPARE_OPERATORS)[op],
+                                 format_value(value))
+        if self.kind == "in":
+            field, path, values, negate = self.args
+            return "%s %s %s" % (field_expression(field, path), "not in" if negate else "in", format_value(values))
+        if self.kind == "array":
+            function, field, value = self.args
+            return "%s(%s, %s)" % (function, field, format_value(value))
+        if self.kind == "expr":
+            return self.args[0]
+        if self.kind == "not":
+            return "not (%s)" % self.args[0].expression()
+        separator = " && " if self.kind == "and" else " || "
+        return separator.join(child.expression() if child.kind not in ["and", "or", "expr"]
+                              else "(%s)" % child.expression() for child in self.args[0])
+
+    def mask(self, values):
+        """
+        Boolean mask of the rows whose scalar fields hold the values, None if the node is not decided by them:
+        JSON paths, arrays and raw expressions are not in the generated data
+        """
+        if self.kind == "compare":
+            field, path, op, value = self.args
+            if path or not isinstance(value, (int, float, np.integer, np.floating)) or isinstance(value, bool):
+                return None
+            return dict((o, f) for o, _, f in COMPARE_OPERATORS)[op](values, value)
+        if self.kind == "in":
+            field, path, items, negate = self.args
+            items = np.asarray(items)
+            if path or (len(items) and items.dtype.kind not in "iuf"):
+                return None
+            return np.isin(values, items, invert=negate)
+        if self.kind == "not":
+            mask = self.args[0].mask(values)
+            return None if mask is None else ~mask
+        if self.kind in ["and", "or"]:
+            masks = [child.mask(values) for child in self.args[0]]
+            if any(mask is None for mask in masks):
+                return None
+            combine = np.logical_and if self.kind == "and" else np.logical_or
+            return combine.reduce(masks) if masks else np.ones(len(values), dtype=bool)
+        return None
+
+
+def _compare_nodes(field, condition, path=None):
+    """ The nodes of {GT: a, LT: b, ...} or {values: [...]} of a field """
+    if isinstance(condition, (list, tuple, np.ndarray)):
+        check_term_size(len(condition))
+        return [FilterNode("in", field, path, condition, False)]
+    if not isinstance(condition, dict):
+        return [FilterNode("compare", field, path, "EQ", condition)]
+    nodes = []
+    for key, value in condition.items():
+        if key in ["values", "IN", "NOT_IN"]:
+            check_term_size(len(value))
+            nodes.append(FilterNode("in", field, path, value, key == "NOT_IN"))
+        elif key in [op for op, _, _ in COMPARE_OPERATORS]:
+            nodes.append(FilterNode("compare", field, path, key, value))
+        elif key not in ["field", "path"]:
+            raise Exception("Filter operator: %s not supported" % key)
+    # a range is written as before: GT before LT
+    order = ["GT", "GTE", "LT", "LTE", "EQ", "NE"]
+    nodes.sort(key=lambda n: order.index(n.args[2]) if n.kind == "compare" else len(order))
+    return nodes
+
+
+def _and(nodes):
+    # the conditions of the ranges and the filters of a list are one conjunction
+    children = []
+    for node in nodes:
+        children.extend(node.args[0] if node.kind == "and" else [node])
+    return children[0] if len(children) == 1 else FilterNode("and", children)
+
+
+def build_node(filter, collection_size=None):
+    """
+    The node of a suite filter, the keys of a dict are and-ed:
+        range: {field: {GT: a, LT: b}}    GT, GTE, LT, LTE, EQ, NE
+        term / in: {field: {values: [...]}} or {field: [...]}
+        not_in: {field: [...]}
+        json: {field: f, path: [a, b], GT: 1} or with values: [...], a list of them is and-ed
+        array_contains: {field: value}, array_contains_any / array_contains_all: {field: [...]}
+        and / or: [filter, ...], not: filter
+        expr: an expression as it is
+    range and term can also be a python literal like "{'range': {'float': {'LT': collection_size * 0.1}}}",
+    a list of filters is and-ed like the filter_query of the runners
+    """
+    if isinstance(filter, str):
+        filter = parse_spec(filter, collection_size)
+    if isinstance(filter, (list, tuple)):
+        nodes = [build_node(item, collection_size) for item in filter if item]
+        return _and(nodes) if nodes else None
+    if not isinstance(filter, dict) or not filter:
+        raise Exception("Filter: %s not supported" % str(filter))
+    nodes = []
+    for kind, spec in filter.items():
+        if isinstance(spec, str) and kind in ["range", "term", "in", "not_in", "json"]:
+            spec = parse_spec(spec, collection_size)
+            if isinstance(spec, dict) and kind in spec:
+                spec = spec[kind]
+        if kind in ["range", "term", "in", "not_in"]:
+            for field, condition in spec.items():
+                if kind == "not_in":
+                    condition = {"NOT_IN": condition["values"] if isinstance(condition, dict) else condition}
+                nodes.extend(_compare_nodes(field, condition))
+        elif kind == "json":
+            for item in (spec if isinstance(spec, list) else [spec]):
+                nodes.extend(_compare_nodes(item["field"], item, path=item["path"] if "path" in item else []))
+        elif kind in ARRAY_FUNCTIONS:
+            for field, value in spec.items():
+                if isinstance(value, (list, tuple, np.ndarray)):
+                    check_term_size(len(value))
+                nodes.append(FilterNode("array", kind, field, value))
+        elif kind in ["and", "or"]:
+            children = [build_node(item, collection_size) for item in spec]
+            if not children:
+                raise Exception("Filter: %s of no filters" % kind)
+            nodes.append(children[0] if len(children) == 1 else FilterNode(kind, children))
+        elif kind == "not":
+            nodes.append(FilterNode("not", build_node(spec, collection_size)))
+        elif kind == "expr":
+            nodes.append(FilterNode("expr", spec))
+        else:
+            raise Exception("Filter: %s not supported" % kind)
+    return _and(nodes)
+
+
+class CompiledFilter(object):
+    """
+    A suite filter compiled once into its expression,
+    with the selectivity on the generated data: the scalar fields of the benchmark collections hold the id,
+    see utils.generate_values, so the rows of ids [0, collection_size) are evaluated
+    """
+
+    def __init__(self, params, node, collection_size=None):
+        self.params = params
+        self.node = node
+        self.collection_size = collection_size
+        self.expression = node.expression()
+        self._masks = {}
+
+    def __repr__(self):
+        return "<CompiledFilter %s>" % (self.expression if len(self.expression) < 200 else
+                                        self.expression[:200] + "...")
+
+    def mask(self, size=None):
+        """ Boolean mask of the ids [0, size) which match, None if the filter is not decided by the generated data """
+        size = self.collection_size if size is None else size
+        if size is None:
+            return None
+        if size not in self._masks:
+            self._masks[size] = self.node.mask(np.arange(size, dtype=np.int64))
+        return self._masks[size]
+
+    def selectivity(self, size=None):
+        """ The ratio of the rows which match """
+        mask = self.mask(size)
+        if mask is None or len(mask) == 0:
+            return None
+        return round(float(np.count_nonzero(mask)) / len(mask), 6)
+
+    def summary(self):
+        return {
+            "filter": self.params,
+            "expression": self.expression if len(self.expression) < 1000 else self.expression[:1000] + "...",
+            "selectivity": self.selectivity()
+        }
+
+
+def filter_metric(compiled):
+    """ The filter, its expression and its selectivity in the search metric of a case """
+    if compiled is None:
+        return {"filter": [], "filter_expression": None, "selectivity": None}
+    summary = compiled.summary()
+    return {"filter": [summary["filter"]], "filter_expression": summary["expression"],
+            "selectivity": summary["selectivity"]}
+
+
+_compiled_filters = {}
+
+
+def compile_filter(filter, collection_size=None):
+    """ The CompiledFilter of a suite filter, cached by the filter and the collection size, None if it is empty """
+    if not filter:
+        return None
+    if isinstance(filter, CompiledFilter):
+        return filter
+    key = (json.dumps(filter, sort_keys=True, default=str), collection_size)
+    if key not in _compiled_filters:
+        node = build_node(filter, collection_size)
+        if node is None:
+            return None
+        _compiled_filters[key] = CompiledFilter(filter, node, collection_size)
+        logger.debug("Filter compiled: %s" % str(_compiled_filters[key]))
+    return _compiled_filters[key]
+
+
+def filter_expression(filter):
+    """ The expression of a compiled filter, an expression or a suite filter, None without any """
+    if not filter:
+        return None
+    if isinstance(filter, str):
+        return filter
+    return compile_filter(filter).expression
+
+
+def selectivity_filters(selectivities, collection_size, field=DEFAULT_SELECTIVITY_FIELD):
+    """ A range filter of the first selectivity * collection_size ids for every selectivity """
+    return [{"range": {field: {"GTE": 0, "LT": int(round(selectivity * collection_size))}}}
+            for selectivity in selectivities]
+
+
+def get_case_filters(collection, collection_size):
+    """
+    The compiled filters of the cases of a suite collection: its filters, then one of every selectivity to sweep,
+    [None] for the cases without a filter if there are none
+    """
+    filters = list(collection["filters"]) if "filters" in collection and collection["filters"] else []
+    if "selectivities" in collection:
+        field = collection["selectivity_field"] if "selectivity_field" in collection else DEFAULT_SELECTIVITY_FIELD
+        filters.extend(selectivity_filters(collection["selectivities"], collection_size, field=field))
+    compiled = [compile_filter(filter, collection_size) for filter in filters]
+    for item in compiled:
+        if item is not None:
+            logger.info("Filter: %s, selectivity: %s" % (str(item), item.selectivity()))
+    return compiled if compiled else [None]
@@ -0,0 +1,266 @@
+import os
+import hashlib
+import logging
+import numpy as np
+
+from milvus_benchmark import config
+from . import utils
+from . import filters
+from .dataset import DatasetReader
+from .recall import PAD_ID
+
+logger = logging.getLogger("milvus_benchmark.runners.ground_truth")
+
+GROUND_TRUTH_DIR = config.LOG_PATH + "ground_truth/"
+FLOAT_METRICS = ["l2", "ip", "cosine"]
+BINARY_METRICS = ["hamming", "jaccard"]
+# rows of queries compared at a time
+DEFAULT_QUERY_BLOCK = 256
+# rows of the dataset compared at a time, bounds the (query_block, base_block) distance matrix
+DEFAULT_BASE_BLOCK = 16384
+# the local data type is generated block by block with the seed LOCAL_DATA_SEED + block index
+LOCAL_DATA_SEED = 20210701
+LOCAL_BLOCK_ROWS = 10000
+
+
+def generate_local_vectors(start_id, nb, dimension):
+    """ Vectors of the local data type for the ids [start_id, start_id + nb), the same for the same ids """
+    first_block = start_id // LOCAL_BLOCK_ROWS
+    last_block = (start_id + nb - 1) // LOCAL_BLOCK_ROWS
+    blocks = [np.random.default_rng(LOCAL_DATA_SEED + block).random((LOCAL_BLOCK_ROWS, dimension), dtype=np.float32)
+              for block in range(first_block, last_block + 1)]
+    data = blocks[0] if len(blocks) == 1 else np.concatenate(blocks)
+    offset = start_id - first_block * LOCAL_BLOCK_ROWS
+    return data[offset:offset + nb]
+
+
+def iter_dataset(data_type, dimension, size):
+    """ Yield (start_id, vectors) of the first size vectors inserted for data_type, one file or local block at a time """
+    if data_type == "local" or not data_type:
+        for start_id in range(0, size, LOCAL_BLOCK_ROWS):
+            yield start_id, generate_local_vectors(start_id, min(LOCAL_BLOCK_ROWS, size - start_id), dimension)
+    else:
+        reader = DatasetReader(data_type, dimension)
+        for start_id, vectors in reader.iter_batches(size, reader.vectors_per_file):
+            yield start_id, vectors
+
+
+def as_binary(vectors):
+    """ Packed binary vectors given as bytes or uint8 rows to a (n, dim / 8) uint8 array """
+    if len(vectors) and isinstance(vectors[0], (bytes, bytearray)):
+        return np.frombuffer(b"".join(vectors), dtype=np.uint8).reshape(len(vectors), -1)
+    return np.asarray(vectors, dtype=np.uint8)
+
+
+def _l2_normalize(x):
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return np.divide(x, norms, out=np.zeros_like(x), where=norms > 0)
+
+
+def prepare_queries(queries, metric_type):
+    """ Convert the queries once to the form used for every block of the dataset, return (vectors, norms) """
+    if metric_type in BINARY_METRICS:
+        vectors = np.unpackbits(as_binary(queries), axis=1).astype(np.float32)
+        return vectors, vectors.sum(axis=1)
+    vectors = np.asarray(queries, dtype=np.float32)
+    if metric_type == "cosine":
+        vectors = _l2_normalize(vectors)
+    return vectors, np.einsum("ij,ij->i", vectors, vectors)
+
+
+def block_distances(query_vectors, query_norms, base, metric_type):
+    """
+    Distances between the prepared queries and a block of the dataset, smaller is closer:
+    l2: squared distance, ip/cosine: negative similarity, hamming: differing bits, jaccard: 1 - similarity
+    """
+    if metric_type in BINARY_METRICS:
+        bits = np.unpackbits(as_binary(base), axis=1).astype(np.float32)
+        common = query_vectors @ bits.T
+        base_norms = bits.sum(axis=1)
+        if metric_type == "hamming":
+            return query_norms[:, None] + base_norms[None, :] - 2 * common
+        union = query_norms[:, None] + base_norms[None, :] - common
+        return 1 - np.divide(common, union, out=np.ones_like(common), where=union > 0)
+    base = np.asarray(base, dtype=np.float32)
+    if metric_type == "cosine":
+        base = _l2_normalize(base)
+    dot = query_vectors @ base.T
+    if metric_type in ["ip", "cosine"]:
+        return -dot
+    base_norms = np.einsum("ij,ij->i", base, base)
+    return np.maximum(query_norms[:, None] - 2 * dot + base_norms[None, :], 0)
+
+
+def _merge_top_k(best_ids, best_distances, ids, distances, top_k):
+    """ Keep the top_k smallest distances of the current best and a new block, rows are not sorted """
+    ids = np.concatenate([best_ids, np.broadcast_to(ids, distances.shape)], axis=1)
+    distances = np.concatenate([best_distances, distances], axis=1)
+    if distances.shape[1] > top_k:
+        index = np.argpartition(distances, top_k - 1, axis=1)[:, :top_k]
+        ids = np.take_along_axis(ids, index, axis=1)
+        distances = np.take_along_axis(distances, index, axis=1)
+    return ids, distances
+
+
+def _sort_top_k(ids, distances):
+    """ Sort every row by distance, ties by id, so the result does not depend on the block order """
+    order = np.lexsort((ids, distances), axis=1)
+    return np.take_along_axis(ids, order, axis=1), np.take_along_axis(distances, order, axis=1)
+
+
+def to_metric_distances(distances, metric_type):
+    """ Distances in the convention of the search result: similarity for ip and cosine """
+    if metric_type in ["ip", "cosine"]:
+        return -distances
+    return distances
+
+
+class ExactSearch(object):
+    """
+    Brute-force top_k of the queries over a dataset given as (start_id, vectors) blocks,
+    queries and dataset are compared block by block in the calling thread, the parallelism is the one of the BLAS
+    library in the matrix products, a pool of python threads would add none: once locust monkey patched the
+    standard library they are greenlets of this same OS thread
+    mask: optional boolean array by id, only the ids with True are candidates, e.g. a scalar filter or a partition
+    excluded_ids: optional ids which are never returned, e.g. deleted or replaced by upsert
+    """
+
+    def __init__(self, metric_type, top_k, mask=None, excluded_ids=None, query_block=DEFAULT_QUERY_BLOCK,
+                 base_block=DEFAULT_BASE_BLOCK):
+        metric_type = metric_type.lower()
+        if metric_type not in FLOAT_METRICS + BINARY_METRICS:
+            raise Exception("Metric type: %s not supported by exact search" % metric_type)
+        self.metric_type = metric_type
+        self.top_k = top_k
+        self.mask = None if mask is None else np.asarray(mask, dtype=bool)
+        self.excluded_ids = None if excluded_ids is None else np.unique(np.asarray(excluded_ids, dtype=np.int64))
+        self.query_block = query_block
+        self.base_block = base_block
+
+    def _candidates(self, start_id, vectors):
+        """ Ids and vectors of the block which pass the mask and are not excluded """
+        ids = np.arange(start_id, start_id + len(vectors), dtype=np.int64)
+        keep = np.ones(len(ids), dtype=bool)
+        if self.mask is not None:
+            in_mask = ids < len(self.mask)
+            keep[in_mask] &= self.mask[ids[in_mask]]
+            keep[~in_mask] = False
+        if self.excluded_ids is not None:
+            keep &= ~np.isin(ids, self.excluded_ids, assume_unique=False)
+        if keep.all():
+            return ids, vectors
+        return ids[keep], np.asarray(vectors)[keep]
+
+    def search(self, queries, dataset):
+        """
+        :param queries: query vectors, packed uint8 or bytes for binary metrics
+        :param dataset: iterable of (start_id, vectors)
+        :return: (ids, distances) of shape (nq, top_k), padded with PAD_ID and inf
+        """
+        query_vectors, query_norms = prepare_queries(queries, self.metric_type)
+        nq = len(query_vectors)
+        blocks = [(start, min(start + self.query_block, nq)) for start in range(0, nq, self.query_block)]
+        results = [(np.empty((e - s, 0), dtype=np.int64), np.empty((e - s, 0), dtype=np.float32)) for s, e in blocks]
+
+        def search_block(index, ids, vectors):
+            s, e = blocks[index]
+            distances = block_distances(query_vectors[s:e], query_norms[s:e], vectors, self.metric_type)
+            results[index] = _merge_top_k(results[index][0], results[index][1], ids,
+                                          distances.astype(np.float32, copy=False), self.top_k)
+
+        for start_id, data in dataset:
+            for offset in range(0, len(data), self.base_block):
+                ids, vectors = self._candidates(start_id + offset, data[offset:offset + self.base_block])
+                if not len(ids):
+                    continue
+                vectors = np.asarray(vectors)
+                for index in range(len(blocks)):
+                    search_block(index, ids, vectors)
+
+        ids = np.full((nq, self.top_k), PAD_ID, dtype=np.int64)
+        distances = np.full((nq, self.top_k), np.inf, dtype=np.float32)
+        for (s, e), (block_ids, block_distances_) in zip(blocks, results):
+            block_ids, block_distances_ = _sort_top_k(block_ids, block_distances_)
+            width = block_ids.shape[1]
+            ids[s:e, :width] = block_ids
+            distances[s:e, :width] = block_distances_
+        return ids, to_metric_distances(distances, self.metric_type)
+
+
+def _hash_array(md5, array):
+    if array is None:
+        md5.update(b"none")
+        return
+    array = np.ascontiguousarray(array)
+    md5.update(str((array.dtype.str, array.shape)).encode())
+    md5.update(array.tobytes())
+
+
+def cache_key(dataset_key, metric_type, top_k, queries, mask=None, excluded_ids=None):
+    """ Hash of everything the ground truth depends on """
+    md5 = hashlib.md5()
+    md5.update(str((dataset_key, metric_type.lower(), top_k)).encode())
+    if metric_type.lower() in BINARY_METRICS:
+        _hash_array(md5, as_binary(queries))
+    else:
+        _hash_array(md5, np.asarray(queries, dtype=np.float32))
+    _hash_array(md5, None if mask is None else np.packbits(np.asarray(mask, dtype=bool)))
+    _hash_array(md5, None if excluded_ids is None else np.unique(np.asarray(excluded_ids, dtype=np.int64)))
+    return md5.hexdigest()
+
+
+def get_ground_truth(dataset_key, dataset, queries, top_k, metric_type, mask=None, excluded_ids=None,
+                     cache_dir=GROUND_TRUTH_DIR):
+    """
+    Exact neighbors of the queries, cached on disk by the hash of dataset_key, queries, filter mask and excluded ids
+    dataset: iterable of (start_id, vectors), or a callable returning it, only read if the cache misses
+    return: (ids, distances)
+    """
+    key = cache_key(dataset_key, metric_type, top_k, queries, mask, excluded_ids)
+    file_name = os.path.join(cache_dir, "%s.npz" % key)
+    if os.path.isfile(file_name):
+        logger.info("Load ground truth of %s from %s" % (dataset_key, file_name))
+        with np.load(file_name) as data:
+            return data["ids"], data["distances"]
+    logger.info("Compute ground truth of %s, top_k: %d, metric_type: %s" % (dataset_key, top_k, metric_type))
+    if callable(dataset):
+        dataset = dataset()
+    engine = ExactSearch(metric_type, top_k, mask=mask, excluded_ids=excluded_ids)
+    ids, distances = engine.search(queries, dataset)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_file = file_name + ".tmp.npz"
+        np.savez(tmp_file, ids=ids, distances=distances)
+        os.replace(tmp_file, file_name)
+    except OSError as e:
+        logger.warning("Save ground truth to %s failed: %s" % (file_name, str(e)))
+    return ids, distances
+
+
+def filter_mask(filter_query, size):
+    """
+    Boolean mask of the ids [0, size) which match the filter of the case, see filters.CompiledFilter.mask,
+    the scalar fields of the benchmark collections are filled with the id, see utils.generate_values
+    """
+    compiled = filters.compile_filter(filter_query, size)
+    if compiled is None:
+        return None
+    mask = compiled.mask(size)
+    if mask is None:
+        raise Exception("Ground truth of filter: %s not computed, it is not decided by the generated data"
+                        % compiled.expression)
+    return mask
+
+
+def get_dataset_ground_truth(data_type, dimension, size, queries, top_k, metric_type, filter_query=None,
+                             excluded_ids=None):
+    """ Ground truth ids of a benchmark collection inserted by BaseRunner.insert """
+    dataset_key = "%s_%d_%d" % (data_type, size, dimension)
+    mask = filter_mask(filter_query, size)
+    ids, _ = get_ground_truth(dataset_key, lambda: iter_dataset(data_type, dimension, size), queries, top_k,
+                              metric_type, mask=mask, excluded_ids=excluded_ids)
+    return ids
+
+
+def has_precomputed_ground_truth(data_type, collection_size, filter_query=None):
+    return data_type == "sift" and str(collection_size) in utils.GROUNDTRUTH_MAP and not filter_query
@@ -0,0 +1,126 @@
+import math
+import logging
+
+logger = logging.getLogger("milvus_benchmark.runners.histogram")
+
+# values below 2^7 have a bucket each, above it every power of two is split into 2^6 buckets
+# (the top 7 bits of the value, of which the first is always set), the relative error of a bucket is less than 1/64
+SUB_BUCKET_BITS = 7
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+SUB_BUCKET_HALF = SUB_BUCKET_COUNT >> 1
+NS_PER_MS = 1000000
+NS_PER_SEC = 1000000000
+DEFAULT_PERCENTILES = [50, 90, 99, 99.9]
+
+
+def _bucket_index(value):
+    if value < SUB_BUCKET_COUNT:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    return shift * SUB_BUCKET_HALF + (value >> shift)
+
+
+def _bucket_value(index):
+    """ The highest value which falls in the bucket """
+    if index < SUB_BUCKET_COUNT:
+        return index
+    shift = index // SUB_BUCKET_HALF - 1
+    mantissa = index - shift * SUB_BUCKET_HALF
+    return ((mantissa + 1) << shift) - 1
+
+
+def percentile_name(p):
+    return "p" + ("%g" % p).replace(".", "")
+
+
+class LatencyHistogram(object):
+    """
+    HDR style log-linear histogram of latencies in nanoseconds,
+    only bucket counts are kept so that histograms of different runs can be merged
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def record(self, value_ns, count=1):
+        value_ns = max(int(value_ns), 0)
+        index = _bucket_index(value_ns)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.count += count
+        self.total += value_ns * count
+        if self.min is None or value_ns < self.min:
+            self.min = value_ns
+        if self.max is None or value_ns > self.max:
+            self.max = value_ns
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+        return self
+
+    def percentile(self, p):
+        """ Return the latency in ns which p percent of the requests are not larger than """
+        if not self.count:
+            return 0
+        target = min(max(1, math.ceil(self.count * p / 100.0)), self.count)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(_bucket_value(index), self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+    def summary(self, percentiles=None, precision=3):
+        """ Percentiles, avg, min and max in milliseconds """
+        if percentiles is None:
+            percentiles = DEFAULT_PERCENTILES
+        res = {"count": self.count}
+        for p in percentiles:
+            res[percentile_name(p)] = round(self.percentile(p) / NS_PER_MS, precision)
+        res.update({
+            "avg": round(self.mean() / NS_PER_MS, precision),
+            "min": round((self.min or 0) / NS_PER_MS, precision),
+            "max": round((self.max or 0) / NS_PER_MS, precision)
+        })
+        return res
+
+    def to_dict(self):
+        """ Serializable form, keys are str so it can be saved in the metric """
+        return {
+            "counts": {str(index): count for index, count in self.counts.items()},
+            "count": self.count,
+            "total": self.total,
+            "min": self.min,
+            "max": self.max
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        h = cls()
+        h.counts = {int(index): count for index, count in data["counts"].items()}
+        h.count = data["count"]
+        h.total = data["total"]
+        h.min = data["min"]
+        h.max = data["max"]
+        return h
+
+    @classmethod
+    def from_locust_stats(cls, stats_entry):
+        """ Build from the response_times of a locust StatsEntry, which are rounded milliseconds """
+        h = cls()
+        for response_time, count in stats_entry.response_times.items():
+            h.record(response_time * NS_PER_MS, count)
+        return h
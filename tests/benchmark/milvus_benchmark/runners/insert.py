@@ -23,6 +23,7 @@ class InsertRunner(BaseRunner):
         index_info = None
         vector_type = utils.get_vector_type(data_type)
         other_fields = collection["other_fields"] if "other_fields" in collection else None
+        insert_workers = collection["insert_workers"] if "insert_workers" in collection else 1
         collection_info = {
             "dimension": dimension,
             "metric_type": metric_type,
@@ -63,6 +64,7 @@ class InsertRunner(BaseRunner):
             "other_fields": other_fields,
             "build_index": build_index,
             "flush_after_insert": flush,
+            "insert_workers": insert_workers,
             "index_field_name": index_field_name,
             "index_type": index_type,
             "index_param": index_param,
@@ -107,7 +109,8 @@ class InsertRunner(BaseRunner):
         index_field_name = case_param["index_field_name"]
         build_index = case_param["build_index"]
 
-        tmp_result = self.insert(self.milvus, collection_name, case_param["data_type"], dimension, case_param["collection_size"], case_param["ni_per"])
+        tmp_result = self.insert(self.milvus, collection_name, case_param["data_type"], dimension, case_param["collection_size"], case_param["ni_per"],
+                                 workers=case_param["insert_workers"])
         flush_time = 0.0
         build_time = 0.0
         if case_param["flush_after_insert"] is True:
@@ -139,6 +142,7 @@ class BPInsertRunner(BaseRunner):
         index_info = None
         vector_type = utils.get_vector_type(data_type)
         other_fields = collection["other_fields"] if "other_fields" in collection else None
+        insert_workers = collection["insert_workers"] if "insert_workers" in collection else 1
         index_field_name = None
         index_type = None
         index_param = None
@@ -180,6 +184,7 @@ class BPInsertRunner(BaseRunner):
                 "other_fields": other_fields,
                 "build_index": build_index,
                 "flush_after_insert": flush,
+                "insert_workers": insert_workers,
                 "index_field_name": index_field_name,
                 "index_type": index_type,
                 "index_param": index_param,
@@ -225,7 +230,8 @@ class BPInsertRunner(BaseRunner):
         index_field_name = case_param["index_field_name"]
         build_index = case_param["build_index"]
         # TODO:
-        tmp_result = self.insert(self.milvus, collection_name, case_param["data_type"], dimension, case_param["collection_size"], case_param["ni_per"])
+        tmp_result = self.insert(self.milvus, collection_name, case_param["data_type"], dimension, case_param["collection_size"], case_param["ni_per"],
+                                 workers=case_param["insert_workers"])
         flush_time = 0.0
         build_time = 0.0
         if case_param["flush_after_insert"] is True:
@@ -0,0 +1,183 @@
+import time
+import queue
+import logging
+import threading
+import traceback
+import numpy as np
+
+from milvus_benchmark.client import MilvusClient
+from . import utils
+
+logger = logging.getLogger("milvus_benchmark.runners.insert_pipeline")
+
+# batches built ahead of the workers, per worker
+DEFAULT_QUEUE_SIZE_PER_WORKER = 2
+PHASES = ["generate", "rpc"]
+_STOP = object()
+
+
+def batch_bytes(vectors):
+    """ Payload size of the vectors and int64 ids of one batch """
+    if isinstance(vectors, np.ndarray):
+        return vectors.nbytes + 8 * len(vectors)
+    if not len(vectors):
+        return 0
+    return len(vectors) * (len(vectors[0]) * 4 + 8)
+
+
+class PhaseStats(object):
+    """
+    Rows, bytes and seconds spent in every phase of the insert pipeline,
+    and the wall clock span of the phase from its first start to its last end
+    """
+
+    def __init__(self):
+        self.rows = {phase: 0 for phase in PHASES}
+        self.bytes = {phase: 0 for phase in PHASES}
+        self.seconds = {phase: 0.0 for phase in PHASES}
+        self.starts = {phase: None for phase in PHASES}
+        self.ends = {phase: None for phase in PHASES}
+
+    def _span(self, phase, start, end):
+        if start is not None:
+            self.starts[phase] = start if self.starts[phase] is None else min(self.starts[phase], start)
+        if end is not None:
+            self.ends[phase] = end if self.ends[phase] is None else max(self.ends[phase], end)
+
+    def add(self, phase, rows, nbytes, seconds, end=None):
+        self.rows[phase] += rows
+        self.bytes[phase] += nbytes
+        self.seconds[phase] += seconds
+        if end is not None:
+            self._span(phase, end - seconds, end)
+
+    def merge(self, other):
+        for phase in PHASES:
+            self.rows[phase] += other.rows[phase]
+            self.bytes[phase] += other.bytes[phase]
+            self.seconds[phase] += other.seconds[phase]
+            self._span(phase, other.starts[phase], other.ends[phase])
+        return self
+
+    def to_dict(self, wall_clock=False):
+        """
+        wall_clock: the rates over the wall clock span of the phases with one, the rpc merged from the workers
+        which insert at the same time, else over the seconds spent in them
+        """
+        res = {}
+        for phase in PHASES:
+            if not self.rows[phase]:
+                continue
+            seconds = self.seconds[phase]
+            if wall_clock and self.starts[phase] is not None:
+                seconds = self.ends[phase] - self.starts[phase]
+            res[phase] = {
+                "time": round(self.seconds[phase], 2),
+                "rows_per_sec": round(self.rows[phase] / seconds, 2) if seconds else 0.0,
+                "mb_per_sec": round(self.bytes[phase] / seconds / 1024 / 1024, 2) if seconds else 0.0
+            }
+        return res
+
+
+class InsertPipeline(object):
+    """
+    Insert batches with N workers, each owns its own connection to milvus
+    the caller reads and builds the batches, pushes them to a bounded queue
+    concurrency: the package imports locust, which monkey patches the standard library, so the workers
+    are greenlets of one OS thread, they overlap only the time spent waiting on the network, and only if
+    grpc cooperates with gevent, else every request blocks the process until it returns
+    phases:
+        generate: read or generate the vectors and wrap them into the entities of the batch
+        rpc: the insert request, including the client side encoding of pymilvus
+    """
+
+    def __init__(self, host, port, collection_name, workers, queue_size=None):
+        self.host = host
+        self.port = port
+        self.collection_name = collection_name
+        self.workers = workers
+        if queue_size is None:
+            queue_size = workers * DEFAULT_QUEUE_SIZE_PER_WORKER
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._errors = []
+
+    def _worker(self, index, stats):
+        milvus = None
+        try:
+            milvus = MilvusClient(collection_name=self.collection_name, host=self.host, port=self.port)
+        except Exception as e:
+            logger.error("Insert worker: %d connect failed" % index)
+            logger.error(traceback.format_exc())
+            self._errors.append(e)
+        # the queue is drained until _STOP after any failure, so that the producer is never blocked
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            if self._errors:
+                continue
+            entities, rows, nbytes = item
+            start = time.perf_counter()
+            try:
+                res = milvus.insert(entities, log=False)
+            except Exception as e:
+                logger.error("Insert worker: %d failed" % index)
+                logger.error(traceback.format_exc())
+                self._errors.append(e)
+                continue
+            end = time.perf_counter()
+            if res is None:
+                # MilvusClient.insert logs the error of the request and returns None
+                self._errors.append(Exception("Insert worker: %d insert of %d rows failed" % (index, rows)))
+                continue
+            stats.add("rpc", rows, nbytes, end - start, end=end)
+
+    def run(self, info, batches, size, ni):
+        generate_stats = PhaseStats()
+        worker_stats = [PhaseStats() for _ in range(self.workers)]
+        threads = []
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, args=(i, worker_stats[i]), name="insert-worker-%d" % i)
+            t.start()
+            threads.append(t)
+        start_time = time.perf_counter()
+        batches = iter(batches)
+        try:
+            while not self._errors:
+                gen_start = time.perf_counter()
+                try:
+                    start_id, vectors = next(batches)
+                except StopIteration:
+                    break
+                rows = len(vectors)
+                nbytes = batch_bytes(vectors)
+                ids = list(range(start_id, start_id + rows))
+                # generate_entities only references the vectors, the encoding is done by pymilvus in rpc
+                entities = utils.generate_entities(info, vectors, ids)
+                generate_stats.add("generate", rows, nbytes, time.perf_counter() - gen_start)
+                self._queue.put((entities, rows, nbytes))
+        finally:
+            for _ in threads:
+                self._queue.put(_STOP)
+            for t in threads:
+                t.join()
+        total_time = time.perf_counter() - start_time
+        if self._errors:
+            raise self._errors[0]
+        merged = PhaseStats()
+        for stats in worker_stats:
+            merged.merge(stats)
+        # the workers insert at the same time, the merged rpc rates are over the wall clock,
+        # generate runs in the caller one batch after another
+        phases = merged.merge(generate_stats).to_dict(wall_clock=True)
+        batch_count = size / ni
+        result = {
+            "total_time": round(total_time, 2),
+            "rps": round(size / total_time, 2),
+            "ni_time": round(merged.seconds["rpc"] / batch_count, 2),
+            "workers": self.workers,
+            "phases": phases,
+            "worker_phases": [stats.to_dict() for stats in worker_stats]
+        }
+        logger.info(result)
+        return result
@@ -2,6 +2,9 @@ import time
 import copy
 import logging
 from . import locust_user
+from . import locust_open_loop
+from . import locust_distributed
+from . import filters
 from .base import BaseRunner
 from milvus_benchmark import parser
 from milvus_benchmark import utils
@@ -28,6 +31,7 @@ class LocustRunner(BaseRunner):
             "index_field_name": case_param["index_field_name"],
             "vector_field_name": case_param["vector_field_name"],
             "dimension": case_param["dimension"],
+            "collection_size": case_param["collection_size"],
             "collection_info": self.milvus.get_info(collection_name)}
         logger.info(info_in_params)
         run_params.update({"op_info": info_in_params})
@@ -41,8 +45,27 @@ class LocustRunner(BaseRunner):
         # collect stats
         # pdb.set_trace()
         logger.info(run_params)
-        locust_stats = locust_user.locust_executor(self.hostname, self.port, collection_name,
-                                                   connection_type=connection_type, run_params=run_params)
+        # closed_loop: locust users, open_loop: requests issued at target_qps
+        load_mode = task["load_mode"] if "load_mode" in task else "closed_loop"
+        # workers: run the users in local worker processes of a locust master
+        workers = task["workers"] if "workers" in task else 0
+        if load_mode == "open_loop":
+            if workers:
+                logger.warning("Open loop mode runs in one process, workers: %s is ignored" % workers)
+            locust_stats = locust_open_loop.open_loop_executor(self.hostname, self.port, collection_name,
+                                                               connection_type=connection_type, run_params=run_params)
+        elif workers:
+            locust_stats = locust_distributed.distributed_executor(self.hostname, self.port, collection_name,
+                                                                   connection_type=connection_type,
+                                                                   run_params=run_params)
+        else:
+            locust_stats = locust_user.locust_executor(self.hostname, self.port, collection_name,
+                                                       connection_type=connection_type, run_params=run_params)
+        query_params = run_params["tasks"]["query"]["params"] if "query" in run_params["tasks"] else None
+        if query_params and "filters" in query_params and query_params["filters"]:
+            # the filter of the search requests and its selectivity, compiled by prepare_query
+            locust_stats.update(filters.filter_metric(
+                filters.compile_filter(query_params["filters"], case_param["collection_size"])))
         return locust_stats
 
 
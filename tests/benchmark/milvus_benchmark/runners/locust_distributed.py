@@ -0,0 +1,213 @@
+import time
+import socket
+import logging
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+import gevent
+from locust import events
+from locust.stats import stats_printer
+from .locust_stats import RequestRecorder
+from . import locust_user
+from .locust_user import MyUser
+
+logger = logging.getLogger("milvus_benchmark.runners.locust_distributed")
+
+MASTER_HOST = "127.0.0.1"
+# seconds to wait for the workers to connect to the master
+DEFAULT_WORKER_START_TIMEOUT = 120
+# seconds to wait for the last reports of the workers after the users are stopped
+DEFAULT_REPORT_TIMEOUT = 30
+VALUE_DTYPES = {"ids": np.int64, "get_ids": np.int64, "X": np.float32}
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind((MASTER_HOST, 0))
+        return s.getsockname()[1]
+
+
+class SharedRows(object):
+    """
+    A read-only sequence over a shared array, items and slices are python values like the lists of gen_user_values,
+    a slice is converted once per worker, the tasks take the same slices for every request
+    """
+
+    def __init__(self, array):
+        self.array = array
+        self._slices = {}
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self.array[index].tolist()
+        key = index.indices(len(self.array))
+        if key not in self._slices:
+            self._slices[key] = self.array[index].tolist()
+        return self._slices[key]
+
+
+class SharedValues(object):
+    """
+    The values of gen_user_values in shared memory, generated once by the master and mapped by every worker
+    instead of a copy of their own
+    """
+
+    def __init__(self, blocks, arrays):
+        self.blocks = blocks
+        self.arrays = arrays
+
+    @classmethod
+    def create(cls, values):
+        blocks, arrays = {}, {}
+        for key, value in values.items():
+            data = np.asarray(value, dtype=VALUE_DTYPES[key] if key in VALUE_DTYPES else None)
+            block = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+            array = np.ndarray(data.shape, dtype=data.dtype, buffer=block.buf)
+            array[...] = data
+            blocks[key] = block
+            arrays[key] = array
+        return cls(blocks, arrays)
+
+    def spec(self):
+        """ What a worker needs to map the values: {key: (block name, shape, dtype)} """
+        return {key: (self.blocks[key].name, array.shape, array.dtype.str) for key, array in self.arrays.items()}
+
+    @classmethod
+    def attach(cls, spec):
+        blocks, arrays = {}, {}
+        for key, (name, shape, dtype) in spec.items():
+            blocks[key] = shared_memory.SharedMemory(name=name)
+            arrays[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=blocks[key].buf)
+        return cls(blocks, arrays)
+
+    @property
+    def values(self):
+        return {key: SharedRows(array) for key, array in self.arrays.items()}
+
+    def close(self):
+        self.arrays = {}
+        for block in self.blocks.values():
+            block.close()
+
+    def unlink(self):
+        blocks = list(self.blocks.values())
+        self.close()
+        for block in blocks:
+            block.unlink()
+
+
+def worker_main(host, port, collection_name, connection_type, run_params, values_spec, master_port):
+    """ A locust worker process, runs the users of the master with the shared values """
+    shared = SharedValues.attach(values_spec)
+    encode_time = locust_user.setup_user(host, port, collection_name, connection_type, run_params,
+                                         values=shared.values)
+    client = MyUser.client
+
+    def on_report_to_master(client_id, data):
+        # the records since the last report, they are merged by the master
+        data["milvus_recorder"] = client.recorder.drain()
+        data["connection_pool"] = client.pool.summary()
+        data["encode_time"] = encode_time
+
+    events.report_to_master.add_listener(on_report_to_master)
+    env = locust_user.create_environment(dict(run_params, load_shape=False))
+    runner = env.create_worker_runner(MASTER_HOST, master_port)
+    client.pool.start()
+    runner.greenlet.join()
+    client.pool.stop()
+    shared.close()
+
+
+class WorkerReports(object):
+    """ The milvus records of the worker reports, merged into one recorder """
+
+    def __init__(self):
+        self.recorder = RequestRecorder()
+        self.connection_pools = {}
+        self.encode_times = {}
+        # client id -> (time of the last report, users of the worker then)
+        self.last_reports = {}
+
+    def on_worker_report(self, client_id, data):
+        if "milvus_recorder" in data:
+            self.recorder.merge(data["milvus_recorder"])
+            self.connection_pools[client_id] = data["connection_pool"]
+            self.encode_times[client_id] = data["encode_time"]
+        self.last_reports[client_id] = (time.time(), data["user_count"] if "user_count" in data else None)
+
+    def stopped_since(self, client_ids, stop_time):
+        """ Whether every worker has reported after stop_time with no user running, so its records are complete """
+        for client_id in client_ids:
+            report_time, user_count = self.last_reports.get(client_id, (0, None))
+            if report_time < stop_time or user_count:
+                return False
+        return True
+
+    def encode_time(self):
+        """ The slowest worker of every prepared request """
+        res = {}
+        for times in self.encode_times.values():
+            for op, t in times.items():
+                res[op] = max(res.get(op, 0), t)
+        return res
+
+
+def distributed_executor(host, port, collection_name, connection_type="single", run_params=None):
+    """
+    A locust master and worker processes on this host, every worker runs a share of the users,
+    locust merges the stats of the workers, the latency streams and the time series of the workers are merged
+    from their reports the same way, connection_num is the pool size of every worker
+    """
+    workers = int(run_params["workers"])
+    master_port = run_params["master_port"] if "master_port" in run_params else free_port()
+    worker_start_timeout = run_params["worker_start_timeout"] if "worker_start_timeout" in run_params \
+        else DEFAULT_WORKER_START_TIMEOUT
+    locust_user.set_user_tasks(run_params)
+    shared = SharedValues.create(locust_user.gen_user_values(MyUser.params, MyUser.op_info["dimension"]))
+    reports = WorkerReports()
+    events.worker_report.add_listener(reports.on_worker_report)
+    env = locust_user.create_environment(run_params)
+    runner = env.create_master_runner(master_bind_host=MASTER_HOST, master_bind_port=master_port)
+    # spawn rather than fork, the grpc channels and the gevent hub of this process are not inherited
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=worker_main, args=(host, port, collection_name, connection_type, run_params,
+                                                           shared.spec(), master_port), daemon=True)
+                 for _ in range(workers)]
+    try:
+        for process in processes:
+            process.start()
+        deadline = time.time() + worker_start_timeout
+        while len(runner.clients.ready) < workers:
+            if time.time() > deadline or not all(process.is_alive() for process in processes):
+                raise Exception("%d of %d locust workers ready" % (len(runner.clients.ready), workers))
+            gevent.sleep(0.5)
+        logger.info("Start %d locust workers, master port: %d" % (workers, master_port))
+        gevent.spawn(stats_printer(env.stats))
+        locust_user.start_runner(env, runner, run_params)
+        gevent.sleep(run_params["during_time"])
+        stop_time = time.time()
+        client_ids = list(runner.clients.keys())
+        runner.stop()
+        # the workers report every few seconds, the first report with no user running is the last one
+        deadline = time.time() + DEFAULT_REPORT_TIMEOUT
+        while not reports.stopped_since(client_ids, stop_time):
+            if time.time() > deadline:
+                logger.warning("Locust workers did not report after stop, the last records may be missing")
+                break
+            gevent.sleep(0.2)
+        result = locust_user.locust_result(env, collection_name, reports.encode_time(), reports.recorder,
+                                           [reports.connection_pools[i] for i in client_ids
+                                            if i in reports.connection_pools])
+        result["workers"] = workers
+        runner.quit()
+    finally:
+        events.worker_report.remove_listener(reports.on_worker_report)
+        for process in processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        shared.unlink()
+    return result
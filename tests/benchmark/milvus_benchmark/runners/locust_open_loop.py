@@ -0,0 +1,176 @@
+import time
+import random
+import logging
+import gevent
+from gevent.pool import Pool
+from milvus_benchmark import utils
+from milvus_benchmark.client import MilvusClient
+from .locust_tasks import Tasks, prepare_requests
+from .locust_user import gen_user_values, init_grpc_gevent
+from .locust_task import check_result
+from .histogram import LatencyHistogram, NS_PER_MS, NS_PER_SEC
+
+logger = logging.getLogger("milvus_benchmark.runners.locust_open_loop")
+
+# requests in flight at the same time, the later ones wait in the scheduler and the wait counts in latency
+DEFAULT_MAX_CONCURRENCY = 1000
+# a step is saturated if the achieved throughput is below this ratio of the target
+SATURATION_RATIO = 0.95
+
+
+class CheckedClient(object):
+    """ The MilvusClient of the open loop, a request whose error is swallowed by the client raises as well """
+
+    def __init__(self, client):
+        self.client = client
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+        if not callable(method):
+            return method
+
+        def wrapper(*args, **kwargs):
+            return check_result(name, method(*args, **kwargs))
+
+        return wrapper
+
+
+class OpenLoopUser(object):
+    """ Carries the same attributes as MyUser, so that the methods of Tasks can be reused """
+
+    def __init__(self, client, params, op_info, values):
+        self.client = client
+        self.params = params
+        self.op_info = op_info
+        self.values = values
+
+
+def gen_schedule(run_params):
+    """
+    Return the steps of the schedule: [(target_qps, during_time)]
+    target_qps: a number for a constant rate during during_time,
+                or a list of rates, each one lasts step_time
+    """
+    target_qps = run_params["target_qps"]
+    if isinstance(target_qps, list):
+        step_time = utils.timestr_to_int(run_params["step_time"])
+        return [(float(qps), step_time) for qps in target_qps]
+    return [(float(target_qps), run_params["during_time"])]
+
+
+class StepStats(object):
+    def __init__(self, target_qps, during_time):
+        self.target_qps = target_qps
+        self.during_time = during_time
+        self.start = None
+        self.last_finish = None
+        self.sent = 0
+        self.completed = 0
+        self.fail = 0
+        self.histogram = LatencyHistogram()
+
+    def to_dict(self):
+        # the step lasts until its last response if the server can not keep up
+        elapsed = self.during_time
+        if self.start is not None and self.last_finish is not None:
+            elapsed = max(elapsed, self.last_finish - self.start)
+        achieved_qps = (self.completed - self.fail) / elapsed if elapsed else 0.0
+        return {
+            "target_qps": self.target_qps,
+            "achieved_qps": round(achieved_qps, 1),
+            "achieved_ratio": round(achieved_qps / self.target_qps, 3) if self.target_qps else 0.0,
+            "sent": self.sent,
+            "fail": self.fail,
+            "latency": self.histogram.summary()
+        }
+
+
+def open_loop_executor(host, port, collection_name, connection_type="single", run_params=None):
+    """
+    Issue requests at the target rate whatever the response time of the server is,
+    latency is measured from the intended send time so that queueing in the client is not hidden
+    """
+    init_grpc_gevent()
+    m = MilvusClient(host=host, port=port, collection_name=collection_name)
+    params = {}
+    ops = []
+    for op, value in run_params["tasks"].items():
+        ops.extend([op] * int(value["weight"]))
+        params[op] = value["params"] if "params" in value else None
+    op_info = run_params["op_info"]
+    user = OpenLoopUser(CheckedClient(m), params, op_info, gen_user_values(params, op_info["dimension"]))
+    encode_time = prepare_requests(m, params, op_info, user.values)
+    max_concurrency = run_params["max_concurrency"] if "max_concurrency" in run_params else DEFAULT_MAX_CONCURRENCY
+    if connection_type == "multi":
+        logger.warning("Open loop mode shares one connection, connection_type: multi is ignored")
+
+    schedule = gen_schedule(run_params)
+    steps = [StepStats(qps, during_time) for qps, during_time in schedule]
+    op_histograms = {op: LatencyHistogram() for op in params}
+    total = LatencyHistogram()
+    pool = Pool(max_concurrency)
+    rand = random.Random(run_params["seed"] if "seed" in run_params else None)
+
+    def fire(op, step, intended):
+        success = True
+        try:
+            getattr(Tasks, op)(user)
+        except Exception as e:
+            success = False
+            logger.debug("%s failed: %s" % (op, str(e)))
+        finish = time.perf_counter()
+        latency = int((finish - intended) * NS_PER_SEC)
+        step.completed += 1
+        step.last_finish = finish if step.last_finish is None else max(step.last_finish, finish)
+        if not success:
+            step.fail += 1
+            return
+        step.histogram.record(latency)
+        op_histograms[op].record(latency)
+        total.record(latency)
+
+    logger.info("Start open loop schedule: %s" % schedule)
+    start = time.perf_counter()
+    step_start = start
+    for step in steps:
+        interval = 1.0 / step.target_qps
+        count = int(step.during_time * step.target_qps)
+        step.start = step_start
+        for i in range(count):
+            intended = step_start + i * interval
+            delay = intended - time.perf_counter()
+            if delay > 0:
+                gevent.sleep(delay)
+            step.sent += 1
+            pool.spawn(fire, rand.choice(ops), step, intended)
+        step_start += step.during_time
+    pool.join()
+    total_time = time.perf_counter() - start
+
+    step_results = [step.to_dict() for step in steps]
+    saturation_qps = None
+    for res in step_results:
+        if res["achieved_qps"] < res["target_qps"] * SATURATION_RATIO:
+            saturation_qps = res["target_qps"]
+            break
+    sent = sum(step.sent for step in steps)
+    fail = sum(step.fail for step in steps)
+    target_qps = sent / sum(step.during_time for step in steps)
+    achieved_qps = (sent - fail) / total_time
+    result = {
+        "target_qps": round(target_qps, 1),
+        "achieved_qps": round(achieved_qps, 1),
+        "achieved_ratio": round(achieved_qps / target_qps, 3) if target_qps else 0.0,
+        "rps": round(achieved_qps, 1),
+        "fail_ratio": fail / sent if sent else 0.0,
+        "max_response_time": round((total.max or 0) / NS_PER_MS, 1),
+        "avg_response_time": round(total.mean() / NS_PER_MS, 1),
+        "saturation_qps": saturation_qps,
+        "steps": step_results,
+        "ops": {op: h.summary() for op, h in op_histograms.items()},
+        "latency": total.summary(),
+        "latency_histogram": total.to_dict(),
+        "encode_time": encode_time
+    }
+    logger.info(result)
+    return result
@@ -0,0 +1,213 @@
+import logging
+import weakref
+import gevent
+from milvus_benchmark.client import MilvusClient
+from .histogram import LatencyHistogram
+
+logger = logging.getLogger("milvus_benchmark.runners.locust_pool")
+
+ROUND_ROBIN = "round_robin"
+LEAST_INFLIGHT = "least_inflight"
+# every greenlet keeps the connection it got at its first request, like a worker of an application
+STICKY = "sticky"
+STRATEGIES = [ROUND_ROBIN, LEAST_INFLIGHT, STICKY]
+
+DEFAULT_POOL_SIZE = 1
+# seconds between the health checks of the idle connections, 0 to disable
+DEFAULT_HEALTH_CHECK_INTERVAL = 30
+# consecutive failed requests after which a connection is reconnected
+DEFAULT_MAX_FAILURES = 3
+DEFAULT_CONNECT_TIMEOUT = 300
+
+
+class PooledConnection(object):
+    def __init__(self, index, client):
+        self.index = index
+        self.client = client
+        self.healthy = True
+        self.inflight = 0
+        self.max_inflight = 0
+        # the sum of the in-flight requests seen by every request at its start, for the average
+        self.inflight_total = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.reconnects = 0
+        self.histogram = LatencyHistogram()
+
+    def summary(self):
+        return {
+            "index": self.index,
+            "healthy": self.healthy,
+            "requests": self.requests,
+            "failures": self.failures,
+            "reconnects": self.reconnects,
+            "inflight": self.inflight,
+            "max_inflight": self.max_inflight,
+            "avg_inflight": round(self.inflight_total / self.requests, 3) if self.requests else 0.0,
+            "latency": self.histogram.summary()
+        }
+
+
+class ConnectionPool(object):
+    """
+    A fixed number of MilvusClient connections shared by the greenlets of the locust users,
+    a request acquires a connection by the strategy and releases it with its latency:
+        round_robin    the next healthy connection
+        least_inflight    the healthy connection with the fewest requests in flight
+        sticky    the connection the greenlet got at its first request, the least used one
+    A connection is unhealthy after max_failures consecutive failed requests or a failed health check,
+    it is skipped while it is reconnected in a greenlet of its own.
+    """
+
+    def __init__(self, host, port, collection_name, size=DEFAULT_POOL_SIZE, strategy=ROUND_ROBIN,
+                 health_check_interval=DEFAULT_HEALTH_CHECK_INTERVAL, max_failures=DEFAULT_MAX_FAILURES,
+                 clients=None):
+        if strategy not in STRATEGIES:
+            raise Exception("Connection pool strategy: %s not in %s" % (strategy, STRATEGIES))
+        self.host = host
+        self.port = port
+        self.collection_name = collection_name
+        self.strategy = strategy
+        self.health_check_interval = health_check_interval
+        self.max_failures = max_failures
+        clients = list(clients) if clients else []
+        for _ in range(len(clients), max(int(size), 1)):
+            clients.append(self.connect())
+        self.connections = [PooledConnection(i, client) for i, client in enumerate(clients)]
+        self._next = 0
+        self._bindings = weakref.WeakKeyDictionary()
+        self._reconnecting = set()
+        self._health_checker = None
+        logger.info("Connection pool of %d connections, strategy: %s" % (len(self.connections), strategy))
+
+    def __len__(self):
+        return len(self.connections)
+
+    def connect(self):
+        return MilvusClient(host=self.host, port=self.port, collection_name=self.collection_name,
+                            timeout=DEFAULT_CONNECT_TIMEOUT)
+
+    def _candidates(self):
+        healthy = [conn for conn in self.connections if conn.healthy]
+        # all the connections are tried rather than none if the server is down
+        return healthy if healthy else self.connections
+
+    def _rotate(self, candidates):
+        start = self._next % len(candidates)
+        self._next = start + 1
+        return candidates[start:] + candidates[:start]
+
+    def select(self):
+        candidates = self._candidates()
+        if self.strategy == ROUND_ROBIN:
+            return self._rotate(candidates)[0]
+        if self.strategy == LEAST_INFLIGHT:
+            # the ties are rotated so that an idle pool is used evenly
+            return min(self._rotate(candidates), key=lambda conn: conn.inflight)
+        greenlet = gevent.getcurrent()
+        conn = self._bindings.get(greenlet)
+        if conn is None or not conn.healthy:
+            # the bindings of the finished greenlets are gone with them
+            bound = self.bound_greenlets()
+            conn = min(self._rotate(candidates), key=lambda c: bound[c.index])
+            self._bindings[greenlet] = conn
+        return conn
+
+    def bound_greenlets(self):
+        """ The number of the greenlets bound to every connection by the sticky strategy """
+        bound = [0] * len(self.connections)
+        for conn in list(self._bindings.values()):
+            bound[conn.index] += 1
+        return bound
+
+    def acquire(self):
+        conn = self.select()
+        conn.inflight_total += conn.inflight
+        conn.inflight += 1
+        conn.max_inflight = max(conn.max_inflight, conn.inflight)
+        return conn
+
+    def release(self, conn, latency_ns, success, client=None):
+        """ client: the client the request was sent by, its failures after a reconnect are not counted """
+        conn.inflight -= 1
+        conn.requests += 1
+        if success:
+            conn.consecutive_failures = 0
+            conn.histogram.record(latency_ns)
+            return
+        conn.failures += 1
+        if client is not None and client is not conn.client:
+            return
+        conn.consecutive_failures += 1
+        if conn.consecutive_failures >= self.max_failures and conn.healthy:
+            logger.warning("Connection %d failed %d times, reconnect" % (conn.index, conn.consecutive_failures))
+            self.mark_unhealthy(conn)
+
+    def mark_unhealthy(self, conn):
+        conn.healthy = False
+        if conn.index not in self._reconnecting:
+            self._reconnecting.add(conn.index)
+            gevent.spawn(self.reconnect, conn)
+
+    def reconnect(self, conn):
+        try:
+            client = self.connect()
+            # the requests in flight finish on the old client
+            conn.client = client
+            conn.reconnects += 1
+            conn.consecutive_failures = 0
+            conn.healthy = True
+            logger.info("Connection %d reconnected" % conn.index)
+        except Exception as e:
+            logger.error("Connection %d reconnect failed: %s" % (conn.index, str(e)))
+        finally:
+            self._reconnecting.discard(conn.index)
+
+    def check(self, conn):
+        """ Check an idle connection by a has_collection request """
+        try:
+            conn.client.exists_collection()
+            return True
+        except Exception as e:
+            logger.warning("Connection %d health check failed: %s" % (conn.index, str(e)))
+            self.mark_unhealthy(conn)
+            return False
+
+    def _health_check_loop(self):
+        while True:
+            gevent.sleep(self.health_check_interval)
+            for conn in self.connections:
+                if conn.healthy and conn.inflight == 0:
+                    self.check(conn)
+
+    def start(self):
+        if self.health_check_interval and self._health_checker is None:
+            self._health_checker = gevent.spawn(self._health_check_loop)
+
+    def stop(self):
+        if self._health_checker is not None:
+            self._health_checker.kill()
+            self._health_checker = None
+
+    def summary(self):
+        connections = [conn.summary() for conn in self.connections]
+        if self.strategy == STICKY:
+            for conn, bound in zip(connections, self.bound_greenlets()):
+                conn["greenlets"] = bound
+        return {
+            "size": len(self.connections),
+            "strategy": self.strategy,
+            "connections": connections
+        }
+
+
+def get_pool_params(run_params):
+    """ The connection pool options of the suite task """
+    return {
+        "size": run_params["connection_num"] if "connection_num" in run_params else DEFAULT_POOL_SIZE,
+        "strategy": run_params["pool_strategy"] if "pool_strategy" in run_params else ROUND_ROBIN,
+        "health_check_interval": run_params["health_check_interval"] if "health_check_interval" in run_params
+        else DEFAULT_HEALTH_CHECK_INTERVAL,
+        "max_failures": run_params["max_failures"] if "max_failures" in run_params else DEFAULT_MAX_FAILURES
+    }
@@ -0,0 +1,149 @@
+import os
+import time
+import logging
+import pandas as pd
+from milvus_benchmark import config
+from .histogram import LatencyHistogram
+
+logger = logging.getLogger("milvus_benchmark.runners.locust_stats")
+
+STATS_DIR = config.LOG_PATH + "locust_stats/"
+NS_PER_US = 1000
+
+
+def get_search_shape(args, kwargs):
+    """ Return (nq, topk) of the vector_query passed to MilvusClient.query or of a PreparedSearch, or (None, None) """
+    vector_query = args[0] if args else kwargs.get("vector_query", kwargs.get("prepared"))
+    if hasattr(vector_query, "nq"):
+        return vector_query.nq, vector_query.topk
+    try:
+        for field_query in vector_query["vector"].values():
+            return len(field_query["query"]), field_query["topk"]
+    except (TypeError, KeyError, AttributeError):
+        pass
+    return None, None
+
+
+def get_response_length(result):
+    """
+    Size of the response in count of values:
+    search: hits * fields (id, distance and output fields), query: returned fields, insert: primary keys
+    """
+    if result is None:
+        return 0
+    try:
+        items = list(result)
+    except TypeError:
+        return 0
+    if not items:
+        return 0
+    first = items[0]
+    if isinstance(first, dict):
+        return sum(len(row) for row in items)
+    if hasattr(first, "ids"):
+        hits = sum(len(item.ids) for item in items)
+        fields = 2
+        try:
+            fields += len(first[0].entity.fields)
+        except Exception:
+            pass
+        return hits * fields
+    return len(items)
+
+
+class RequestRecorder(object):
+    """
+    Latency streams of every operation and every (operation, nq, topk),
+    and the per-second time series of all the requests
+    """
+
+    def __init__(self):
+        self.streams = {}
+        self.series = {}
+
+    @staticmethod
+    def stream_name(name, nq=None, topk=None):
+        if nq is None:
+            return name
+        return "%s:nq=%d,topk=%d" % (name, nq, topk)
+
+    def _histogram(self, stream):
+        if stream not in self.streams:
+            self.streams[stream] = LatencyHistogram()
+        return self.streams[stream]
+
+    def record(self, name, latency_us, success, response_length=0, nq=None, topk=None, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        second = int(timestamp)
+        key = (second, name)
+        point = self.series.get(key)
+        if point is None:
+            point = self.series[key] = [0, 0, 0.0, 0.0, 0]
+        point[0] += 1
+        if not success:
+            point[1] += 1
+            return
+        point[2] += latency_us
+        point[3] = max(point[3], latency_us)
+        point[4] += response_length
+        latency_ns = latency_us * NS_PER_US
+        self._histogram(name).record(latency_ns)
+        if nq is not None:
+            self._histogram(self.stream_name(name, nq, topk)).record(latency_ns)
+
+    def summary(self):
+        return {stream: h.summary() for stream, h in self.streams.items()}
+
+    def drain(self):
+        """ The serializable records since the last drain, they are removed from the recorder """
+        delta = {
+            "streams": {stream: h.to_dict() for stream, h in self.streams.items()},
+            "series": [[second, name] + point for (second, name), point in self.series.items()]
+        }
+        self.streams = {}
+        self.series = {}
+        return delta
+
+    def merge(self, delta):
+        """ Add the drained records of another recorder, the histograms and the points are merged exactly """
+        for stream, data in delta["streams"].items():
+            self._histogram(stream).merge(LatencyHistogram.from_dict(data))
+        for second, name, count, fail, total_us, max_us, response_length in delta["series"]:
+            point = self.series.get((second, name))
+            if point is None:
+                point = self.series[(second, name)] = [0, 0, 0.0, 0.0, 0]
+            point[0] += count
+            point[1] += fail
+            point[2] += total_us
+            point[3] = max(point[3], max_us)
+            point[4] += response_length
+        return self
+
+    def to_dataframe(self):
+        rows = []
+        for (second, name), (count, fail, total_us, max_us, response_length) in sorted(self.series.items()):
+            success = count - fail
+            rows.append({
+                "timestamp": second,
+                "name": name,
+                "requests": count,
+                "failures": fail,
+                "avg_latency_us": total_us / success if success else 0.0,
+                "max_latency_us": max_us,
+                "response_length": response_length
+            })
+        return pd.DataFrame(rows, columns=["timestamp", "name", "requests", "failures", "avg_latency_us",
+                                           "max_latency_us", "response_length"])
+
+    def export_parquet(self, prefix, stats_dir=STATS_DIR):
+        """ Write the time series to parquet, return the file path or None if failed """
+        file_name = os.path.join(stats_dir, "%s_%d.parquet" % (prefix, int(time.time())))
+        try:
+            os.makedirs(stats_dir, exist_ok=True)
+            self.to_dataframe().to_parquet(file_name, index=False)
+        except Exception as e:
+            logger.warning("Export locust time series to %s failed: %s" % (file_name, str(e)))
+            return None
+        logger.info("Export locust time series to %s" % file_name)
+        return file_name
@@ -1,36 +1,78 @@
 import time
 import logging
 from locust import User, events
-from milvus_benchmark.client import MilvusClient
+from .locust_pool import ConnectionPool
+from .locust_stats import RequestRecorder, get_search_shape, get_response_length, NS_PER_US
 
 logger = logging.getLogger("milvus_benchmark.runners.locust_task")
+# a prepared search is reported as the query it replays
+REQUEST_NAMES = {"search_prepared": "query"}
+# the methods of MilvusClient which log their error and return None instead of raising
+NONE_ON_ERROR = ["insert"]
+
+
+def check_result(name, result):
+    """ Raise for a request whose error was swallowed by MilvusClient, so that it is counted as a failure """
+    if result is None and name in NONE_ON_ERROR:
+        raise Exception("%s failed, see the error logged by the client" % name)
+    return result
 
 
 class MilvusTask(object):
+    """
+    The client of the locust users, every request gets a connection of the pool:
+    single: the given MilvusClient m, multi: a pool of pool_size connections
+    """
+
     def __init__(self, *args, **kwargs):
         self.request_type = "grpc"
+        self.recorder = RequestRecorder()
         connection_type = kwargs.get("connection_type")
+        pool_params = kwargs.get("pool_params") or {}
+        host = kwargs.get("host")
+        port = kwargs.get("port")
+        collection_name = kwargs.get("collection_name")
         if connection_type == "single":
-            self.m = kwargs.get("m")
+            pool_params = dict(pool_params, size=1)
+            self.pool = ConnectionPool(host, port, collection_name, clients=[kwargs.get("m")], **pool_params)
         elif connection_type == "multi":
-            host = kwargs.get("host")
-            port = kwargs.get("port")
-            collection_name = kwargs.get("collection_name")
-            self.m = MilvusClient(host=host, port=port, collection_name=collection_name)
+            self.pool = ConnectionPool(host, port, collection_name, **pool_params)
+        else:
+            raise Exception("Connection type: %s not supported" % connection_type)
+
+    @property
+    def m(self):
+        return self.pool.connections[0].client
 
     def __getattr__(self, name):
-        func = getattr(self.m, name)
+        if name == "pool":
+            raise AttributeError(name)
+        # fail at the attribute as before if the client has no such method
+        getattr(self.m, name)
+        request_name = REQUEST_NAMES.get(name, name)
 
         def wrapper(*args, **kwargs):
-            start_time = time.time()
+            nq, topk = get_search_shape(args, kwargs) if request_name == "query" else (None, None)
+            conn = self.pool.acquire()
+            client = conn.client
+            start_time = time.perf_counter_ns()
             try:
-                result = func(*args, **kwargs)
-                total_time = int((time.time() - start_time) * 1000)
-                events.request_success.fire(request_type=self.request_type, name=name, response_time=total_time,
-                                            response_length=0)
+                result = check_result(name, getattr(client, name)(*args, **kwargs))
             except Exception as e:
-                total_time = int((time.time() - start_time) * 1000)
-                events.request_failure.fire(request_type=self.request_type, name=name, response_time=total_time,
-                                            exception=e, response_length=0)
+                latency_ns = time.perf_counter_ns() - start_time
+                self.pool.release(conn, latency_ns, False, client=client)
+                latency_us = latency_ns / NS_PER_US
+                events.request_failure.fire(request_type=self.request_type, name=request_name,
+                                            response_time=latency_us / 1000, exception=e, response_length=0)
+                self.recorder.record(request_name, latency_us, False, nq=nq, topk=topk)
+                return None
+            latency_ns = time.perf_counter_ns() - start_time
+            self.pool.release(conn, latency_ns, True, client=client)
+            latency_us = latency_ns / NS_PER_US
+            response_length = get_response_length(result)
+            events.request_success.fire(request_type=self.request_type, name=request_name,
+                                        response_time=latency_us / 1000, response_length=response_length)
+            self.recorder.record(request_name, latency_us, True, response_length=response_length, nq=nq, topk=topk)
+            return result
 
         return wrapper
@@ -1,35 +1,62 @@
 import random
 import logging
+import numpy as np
 # import math
 from locust import TaskSet, task
 from . import utils
+from . import filters
 
 logger = logging.getLogger("milvus_benchmark.runners.locust_tasks")
 
 
+def prepare_query(client, params, op_info, values):
+    """
+    The search of the query params, built once for every user: (vector_query, filter_query, guarantee_timestamp),
+    and the request encoded once and replayed instead if prepared_search is set in the params
+    """
+    op = "query"
+    vector_query = {"vector": {op_info["vector_field_name"]: {
+        "topk": params[op]["top_k"],
+        "query": np.asarray(values["X"][:params[op]["nq"]], dtype=np.float32),
+        "metric_type": params[op]["metric_type"] if "metric_type" in params[op] else utils.DEFAULT_METRIC_TYPE,
+        "params": params[op]["search_param"]}
+    }}
+    # the filters are and-ed
+    filter_query = None
+    if "filters" in params[op] and params[op]["filters"]:
+        filter_query = filters.compile_filter(params[op]["filters"], op_info["collection_size"])
+        logger.info("Filter: %s, selectivity: %s" % (str(filter_query), filter_query.selectivity()))
+    guarantee_timestamp = params[op]["guarantee_timestamp"] if "guarantee_timestamp" in params[op] else None
+    # logger.debug(filter_query)
+    values["query"] = (vector_query, filter_query, guarantee_timestamp)
+    if "prepared_search" in params[op] and params[op]["prepared_search"]:
+        return client.prepare_search(vector_query, filter_query=filter_query, guarantee_timestamp=guarantee_timestamp)
+    return None
+
+
+def prepare_requests(client, params, op_info, values):
+    """
+    Encode the requests of the tasks into values["prepared"] before the users start,
+    return the client side encoding time of every request which is not in the latency of the requests
+    """
+    prepared = {}
+    if "query" in params:
+        request = prepare_query(client, params, op_info, values)
+        if request is not None:
+            prepared["query"] = request
+    values["prepared"] = prepared
+    return {op: round(request.encode_time, 4) for op, request in prepared.items()}
+
+
 class Tasks(TaskSet):
     @task
     def query(self):
         """ search interface """
         op = "query"
-        # X = utils.generate_vectors(self.params[op]["nq"], self.op_info["dimension"])
-        vector_query = {"vector": {self.op_info["vector_field_name"]: {
-            "topk": self.params[op]["top_k"], 
-            "query": self.values["X"][:self.params[op]["nq"]], 
-            "metric_type": self.params[op]["metric_type"] if "metric_type" in self.params[op] else utils.DEFAULT_METRIC_TYPE, 
-            "params": self.params[op]["search_param"]}
-        }}
-        filter_query = []
-        if "filters" in self.params[op]:
-            for filter in self.params[op]["filters"]:
-                if isinstance(filter, dict) and "range" in filter:
-                    filter_query.append(eval(filter["range"]))
-                if isinstance(filter, dict) and "term" in filter:
-                    filter_query.append(eval(filter["term"]))
-
-        guarantee_timestamp = self.params[op]["guarantee_timestamp"] if "guarantee_timestamp" in self.params[op] else None
-
-        # logger.debug(filter_query)
+        if op in self.values["prepared"]:
+            self.client.search_prepared(self.values["prepared"][op], log=False, timeout=30)
+            return
+        vector_query, filter_query, guarantee_timestamp = self.values[op]
         self.client.query(vector_query, filter_query=filter_query, log=False, guarantee_timestamp=guarantee_timestamp,
                           timeout=30)
 
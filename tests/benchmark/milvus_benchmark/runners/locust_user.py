@@ -12,7 +12,9 @@ from locust.stats import stats_printer, print_stats
 # from locust.log import setup_logging, greenlet_exception_logger
 from milvus_benchmark.client import MilvusClient
 from .locust_task import MilvusTask
-from .locust_tasks import Tasks
+from .locust_pool import get_pool_params
+from .locust_tasks import Tasks, prepare_requests
+from .histogram import LatencyHistogram
 from . import utils
 
 locust.stats.CONSOLE_STATS_INTERVAL_SEC = 20
@@ -53,8 +55,21 @@ class MyUser(User):
     pass
 
 
-def locust_executor(host, port, collection_name, connection_type="single", run_params=None):
-    m = MilvusClient(host=host, port=port, collection_name=collection_name)
+def gen_user_values(params, dimension):
+    """ Pre-generate the ids and vectors shared by all the users """
+    _nq = nq
+    if "insert" in params and "ni_per" in params["insert"]:
+        ni_per = params["insert"]["ni_per"]
+        _nq = ni_per + 10 if ni_per > nq else _nq
+    return {
+        "ids": [random.randint(1000000, 10000000) for _ in range(nb)],
+        "get_ids": [random.randint(1, 10000000) for _ in range(nb)],
+        "X": utils.generate_vectors(_nq, dimension)
+    }
+
+
+def set_user_tasks(run_params):
+    """ The tasks and the params of MyUser in every process, the master and the workers as well """
     MyUser.op_info = run_params["op_info"]
     MyUser.params = {}
     tasks = run_params["tasks"]
@@ -65,44 +80,51 @@ def locust_executor(host, port, collection_name, connection_type="single", run_p
         MyUser.params[op] = value["params"] if "params" in value else None
     logger.info(MyUser.tasks)
 
-    _nq = nq
-    if "insert" in MyUser.params and "ni_per" in MyUser.params["insert"]:
-        ni_per = MyUser.params["insert"]["ni_per"]
-        _nq = ni_per + 10 if ni_per > nq else _nq
 
-    MyUser.values = {
-        "ids": [random.randint(1000000, 10000000) for _ in range(nb)],
-        "get_ids": [random.randint(1, 10000000) for _ in range(nb)],
-        "X": utils.generate_vectors(_nq, MyUser.op_info["dimension"])
-    }
+def init_grpc_gevent():
+    """
+    pymilvus blocks in the grpc core unless grpc cooperates with the gevent hub of the users,
+    called by the locust executors before they create their channels, the thread based runners are not changed
+    """
+    import grpc.experimental.gevent as grpc_gevent
+    grpc_gevent.init_gevent()
+
+
+def setup_user(host, port, collection_name, connection_type, run_params, values=None):
+    """
+    Set the tasks, the pre-generated values and the client of MyUser,
+    return the encoding time of the prepared requests
+    """
+    init_grpc_gevent()
+    m = MilvusClient(host=host, port=port, collection_name=collection_name)
+    set_user_tasks(run_params)
+    MyUser.values = values if values is not None else gen_user_values(MyUser.params, MyUser.op_info["dimension"])
+    encode_time = prepare_requests(m, MyUser.params, MyUser.op_info, MyUser.values)
 
     # MyUser.tasks = {Tasks.query: 1, Tasks.flush: 1}
     MyUser.client = MilvusTask(host=host, port=port, collection_name=collection_name, connection_type=connection_type,
-                               m=m)
+                               m=m, pool_params=get_pool_params(run_params))
+    return encode_time
+
+
+def create_environment(run_params):
+    """ The locust environment of MyUser, with the step load shape if load_shape is set """
     if "load_shape" in run_params and run_params["load_shape"]:
-        test = StepLoadShape() 
+        test = StepLoadShape()
         test.init(run_params["step_time"], run_params["step_load"], run_params["spawn_rate"], run_params["during_time"])
-        env = Environment(events=events, user_classes=[MyUser], shape_class=test)
-        runner = env.create_local_runner()
-        env.runner.start_shape()
-    else:
-        env = Environment(events=events, user_classes=[MyUser])
-        runner = env.create_local_runner()
-    # setup logging
-    # setup_logging("WARNING", "/dev/null")
-    # greenlet_exception_logger(logger=logger)
-    gevent.spawn(stats_printer(env.stats))
-    # env.create_web_ui("127.0.0.1", 8089)
-    # gevent.spawn(stats_printer(env.stats), env, "test", full_history=True)
-    # events.init.fire(environment=env, runner=runner)
+        return Environment(events=events, user_classes=[MyUser], shape_class=test)
+    return Environment(events=events, user_classes=[MyUser])
+
+
+def start_runner(env, runner, run_params):
+    if env.shape_class is not None:
+        runner.start_shape()
     clients_num = run_params["clients_num"] if "clients_num" in run_params else 0
-    step_load = run_params["step_load"] if "step_load" in run_params else 0
-    step_time = run_params["step_time"] if "step_time" in run_params else 0
     spawn_rate = run_params["spawn_rate"]
-    during_time = run_params["during_time"]
     runner.start(clients_num, spawn_rate=spawn_rate)
-    gevent.spawn_later(during_time, lambda: runner.quit())
-    runner.greenlet.join()
+
+
+def locust_result(env, collection_name, encode_time, recorder, connection_pool):
     print_stats(env.stats)
     result = {
         "rps": round(env.stats.total.current_rps, 1),  # Number of interface requests per second
@@ -110,5 +132,37 @@ def locust_executor(host, port, collection_name, connection_type="single", run_p
         "max_response_time": round(env.stats.total.max_response_time, 1),  # Maximum interface response time
         "avg_response_time": round(env.stats.total.avg_response_time, 1)  # ratio of average response time
     }
+    # percentiles, and the histogram which can be merged with other locust runners
+    histogram = LatencyHistogram.from_locust_stats(env.stats.total)
+    result.update({"latency": histogram.summary(), "latency_histogram": histogram.to_dict(),
+                   "encode_time": encode_time})
+    # latency streams per operation and per nq/topk, the per-second time series is exported as parquet
+    result.update({
+        "streams": recorder.summary(),
+        "timeseries_file": recorder.export_parquet(collection_name),
+        # in-flight and latency of every connection, for the ratio of connections to users
+        "connection_pool": connection_pool
+    })
+    return result
+
+
+def locust_executor(host, port, collection_name, connection_type="single", run_params=None):
+    encode_time = setup_user(host, port, collection_name, connection_type, run_params)
+    MyUser.client.pool.start()
+    env = create_environment(run_params)
+    runner = env.create_local_runner()
+    # setup logging
+    # setup_logging("WARNING", "/dev/null")
+    # greenlet_exception_logger(logger=logger)
+    gevent.spawn(stats_printer(env.stats))
+    # env.create_web_ui("127.0.0.1", 8089)
+    # gevent.spawn(stats_printer(env.stats), env, "test", full_history=True)
+    # events.init.fire(environment=env, runner=runner)
+    during_time = run_params["during_time"]
+    start_runner(env, runner, run_params)
+    gevent.spawn_later(during_time, lambda: runner.quit())
+    runner.greenlet.join()
+    result = locust_result(env, collection_name, encode_time, MyUser.client.recorder, MyUser.client.pool.summary())
+    MyUser.client.pool.stop()
     runner.stop()
     return result
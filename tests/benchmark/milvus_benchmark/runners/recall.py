@@ -0,0 +1,96 @@
+import logging
+import functools
+import numpy as np
+
+logger = logging.getLogger("milvus_benchmark.runners.recall")
+
+# pad value for result rows shorter than top_k, never counted as a hit
+PAD_ID = -1
+# rows per block when intersecting, bounds the temporary (block, 2 * top_k) matrices
+DEFAULT_BLOCK_SIZE = 1024
+
+
+def ids_to_matrix(ids, pad=PAD_ID):
+    """
+    Convert ids returned by search (list of rows, maybe ragged) to a 2-D int64 array
+    return: (matrix, lengths), lengths is the real count of ids in every row
+    """
+    if isinstance(ids, np.ndarray) and ids.ndim == 2:
+        lengths = np.full(ids.shape[0], ids.shape[1], dtype=np.int64)
+        return ids.astype(np.int64, copy=False), lengths
+    rows = [list(row) for row in ids]
+    lengths = np.array([len(row) for row in rows], dtype=np.int64)
+    width = int(lengths.max()) if len(rows) else 0
+    matrix = np.full((len(rows), width), pad, dtype=np.int64)
+    for index, row in enumerate(rows):
+        matrix[index, :len(row)] = row
+    return matrix, lengths
+
+
+def _block_intersection_counts(true_block, result_block, pad):
+    """ Count |set(true_row) & set(result_row)| for every row of the block """
+    width = true_block.shape[1]
+    merged = np.concatenate([true_block, result_block], axis=1)
+    # stable sort keeps the true id in front of equal result ids,
+    # so every common id contributes exactly one (true, result) adjacent pair
+    order = np.argsort(merged, axis=1, kind="stable")
+    values = np.take_along_axis(merged, order, axis=1)
+    from_result = order >= width
+    hits = (values[:, 1:] == values[:, :-1]) & ~from_result[:, :-1] & from_result[:, 1:] & (values[:, 1:] != pad)
+    return hits.sum(axis=1)
+
+
+def intersection_counts(true_ids, result_ids, top_k=None, pad=PAD_ID, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Row-wise intersection size of the first top_k true ids and the first top_k result ids,
+    all the columns of both are used if top_k is None
+    true_ids: 2-D array of neighbors, must have at least as many rows as result_ids
+    result_ids: 2-D array padded with pad
+    """
+    nq = result_ids.shape[0]
+    counts = np.zeros(nq, dtype=np.int64)
+    for start in range(0, nq, block_size):
+        end = min(start + block_size, nq)
+        true_block = np.asarray(true_ids[start:end, :top_k], dtype=np.int64)
+        result_block = result_ids[start:end, :top_k]
+        counts[start:end] = _block_intersection_counts(true_block, result_block, pad)
+    return counts
+
+
+def get_recall_value(true_ids, result_ids, precision=3):
+    """
+    Use the intersection length, same result as the set based implementation
+    true_ids: neighbors taken from the dataset
+    result_ids: ids returned by query
+    """
+    result_matrix, lengths = ids_to_matrix(result_ids)
+    true_matrix = np.asarray(true_ids)
+    counts = intersection_counts(true_matrix, result_matrix)
+    ratio = counts / np.maximum(lengths, 1)
+    return round(float(ratio.mean()), precision)
+
+
+def get_recall_values(true_ids, result_ids, top_ks, precision=3):
+    """
+    Calculate recall@k for every k in top_ks from one result matrix
+    return: {k: recall}, k larger than the width of result_ids is skipped
+    """
+    result_matrix, lengths = ids_to_matrix(result_ids)
+    true_matrix = np.asarray(true_ids)
+    recalls = dict()
+    for k in sorted(set(top_ks)):
+        if k > result_matrix.shape[1] or k > true_matrix.shape[1]:
+            logger.debug("Skip recall@%d, result width: %d" % (k, result_matrix.shape[1]))
+            continue
+        counts = intersection_counts(true_matrix, result_matrix, top_k=k)
+        ratio = counts / np.maximum(np.minimum(lengths, k), 1)
+        recalls[k] = round(float(ratio.mean()), precision)
+    return recalls
+
+
+@functools.lru_cache(maxsize=4)
+def load_ivecs(file_name):
+    """ Memory-map an ivecs file, only the rows which are sliced are read from disk """
+    data = np.memmap(file_name, dtype='int32', mode='r')
+    d = int(data[0])
+    return data.reshape(-1, d + 1)[:, 1:]
@@ -4,11 +4,55 @@ import json
 import logging
 from milvus_benchmark import parser
 from milvus_benchmark.runners import utils
+from milvus_benchmark.runners import filters as filter_compiler
 from milvus_benchmark.runners.base import BaseRunner
+from milvus_benchmark.runners.histogram import LatencyHistogram, NS_PER_SEC
 
 logger = logging.getLogger("milvus_benchmark.runners.search")
 
 
+def search_time_result(histogram, prepared=None):
+    """
+    search_time and avc_search_time in seconds as before,
+    latency in ms with percentiles, and the histogram which can be merged with other runs,
+    the client side encoding of a prepared request is not in the latency and reported as encode_time
+    """
+    result = {
+        "search_time": round(histogram.min / NS_PER_SEC, 2),
+        "avc_search_time": round(histogram.mean() / NS_PER_SEC, 2),
+        "latency": histogram.summary(),
+        "latency_histogram": histogram.to_dict()
+    }
+    if prepared is not None:
+        result.update({"encode_time": round(prepared.encode_time, 4), "request_size": prepared.size})
+    return result
+
+
+def run_search(milvus, case_param, case_metric=None):
+    """
+    Run the search of the case run_count times, with prepared_search the request is encoded once and replayed,
+    otherwise every search is a query of pymilvus as before
+    """
+    prepared = None
+    if case_param["prepared_search"]:
+        prepared = milvus.prepare_search(case_param["vector_query"], filter_query=case_param["filter_query"],
+                                         guarantee_timestamp=case_param["guarantee_timestamp"])
+    run_count = case_param["run_count"]
+    histogram = LatencyHistogram()
+    for i in range(run_count):
+        logger.debug("Start run query, run %d of %s" % (i+1, run_count))
+        if case_metric is not None:
+            logger.info(case_metric.search)
+        start_time = time.perf_counter_ns()
+        if prepared is not None:
+            _query_res = milvus.search_prepared(prepared)
+        else:
+            _query_res = milvus.query(case_param["vector_query"], filter_query=case_param["filter_query"],
+                                      guarantee_timestamp=case_param["guarantee_timestamp"])
+        histogram.record(time.perf_counter_ns() - start_time)
+    return search_time_result(histogram, prepared)
+
+
 class SearchRunner(BaseRunner):
     """run search"""
     name = "search_performance"
@@ -22,8 +66,11 @@ class SearchRunner(BaseRunner):
         run_count = collection["run_count"]
         top_ks = collection["top_ks"]
         nqs = collection["nqs"]
-        filters = collection["filters"] if "filters" in collection else []
+        # compiled once for all the cases, with the selectivity of every filter
+        filters = filter_compiler.get_case_filters(collection, collection_size)
         guarantee_timestamp = collection["guarantee_timestamp"] if "guarantee_timestamp" in collection else None
+        # replay a request encoded once instead of a query of pymilvus for every search
+        prepared_search = collection["prepared_search"] if "prepared_search" in collection else False
         
         search_params = collection["search_params"]
         # TODO: get fields by describe_index
@@ -40,25 +87,15 @@ class SearchRunner(BaseRunner):
         index_info = None
         vector_type = utils.get_vector_type(data_type)
         index_field_name = utils.get_default_field_name(vector_type)
-        base_query_vectors = utils.get_vectors_from_binary(utils.MAX_NQ, dimension, data_type)
+        # the queries of every nq are views of one ndarray, encoded by prepare_search in run_case with prepared_search
+        base_query_vectors = utils.get_query_array(utils.MAX_NQ, dimension, data_type)
         cases = list()
         case_metrics = list()
         self.init_metric(self.name, collection_info, index_info, None)
         for search_param in search_params:
             logger.info("Search param: %s" % json.dumps(search_param))
-            for filter in filters:
-                filter_query = []
-                filter_param = []
-                if filter and isinstance(filter, dict):
-                    if "range" in filter:
-                        filter_query.append(eval(filter["range"]))
-                        filter_param.append(filter["range"])
-                    elif "term" in filter:
-                        filter_query.append(eval(filter["term"]))
-                        filter_param.append(filter["term"])
-                    else:
-                        raise Exception("%s not supported" % filter)
-                logger.info("filter param: %s" % json.dumps(filter_param))
+            for filter_query in filters:
+                logger.info("filter param: %s" % json.dumps(filter_compiler.filter_metric(filter_query), default=str))
                 for nq in nqs:
                     query_vectors = base_query_vectors[0:nq]
                     for top_k in top_ks:
@@ -74,9 +111,9 @@ class SearchRunner(BaseRunner):
                             "nq": nq,
                             "topk": top_k,
                             "search_param": search_param,
-                            "filter": filter_param,
                             "guarantee_timestamp": guarantee_timestamp
                         }
+                        case_metric.search.update(filter_compiler.filter_metric(filter_query))
                         vector_query = {"vector": {index_field_name: search_info}}
                         case = {
                             "collection_name": collection_name,
@@ -84,7 +121,8 @@ class SearchRunner(BaseRunner):
                             "run_count": run_count,
                             "filter_query": filter_query,
                             "vector_query": vector_query,
-                            "guarantee_timestamp": guarantee_timestamp
+                            "guarantee_timestamp": guarantee_timestamp,
+                            "prepared_search": prepared_search
                         }
                         cases.append(case)
                         case_metrics.append(case_metric)
@@ -104,21 +142,7 @@ class SearchRunner(BaseRunner):
 
     def run_case(self, case_metric, **case_param):
         # index_field_name = case_param["index_field_name"]
-        run_count = case_param["run_count"]
-        avg_query_time = 0.0
-        min_query_time = 0.0
-        total_query_time = 0.0        
-        for i in range(run_count):
-            logger.debug("Start run query, run %d of %s" % (i+1, run_count))
-            start_time = time.time()
-            _query_res = self.milvus.query(case_param["vector_query"], filter_query=case_param["filter_query"],
-                                           guarantee_timestamp=case_param["guarantee_timestamp"])
-            interval_time = time.time() - start_time
-            total_query_time += interval_time
-            if (i == 0) or (min_query_time > interval_time):
-                min_query_time = round(interval_time, 2)
-        avg_query_time = round(total_query_time/run_count, 2)
-        tmp_result = {"search_time": min_query_time, "avc_search_time": avg_query_time}
+        tmp_result = run_search(self.milvus, case_param)
         return tmp_result
 
 
@@ -141,9 +165,11 @@ class InsertSearchRunner(BaseRunner):
         top_ks = collection["top_ks"]
         nqs = collection["nqs"]
         guarantee_timestamp = collection["guarantee_timestamp"] if "guarantee_timestamp" in collection else None
+        # replay a request encoded once instead of a query of pymilvus for every search
+        prepared_search = collection["prepared_search"] if "prepared_search" in collection else False
         other_fields = collection["other_fields"] if "other_fields" in collection else None
-        filters = collection["filters"] if "filters" in collection else []
-        filter_query = []
+        # compiled once for all the cases, with the selectivity of every filter
+        filters = filter_compiler.get_case_filters(collection, collection_size)
         search_params = collection["search_params"]
         ni_per = collection["ni_per"]
 
@@ -163,23 +189,14 @@ class InsertSearchRunner(BaseRunner):
         vector_type = utils.get_vector_type(data_type)
         index_field_name = utils.get_default_field_name(vector_type)
         # Get the path of the query.npy file stored on the NAS and get its data
-        base_query_vectors = utils.get_vectors_from_binary(utils.MAX_NQ, dimension, data_type)
+        # the queries of every nq are views of one ndarray, encoded by prepare_search in run_case with prepared_search
+        base_query_vectors = utils.get_query_array(utils.MAX_NQ, dimension, data_type)
         cases = list()
         case_metrics = list()
         self.init_metric(self.name, collection_info, index_info, None)
         
         for search_param in search_params:
-            if not filters:
-                filters.append(None)
-            for filter in filters:
-                # filter_param = []
-                filter_query = []
-                if isinstance(filter, dict) and "range" in filter:
-                    filter_query.append(eval(filter["range"]))
-                    # filter_param.append(filter["range"])
-                if isinstance(filter, dict) and "term" in filter:
-                    filter_query.append(eval(filter["term"]))
-                    # filter_param.append(filter["term"])
+            for filter_query in filters:
                 for nq in nqs:
                     # Take nq groups of data for query
                     query_vectors = base_query_vectors[0:nq]
@@ -197,9 +214,9 @@ class InsertSearchRunner(BaseRunner):
                             "nq": nq,
                             "topk": top_k,
                             "search_param": search_param,
-                            "filter": filter_query,
                             "guarantee_timestamp": guarantee_timestamp
                         }
+                        case_metric.search.update(filter_compiler.filter_metric(filter_query))
                         vector_query = {"vector": {index_field_name: search_info}}
                         case = {
                             "collection_name": collection_name,
@@ -217,7 +234,8 @@ class InsertSearchRunner(BaseRunner):
                             "run_count": run_count,
                             "filter_query": filter_query,
                             "vector_query": vector_query,
-                            "guarantee_timestamp": guarantee_timestamp
+                            "guarantee_timestamp": guarantee_timestamp,
+                            "prepared_search": prepared_search
                         }
                         cases.append(case)
                         case_metrics.append(case_metric)
@@ -275,24 +293,12 @@ class InsertSearchRunner(BaseRunner):
         logger.debug({"load_time": round(time.time()-load_start_time, 2)})
         
     def run_case(self, case_metric, **case_param):
-        run_count = case_param["run_count"]
-        min_query_time = 0.0
-        total_query_time = 0.0        
-        for i in range(run_count):
-            # Number of successive queries
-            logger.debug("Start run query, run %d of %s" % (i+1, run_count))
-            logger.info(case_metric.search)
-            start_time = time.time()
-            _query_res = self.milvus.query(case_param["vector_query"], filter_query=case_param["filter_query"],
-                                           guarantee_timestamp=case_param["guarantee_timestamp"])
-            interval_time = time.time() - start_time
-            total_query_time += interval_time
-            if (i == 0) or (min_query_time > interval_time):
-                min_query_time = round(interval_time, 2)
-        avg_query_time = round(total_query_time/run_count, 2)
-        logger.info("Min query time: %.2f, avg query time: %.2f" % (min_query_time, avg_query_time))
+        # Number of successive queries
+        search_result = run_search(self.milvus, case_param, case_metric)
+        logger.info("Min query time: %.2f, avg query time: %.2f" % (search_result["search_time"], search_result["avc_search_time"]))
         # insert_result: "total_time", "rps", "ni_time"
-        tmp_result = {"insert": self.insert_result, "build_time": self.build_time, "search_time": min_query_time, "avc_search_time": avg_query_time}
+        tmp_result = {"insert": self.insert_result, "build_time": self.build_time}
+        tmp_result.update(search_result)
         # 
         # logger.info("Start load collection")
         # self.milvus.load_collection(timeout=1200)
@@ -8,6 +8,7 @@ from itertools import product
 
 from pymilvus import DataType
 from milvus_benchmark import config
+from milvus_benchmark.runners import recall
 
 logger = logging.getLogger("milvus_benchmark.runners.utils")
 
@@ -24,6 +25,8 @@ WARM_TOP_K = 1
 WARM_NQ = 1
 DEFAULT_DIM = 512
 DEFAULT_METRIC_TYPE = "L2"
+# recall@k also reported for these k, if not larger than the top_k of the case
+RECALL_TOP_KS = [1, 10, 100]
 
 RANDOM_SRC_DATA_DIR = config.RAW_DATA_DIR + 'random/'
 SIFT_SRC_DATA_DIR = config.RAW_DATA_DIR + 'sift1b/'
@@ -84,27 +87,45 @@ def get_len_vectors_per_file(data_type, dimension):
     return vectors_per_file
 
 
+def get_query_file(data_type, dimension):
+    if data_type == "random":
+        return RANDOM_SRC_DATA_DIR + 'query_%d.npy' % dimension
+    elif data_type == "sift":
+        return SIFT_SRC_DATA_DIR + 'query.npy'
+    elif data_type == "deep":
+        return DEEP_SRC_DATA_DIR + 'query.npy'
+    elif data_type == "binary":
+        return BINARY_SRC_DATA_DIR + 'query.npy'
+    else:
+        raise Exception("There is no corresponding file for this data type %s." % str(data_type))
+
+
 def get_vectors_from_binary(nq, dimension, data_type):
     # use the first file, nq should be less than VECTORS_PER_FILE 10001
     if nq > MAX_NQ:
         raise Exception("Over size nq")
     if data_type == "local":
         return generate_vectors(nq, dimension)
-    elif data_type == "random":
-        file_name = RANDOM_SRC_DATA_DIR + 'query_%d.npy' % dimension
-    elif data_type == "sift":
-        file_name = SIFT_SRC_DATA_DIR + 'query.npy'
-    elif data_type == "deep":
-        file_name = DEEP_SRC_DATA_DIR + 'query.npy'
-    elif data_type == "binary":
-        file_name = BINARY_SRC_DATA_DIR + 'query.npy'
-    else:
-        raise Exception("There is no corresponding file for this data type %s." % str(data_type))
-    data = np.load(file_name)
+    # only the first nq rows are read from the memory-mapped file
+    data = np.load(get_query_file(data_type, dimension), mmap_mode='r')
     vectors = data[0:nq].tolist()
     return vectors
 
 
+def get_query_array(nq, dimension, data_type):
+    """
+    The first nq query vectors as an ndarray, float32 for float vectors and uint8 for binary vectors,
+    the queries of smaller nq are views of its first rows
+    """
+    if nq > MAX_NQ:
+        raise Exception("Over size nq")
+    if data_type == "local":
+        return np.asarray(generate_vectors(nq, dimension), dtype=np.float32)
+    data = np.load(get_query_file(data_type, dimension), mmap_mode='r')
+    dtype = np.uint8 if data_type == "binary" else np.float32
+    return np.ascontiguousarray(data[0:nq], dtype=dtype)
+
+
 def generate_vectors(nb, dim):
     return [[random.random() for _ in range(dim)] for _ in range(nb)]
 
@@ -238,28 +259,21 @@ def get_recall_value(true_ids, result_ids):
     true_ids: neighbors taken from the dataset
     result_ids: ids returned by query
     """
-    sum_radio = 0.0
-    for index, item in enumerate(result_ids):
-        # tmp = set(item).intersection(set(flat_id_list[index]))
-
-        # Get the value of true_ids and the returned value to do the intersection
-        tmp = set(true_ids[index]).intersection(set(item))
+    return recall.get_recall_value(true_ids, result_ids)
 
-        # Add up each ratio
-        sum_radio = sum_radio + len(tmp) / len(item)
-        # logger.debug(sum_radio)
 
-    # Calculate the average ratio and take three digits after the decimal point
-    return round(sum_radio / len(result_ids), 3)
+def get_recall_values(true_ids, result_ids, top_ks=None):
+    """ Calculate recall@k for the given top_ks, default RECALL_TOP_KS, from one query result """
+    if top_ks is None:
+        top_ks = RECALL_TOP_KS
+    return recall.get_recall_values(true_ids, result_ids, top_ks)
 
 
 def get_ground_truth_ids(collection_size):
+    """ Return the memory-mapped ground truth, loaded once for every collection size """
     fname = GROUNDTRUTH_MAP[str(collection_size)]
     fname = SIFT_SRC_GROUNDTRUTH_DATA_DIR + "/" + fname
-    a = np.fromfile(fname, dtype='int32')
-    d = a[0]
-    true_ids = a.reshape(-1, d + 1)[:, 1:].copy()
-    return true_ids
+    return recall.load_ivecs(fname)
 
 
 def normalize(metric_type, X):
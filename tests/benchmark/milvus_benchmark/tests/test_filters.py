@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+from milvus_benchmark.runners import filters
+
+
+def test_legacy_range_literal():
+    c = filters.compile_filter({"range": "{'range': {'int64': {'LT': collection_size // 2, 'GT': 10}}}"}, 100)
+    assert c.expression == "int64 > 10 && int64 < 50"
+    assert c.selectivity() == 0.39
+
+
+def test_legacy_term_literal():
+    c = filters.compile_filter({"term": "{'term': {'float': {'values': [1.0, 20.0, 30.0]}}}"}, 100)
+    assert c.expression == "float in [1.0, 20.0, 30.0]"
+    assert c.selectivity() == 0.03
+
+
+def test_legacy_literal_of_two_kinds():
+    c = filters.compile_filter({"range": "{'range': {'int64': {'LT': collection_size // 2, 'GT': 10}}}",
+                                "term": {"float": [1, 20, 30]}}, 100)
+    assert c.expression == "int64 > 10 && int64 < 50 && float in [1, 20, 30]"
+    assert c.selectivity() == 0.02
+
+
+def test_literal_without_eval():
+    for text in ["__import__('os').system('id')", "{'range': (1).__class__}",
+                 "[x for x in ().__class__.__bases__]"]:
+        with pytest.raises(Exception):
+            filters.compile_filter({"range": text}, 10)
+    with pytest.raises(Exception, match="collection_size not defined"):
+        filters.parse_spec("{'range': {'int64': {'LT': collection_size}}}")
+
+
+def test_range_comprehension_as_ndarray():
+    values = filters.parse_spec("[float(i) for i in range(collection_size // 2)]", 10)
+    assert isinstance(values, np.ndarray)
+    assert values.dtype == np.float64
+    assert filters.format_value(values) == "[0.0, 1.0, 2.0, 3.0, 4.0]"
+    values = filters.parse_spec("[i for i in range(2, collection_size, 3)]", 10)
+    assert values.dtype == np.int64
+    assert filters.format_value(values) == "[2, 5, 8]"
+    # any other comprehension is evaluated as a list
+    assert filters.parse_spec("[i * 2 for i in range(5) if i % 2]", 10) == [2, 6]
+
+
+def test_term_of_range_comprehension():
+    c = filters.compile_filter({"term": "{'term': {'float': {'values': [float(i) for i in range(collection_size // 4)]}}}"},
+                               1000)
+    assert c.expression.startswith("float in [0.0, 1.0, ")
+    assert c.selectivity() == 0.25
+
+
+def test_term_size_limit():
+    with pytest.raises(Exception, match="write it as a range"):
+        filters.compile_filter({"term": "{'term': {'float': {'values': [float(i) for i in range(collection_size)]}}}"},
+                               10000000)
+    with pytest.raises(Exception, match="write it as a range"):
+        filters.compile_filter({"in": {"int64": list(range(filters.MAX_TERM_VALUES + 1))}})
+
+
+def test_and_or_not():
+    c = filters.compile_filter({"or": [{"in": {"int64": [1, 2, 3]}},
+                                       {"and": [{"range": {"int64": {"GTE": 50}}},
+                                                {"not": {"range": {"int64": {"GT": 90}}}}]}]}, 100)
+    assert c.expression == "int64 in [1, 2, 3] || (int64 >= 50 && not (int64 > 90))"
+    assert c.selectivity() == 0.44
+
+
+def test_list_is_and():
+    c = filters.compile_filter([{"range": {"int64": {"GTE": 10}}}, {"not_in": {"int64": [10, 11]}}], 100)
+    assert c.expression == "int64 >= 10 && int64 not in [10, 11]"
+    assert c.selectivity() == 0.88
+
+
+def test_selectivity_not_decided_by_generated_data():
+    c = filters.compile_filter({"json": {"field": "meta", "path": ["a", 0], "GT": 1},
+                                "array_contains_any": {"tags": [1, "x"]}}, 100)
+    assert c.expression == 'meta["a"][0] > 1 && array_contains_any(tags, [1, "x"])'
+    assert c.selectivity() is None
+    assert filters.compile_filter({"expr": "a > 1 || b < 2"}, 100).selectivity() is None
+
+
+def test_selectivity_sweep():
+    compiled = filters.get_case_filters({"selectivities": [0.001, 0.5, 1]}, 1000)
+    assert [c.expression for c in compiled] == ["int64 >= 0 && int64 < 1", "int64 >= 0 && int64 < 500",
+                                                "int64 >= 0 && int64 < 1000"]
+    assert [c.selectivity() for c in compiled] == [0.001, 0.5, 1.0]
+    compiled = filters.get_case_filters({"filters": [{"not_in": {"int64": [1, 2]}}], "selectivities": [0.1],
+                                         "selectivity_field": "float"}, 1000)
+    assert [c.selectivity() for c in compiled] == [0.998, 0.1]
+    assert compiled[1].expression == "float >= 0 && float < 100"
+    assert filters.get_case_filters({}, 1000) == [None]
+
+
+def test_compiled_once():
+    f = {"range": {"int64": {"GT": 1}}}
+    assert filters.compile_filter(f, 10) is filters.compile_filter(f, 10)
+    assert filters.filter_expression(f) == "int64 > 1"
+    assert filters.filter_metric(None)["selectivity"] is None
@@ -173,7 +173,10 @@ def update_dict_value(server_resource, values_dict):
 
 
 def search_param_analysis(vector_query, filter_query):
-    """ Search parameter adjustment, applicable pymilvus version >= 2.0.0rc7.dev24 """
+    """
+    Search parameter adjustment, applicable pymilvus version >= 2.0.0rc7.dev24
+    filter_query: the expression of the filter, see runners.filters.filter_expression
+    """
 
     if "vector" in vector_query:
         vector = vector_query["vector"]
@@ -196,28 +199,8 @@ def search_param_analysis(vector_query, filter_query):
         logger.error("[search_param_analysis] vector not dict or len != 1: %s" % str(vector))
         return False
 
-    expression = None
-    if isinstance(filter_query, list) and len(filter_query) != 0 and "range" in filter_query[0]:
-        filter_range = filter_query[0]["range"]
-        if isinstance(filter_range, dict) and len(filter_range) == 1:
-            for key in filter_range:
-                field_name = filter_range[key]
-                expression = None
-                if 'GT' in filter_range[key]:
-                    exp1 = "%s > %s" % (field_name, str(filter_range[key]['GT']))
-                    expression = exp1
-                if 'LT' in filter_range[key]:
-                    exp2 = "%s < %s" % (field_name, str(filter_range[key]['LT']))
-                    if expression:
-                        expression = expression + ' && ' + exp2
-                    else:
-                        expression = exp2
-        else:
-            logger.error("[search_param_analysis] filter_range not dict or len != 1: %s" % str(filter_range))
-            return False
-    # else:
-        # logger.debug("[search_param_analysis] range not in filter_query: %s" % str(filter_query))
-        # expression = None
+    # the expression of the filter compiled by runners.filters
+    expression = filter_query if filter_query else None
 
     result = {
         "data": data,
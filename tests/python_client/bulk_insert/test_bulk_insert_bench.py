@@ -20,12 +20,20 @@ from common.bulk_insert_data import (
 )
 import json
 import requests
+from requests.adapters import HTTPAdapter
 import time
 import uuid
 from utils.util_log import test_log as logger
+from common.import_jobs import ImportJobOrchestrator, ImportJobRecord, restful_progress
 from minio import Minio
 from minio.error import S3Error
 
+# one pooled session for all requests, so that concurrent polling of import jobs reuses connections
+session = requests.Session()
+adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+session.mount("http://", adapter)
+session.mount("https://", adapter)
+
 
 def logger_request_response(response, url, tt, headers, data, str_data, str_response, method):
     if len(data) > 2000:
@@ -70,7 +78,7 @@ class Requests:
         data = json.dumps(data)
         str_data = data[:200] + '...' + data[-200:] if len(data) > 400 else data
         t0 = time.time()
-        response = requests.post(url, headers=headers, data=data, params=params)
+        response = session.post(url, headers=headers, data=data, params=params)
         tt = time.time() - t0
         str_response = response.text[:200] + '...' + response.text[-200:] if len(response.text) > 400 else response.text
         logger_request_response(response, url, tt, headers, data, str_data, str_response, "post")
@@ -82,9 +90,9 @@ class Requests:
         str_data = data[:200] + '...' + data[-200:] if len(data) > 400 else data
         t0 = time.time()
         if data is None or data == "null":
-            response = requests.get(url, headers=headers, params=params)
+            response = session.get(url, headers=headers, params=params)
         else:
-            response = requests.get(url, headers=headers, params=params, data=data)
+            response = session.get(url, headers=headers, params=params, data=data)
         tt = time.time() - t0
         str_response = response.text[:200] + '...' + response.text[-200:] if len(response.text) > 400 else response.text
         logger_request_response(response, url, tt, headers, data, str_data, str_response, "get")
@@ -95,7 +103,7 @@ class Requests:
         data = json.dumps(data)
         str_data = data[:200] + '...' + data[-200:] if len(data) > 400 else data
         t0 = time.time()
-        response = requests.put(url, headers=headers, data=data)
+        response = session.put(url, headers=headers, data=data)
         tt = time.time() - t0
         str_response = response.text[:200] + '...' + response.text[-200:] if len(response.text) > 400 else response.text
         logger_request_response(response, url, tt, headers, data, str_data, str_response, "put")
@@ -106,7 +114,7 @@ class Requests:
         data = json.dumps(data)
         str_data = data[:200] + '...' + data[-200:] if len(data) > 400 else data
         t0 = time.time()
-        response = requests.delete(url, headers=headers, data=data)
+        response = session.delete(url, headers=headers, data=data)
         tt = time.time() - t0
         str_response = response.text[:200] + '...' + response.text[-200:] if len(response.text) > 400 else response.text
         logger_request_response(response, url, tt, headers, data, str_data, str_response, "delete")
@@ -153,31 +161,25 @@ class ImportJobClient(Requests):
         res = response.json()
         return res
 
+    def get_progress(self, task_id):
+        return restful_progress(self.get_import_job_progress(task_id))
+
+    def orchestrator(self, timeout=1800, **kwargs):
+        return ImportJobOrchestrator(submit=lambda payload: self.create_import_jobs(payload)["data"]["jobId"],
+                                     get_progress=self.get_progress, timeout=timeout, log=log, **kwargs)
+
     def wait_import_job_completed(self, task_id_list, timeout=1800):
-        success = False
-        success_states = {}
-        t0 = time.time()
-        while time.time() - t0 < timeout:
-            for task_id in task_id_list:
-                res = self.get_import_job_progress(task_id)
-                if res['data']['state'] == "Completed":
-                    success_states[task_id] = True
-                else:
-                    success_states[task_id] = False
-                time.sleep(5)
-            # all task success then break
-            if all(success_states.values()):
-                success = True
-                break
-        states = []
-        for task_id in task_id_list:
-            res = self.get_import_job_progress(task_id)
-            states.append({
-                "task_id": task_id,
-                "state": res['data']
-            })
+        records = [ImportJobRecord(task_id) for task_id in task_id_list]
+        success = self.orchestrator(timeout=timeout).wait(records)
+        states = [{"task_id": r.job_id, "state": r.last_progress.raw.get("data") if r.last_progress and r.last_progress.raw else None,
+                   "timings": r.to_dict()} for r in records]
         return success, states
 
+    def run_import_jobs(self, payloads, timeout=1800, workers=8):
+        """ Create the import jobs concurrently and wait for them, return (all completed, job records) """
+        return self.orchestrator(timeout=timeout, workers=workers).run(
+            payloads, names=[p.get("collectionName") for p in payloads])
+
 
 default_vec_only_fields = [df.vec_field]
 default_multi_fields = [
@@ -405,3 +407,48 @@ class TestBulkInsertPerf(TestcaseBaseBulkInsert):
         tt = time.time() - t0
         log.info(f"bulk insert state:{success} in {tt} with states:{states}")
         assert success
+
+    @pytest.mark.tags(CaseLabel.L3)
+    @pytest.mark.parametrize("dim", [128])
+    @pytest.mark.parametrize("file_size", [1])  # file size in GB
+    @pytest.mark.parametrize("job_nums", [4, 16])
+    def test_bulk_insert_concurrent_jobs(self, dim, file_size, job_nums):
+        """
+        collection schema: [pk, int64, float, float_vector]
+        data file: one parquet file imported into job_nums collections
+        Steps:
+        1. create job_nums collections
+        2. create the import jobs concurrently and wait for them
+        3. verify all jobs completed and report the phase timings and rows/s
+        """
+        fields = [
+            cf.gen_int64_field(name=df.pk_field, is_primary=True, auto_id=True),
+            cf.gen_int64_field(name=df.int_field),
+            cf.gen_float_field(name=df.float_field),
+            cf.gen_float_vec_field(name=df.vec_field, dim=dim),
+        ]
+        data_fields = [f.name for f in fields if not f.to_dict().get("auto_id", False)]
+        files = prepare_bulk_insert_parquet_files(
+            minio_endpoint=self.minio_endpoint,
+            bucket_name=self.bucket_name,
+            rows=3000,
+            dim=dim,
+            data_fields=data_fields,
+            file_size=file_size,
+            row_group_size=None,
+            file_nums=1,
+            force=True,
+        )
+        self._connect()
+        schema = cf.gen_collection_schema(fields=fields, auto_id=True)
+        payloads = []
+        for _ in range(job_nums):
+            c_name = cf.gen_unique_str("bulk_insert")
+            self.collection_wrap.init_collection(c_name, schema=schema)
+            payloads.append({"collectionName": c_name, "files": [files]})
+
+        # import data
+        success, records = self.import_job_client.run_import_jobs(payloads, timeout=1800, workers=job_nums)
+        for r in records:
+            log.info(f"bulk insert job: {r.to_dict()}")
+        assert success
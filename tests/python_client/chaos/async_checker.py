@@ -0,0 +1,309 @@
+import time
+import asyncio
+import threading
+from datetime import datetime
+from pymilvus import AnnSearchRequest, RRFRanker
+from base.async_milvus_client_wrapper import AsyncMilvusClientWrapper
+from common import common_func as cf
+from common.common_type import CheckTasks
+from chaos import constants
+from chaos.checker import (Op, SearchChecker, HybridSearchChecker, QueryChecker, InsertChecker, UpsertChecker,
+                           DeleteChecker, TimestampPkAllocator, request_records, timeout, search_timeout,
+                           query_timeout, enable_traceback)
+from utils.util_log import test_log as log
+
+"""
+Run the checkers as coroutines of one event loop on a shared AsyncMilvusClient instead of one thread per checker.
+Every operation is paced to its target rate and capped by its own concurrency,
+all operations share a global concurrency limit whose FIFO waiters give them fair turns.
+The collections are prepared by the sync checkers, the results are recorded into the same RequestRecords
+and the counters of the sync checker, so the assertions and the ResultAnalyzer work unchanged.
+"""
+
+# target requests per second, the same pacing as keep_running of the thread checkers
+DEFAULT_RATES = {
+    Op.search: 1 / (constants.WAIT_PER_OP / 10),
+    Op.hybrid_search: 1 / (constants.WAIT_PER_OP / 10),
+    Op.query: 1 / (constants.WAIT_PER_OP / 10),
+    Op.insert: 1 / (constants.WAIT_PER_OP / 10),
+    Op.upsert: 1 / (constants.WAIT_PER_OP * 6),
+    Op.delete: 1 / constants.WAIT_PER_OP,
+}
+DEFAULT_CONCURRENCY = 1
+DEFAULT_MAX_CONCURRENCY = 32
+
+
+class AsyncChecker:
+    """
+    The async request of an operation on the collection of a prepared sync checker,
+    operation_name is recorded like the traced method of the sync checker
+    """
+    op = Op.unknown
+    operation_name = None
+
+    def __init__(self, checker, rate=None, concurrency=DEFAULT_CONCURRENCY):
+        self.checker = checker
+        self.rate = rate if rate is not None else DEFAULT_RATES.get(self.op, 1.0)
+        self.concurrency = concurrency
+        self.issued = 0
+        self.completed = 0
+        self.missed = 0
+        self.in_flight = 0
+
+    @property
+    def collection_name(self):
+        return self.checker.c_name
+
+    async def request(self, client):
+        """
+        return res, result like the traced methods of the sync checker,
+        the requests are sent with check_task=CheckTasks.check_nothing, a failure is a False result, not an assertion
+        """
+        raise NotImplementedError
+
+    def on_result(self, start_ns, elapsed, result):
+        """ Update the sync checker the same way as trace """
+        ch = self.checker
+        request_records.insert(self.operation_name, self.collection_name, start_ns, elapsed, bool(result))
+        start_time_ts = start_ns / 1e9
+        if result:
+            ch.rsp_times.append(elapsed)
+            ch.average_time = (elapsed + ch.average_time * ch._succ) / (ch._succ + 1)
+            ch._succ += 1
+            if len(ch.fail_records) > 0 and ch.fail_records[-1][0] == "failure" and \
+                    ch._succ + ch._fail == ch.fail_records[-1][1] + 1:
+                start_time = datetime.fromtimestamp(start_time_ts).strftime('%Y-%m-%d %H:%M:%S.%f')
+                ch.fail_records.append(("success", ch._succ + ch._fail, start_time, start_time_ts))
+        else:
+            ch._fail += 1
+            start_time = datetime.fromtimestamp(start_time_ts).strftime('%Y-%m-%d %H:%M:%S.%f')
+            ch.fail_records.append(("failure", ch._succ + ch._fail, start_time, start_time_ts))
+
+    def stats(self):
+        return {
+            "target_rate": self.rate,
+            "issued": self.issued,
+            "completed": self.completed,
+            "missed": self.missed,
+            "succ": self.checker._succ,
+            "fail": self.checker._fail,
+        }
+
+
+class AsyncSearchChecker(AsyncChecker):
+    op = Op.search
+    operation_name = "search"
+
+    async def request(self, client):
+        ch = self.checker
+        return await client.search(ch.c_name, cf.gen_vectors(5, ch.dim), limit=1,
+                                   search_params=constants.DEFAULT_SEARCH_PARAM,
+                                   partition_names=ch.p_names, anns_field=ch.float_vector_field_name,
+                                   timeout=search_timeout, enable_traceback=enable_traceback,
+                                   check_task=CheckTasks.check_nothing)
+
+
+class AsyncHybridSearchChecker(AsyncChecker):
+    op = Op.hybrid_search
+    operation_name = "hybrid_search"
+
+    async def request(self, client):
+        ch = self.checker
+        reqs = [AnnSearchRequest(data=cf.gen_vectors(1, ch.dim), anns_field=f, param=constants.DEFAULT_SEARCH_PARAM,
+                                 limit=10, expr=f"{ch.int64_field_name} > 0")
+                for f in ch.float_vector_field_names]
+        return await client.hybrid_search(ch.c_name, reqs, RRFRanker(), limit=10, partition_names=ch.p_names,
+                                          timeout=search_timeout, enable_traceback=enable_traceback,
+                                          check_task=CheckTasks.check_nothing)
+
+
+class AsyncQueryChecker(AsyncChecker):
+    op = Op.query
+    operation_name = "query"
+
+    async def request(self, client):
+        res, result = await client.query(self.checker.c_name, filter=self.checker.term_expr, timeout=query_timeout,
+                                         enable_traceback=enable_traceback, check_task=CheckTasks.check_nothing)
+        # the same as check_query_not_empty of the sync checker
+        return res, result and isinstance(res, list) and len(res) > 0
+
+
+class AsyncInsertChecker(AsyncChecker):
+    op = Op.insert
+    operation_name = "insert_entities"
+
+    async def request(self, client):
+        ch = self.checker
+        # generating rows is cpu bound, keep it out of the event loop
+        data = await asyncio.to_thread(cf.gen_row_data_by_schema, nb=constants.DELTA_PER_INS, schema=ch.schema)
+        for row, pk in zip(data, TimestampPkAllocator.of_scale(ch.scale).allocate(len(data))):
+            row[ch.int64_field_name] = pk
+        return await client.insert(ch.c_name, data, timeout=timeout, enable_traceback=enable_traceback,
+                                   check_task=CheckTasks.check_nothing)
+
+
+class AsyncUpsertChecker(AsyncChecker):
+    op = Op.upsert
+    operation_name = "upsert_entities"
+
+    async def request(self, client):
+        ch = self.checker
+        # half of the data is upsert, the other half is insert
+        rows = len(ch.data)
+        pk_old = [d[ch.int64_field_name] for d in ch.data[:rows // 2]]
+        data = await asyncio.to_thread(cf.gen_row_data_by_schema, nb=constants.DELTA_PER_INS, schema=ch.schema)
+        pk_new = [d[ch.int64_field_name] for d in data[rows // 2:]]
+        for row, pk in zip(data, pk_old + pk_new):
+            row[ch.int64_field_name] = pk
+        ch.data = data
+        return await client.upsert(ch.c_name, data, timeout=timeout, enable_traceback=enable_traceback,
+                                   check_task=CheckTasks.check_nothing)
+
+
+class AsyncDeleteChecker(AsyncChecker):
+    op = Op.delete
+    operation_name = "delete_entities"
+
+    async def request(self, client):
+        ch = self.checker
+        res, result = await client.query(ch.c_name, filter=ch.query_expr, output_fields=[ch.int64_field_name],
+                                         partition_names=[ch.p_name], timeout=query_timeout,
+                                         enable_traceback=enable_traceback, check_task=CheckTasks.check_nothing)
+        if not result:
+            return res, result
+        delete_ids = [r[ch.int64_field_name] for r in res][:3000]
+        return await client.delete(ch.c_name, ids=delete_ids, partition_name=ch.p_name, timeout=timeout,
+                                   enable_traceback=enable_traceback, check_task=CheckTasks.check_nothing)
+
+
+ASYNC_CHECKERS = {
+    SearchChecker: AsyncSearchChecker,
+    HybridSearchChecker: AsyncHybridSearchChecker,
+    QueryChecker: AsyncQueryChecker,
+    InsertChecker: AsyncInsertChecker,
+    UpsertChecker: AsyncUpsertChecker,
+    DeleteChecker: AsyncDeleteChecker,
+}
+
+
+def to_async_checkers(checkers, rates=None, concurrency=None):
+    """
+    Wrap the prepared sync checkers by their async checkers
+    :param checkers: {Op: Checker}, the checkers without an async checker are skipped
+    :param rates: {Op: requests per second}
+    :param concurrency: {Op: max requests in flight}
+    """
+    rates = rates or {}
+    concurrency = concurrency or {}
+    async_checkers = {}
+    for op, ch in checkers.items():
+        cls = ASYNC_CHECKERS.get(type(ch))
+        if cls is None:
+            log.warning(f"no async checker for {type(ch).__name__}, skip {op}")
+            continue
+        async_checkers[op] = cls(ch, rate=rates.get(op), concurrency=concurrency.get(op, DEFAULT_CONCURRENCY))
+    return async_checkers
+
+
+class AsyncCheckerExecutor:
+    def __init__(self, checkers, uri, token="", max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        """
+        :param checkers: {Op: AsyncChecker}
+        :param max_concurrency: the requests in flight of all operations
+        """
+        self.checkers = checkers
+        self.uri = uri
+        self.token = token
+        self.max_concurrency = max_concurrency
+        self.client = AsyncMilvusClientWrapper()
+        self._loop = None
+        self._thread = None
+        self._stop = None
+        self._ready = threading.Event()
+
+    async def _call(self, checker, op_slots, global_slots):
+        try:
+            async with global_slots:
+                start_ns = time.time_ns()
+                t0 = time.perf_counter()
+                try:
+                    res, result = await checker.request(self.client)
+                except Exception as e:
+                    log.error(f"{checker.operation_name} on {checker.collection_name} error: {e}")
+                    result = False
+                elapsed = time.perf_counter() - t0
+            checker.on_result(start_ns, elapsed, result)
+        finally:
+            checker.completed += 1
+            checker.in_flight -= 1
+            op_slots.release()
+
+    async def _drive(self, checker, global_slots):
+        """ Issue the requests of one operation at its target rate, a slot missed when all its slots are busy """
+        loop = asyncio.get_running_loop()
+        op_slots = asyncio.Semaphore(max(1, checker.concurrency))
+        interval = 1 / checker.rate if checker.rate > 0 else None
+        tasks = set()
+        next_at = loop.time()
+        while not self._stop.is_set():
+            await op_slots.acquire()
+            if self._stop.is_set():
+                op_slots.release()
+                break
+            if interval is not None:
+                now = loop.time()
+                if next_at > now:
+                    try:
+                        await asyncio.wait_for(self._stop.wait(), next_at - now)
+                        op_slots.release()
+                        break
+                    except asyncio.TimeoutError:
+                        pass
+                    next_at += interval
+                else:
+                    # behind the schedule, do not burst to catch up
+                    missed = int((now - next_at) // interval)
+                    checker.missed += missed
+                    next_at += (missed + 1) * interval
+            checker.issued += 1
+            checker.in_flight += 1
+            task = asyncio.create_task(self._call(checker, op_slots, global_slots))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _main(self):
+        self._stop = asyncio.Event()
+        self.client.init_async_client(uri=self.uri, token=self.token)
+        global_slots = asyncio.Semaphore(self.max_concurrency)
+        self._ready.set()
+        try:
+            await asyncio.gather(*[self._drive(ch, global_slots) for ch in self.checkers.values()])
+        finally:
+            await self.client.close()
+
+    def run(self):
+        """ Run the checkers in the current thread until stop() """
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._main())
+        finally:
+            self._loop.close()
+
+    def start(self):
+        """ Run the checkers in a background thread, like start_monitor_threads """
+        self._thread = threading.Thread(target=self.run, name="async-checker-executor", daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout)
+        return self._thread
+
+    def stop(self, wait=True):
+        if self._loop is not None and self._stop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+        if wait and self._thread is not None:
+            self._thread.join()
+        log.info(f"async checkers stopped: {self.stats()}")
+
+    def stats(self):
+        return {op.value if isinstance(op, Op) else op: ch.stats() for op, ch in self.checkers.items()}
@@ -46,6 +46,17 @@ def start_monitor_threads(checkers={}):
     return tasks
 
 
+def start_monitor_coroutines(checkers={}, uri="http://localhost:19530", token="", rates=None, concurrency=None,
+                             max_concurrency=None):
+    """start the checkers as coroutines of one event loop, return the executor to stop them"""
+    from chaos.async_checker import AsyncCheckerExecutor, to_async_checkers, DEFAULT_MAX_CONCURRENCY
+    async_checkers = to_async_checkers(checkers, rates=rates, concurrency=concurrency)
+    executor = AsyncCheckerExecutor(async_checkers, uri=uri, token=token,
+                                    max_concurrency=max_concurrency or DEFAULT_MAX_CONCURRENCY)
+    executor.start()
+    return executor
+
+
 def check_thread_status(tasks):
     """check the status of all threads"""
     for t in tasks:
@@ -7,13 +7,14 @@ import threading
 import os
 import uuid
 import json
+import numpy as np
 import pandas as pd
 from datetime import datetime
 from prettytable import PrettyTable
 import functools
 from collections import Counter
 from time import sleep
-from pymilvus import AnnSearchRequest, RRFRanker
+from pymilvus import AnnSearchRequest, RRFRanker, FunctionType
 from pymilvus.bulk_writer import RemoteBulkWriter, BulkFileType
 from base.database_wrapper import ApiDatabaseWrapper
 from base.collection_wrapper import ApiCollectionWrapper
@@ -22,7 +23,12 @@ from base.utility_wrapper import ApiUtilityWrapper
 from common import common_func as cf
 from common import common_type as ct
 from common.milvus_sys import MilvusSys
+from common.import_jobs import ImportJobOrchestrator, bulk_insert_progress
+from common.text_match_index import TextMatchIndex
+from common.bm25_index import BM25Index
 from chaos import constants
+from chaos.request_recorder import ColumnarRecorder, new_records_path, to_ns
+from chaos.result_analysis import analyze_records, record_files, summarize_stages, window_frame, DEFAULT_PERCENTILES
 from faker import Faker
 
 from common.common_type import CheckTasks
@@ -30,7 +36,6 @@ from utils.util_log import test_log as log
 from utils.api_request import Error
 
 event_lock = threading.Lock()
-request_lock = threading.Lock()
 
 
 def get_chaos_info():
@@ -43,6 +48,42 @@ def get_chaos_info():
     return chaos_info
 
 
+class TimestampPkAllocator:
+    """
+    Hybrid logical clock style allocator of int64 pks from time.time() * scale:
+    a block starts at the current physical time, or right after the last allocated pk if the clock has not
+    passed it, so the pks are increasing and unique without sleeping between rows
+    """
+    allocators = {}
+    _allocators_lock = threading.Lock()
+
+    def __init__(self, scale):
+        self.scale = scale
+        self.last = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def of_scale(cls, scale):
+        """ One allocator per scale in the process, shared by the checkers """
+        with cls._allocators_lock:
+            if scale not in cls.allocators:
+                cls.allocators[scale] = cls(scale)
+            return cls.allocators[scale]
+
+    def now(self):
+        return int(time.time() * self.scale)
+
+    def allocate(self, nb):
+        with self._lock:
+            start = max(self.now(), self.last + 1)
+            self.last = start + nb - 1
+        return list(range(start, start + nb))
+
+    def upper_bound(self):
+        """ No pk allocated so far is greater than it """
+        return max(self.now(), self.last)
+
+
 class Singleton(type):
     instances = {}
 
@@ -81,125 +122,74 @@ class EventRecords(metaclass=Singleton):
 
 
 class RequestRecords(metaclass=Singleton):
+    """ Records of the checker requests, kept in the columnar recorder and read back as int ns timestamps """
 
     def __init__(self):
-        self.file_name = f"/tmp/ci_logs/request_records_{uuid.uuid4()}.parquet"
-        self.buffer = []
-        self.created_file = False
+        self.file_name = new_records_path("request_records")
+        self.recorder = ColumnarRecorder(self.file_name)
 
     def insert(self, operation_name, collection_name, start_time, time_cost, result):
-        data = {
-            "operation_name": operation_name,
-            "collection_name": collection_name,
-            "start_time": start_time,
-            "time_cost": time_cost,
-            "result": result
-        }
-        self.buffer.append(data)
-        if len(self.buffer) > 100:
-            df = pd.DataFrame(self.buffer)
-            if not self.created_file:
-                with request_lock:
-                    df.to_parquet(self.file_name, engine='fastparquet')
-                    self.created_file = True
-            else:
-                with request_lock:
-                    df.to_parquet(self.file_name, engine='fastparquet', append=True)
-            self.buffer = []
+        start_ns = start_time if isinstance(start_time, (int, np.integer)) else to_ns(start_time)
+        self.recorder.record(operation_name, collection_name, start_ns, time_cost, result)
 
     def sink(self):
-        if len(self.buffer) == 0:
-            return
-        try:
-            df = pd.DataFrame(self.buffer)
-        except Exception as e:
-            log.error(f"convert buffer {self.buffer} to dataframe error: {e}")
-            return
-        if not self.created_file:
-            with request_lock:
-                df.to_parquet(self.file_name, engine='fastparquet')
-                self.created_file = True
-        else:
-            with request_lock:
-                df.to_parquet(self.file_name, engine='fastparquet', append=True)
+        self.recorder.flush()
 
     def get_records_df(self):
-        self.sink()
-        df = pd.read_parquet(self.file_name)
-        return df
+        """ start_time is int64 ns since epoch and result is bool """
+        return self.recorder.read_table().to_pandas()
 
 
 class ResultAnalyzer:
+    """ Success rate, latency percentiles and RTO of every operation, computed by streaming the request records """
 
-    def __init__(self):
+    def __init__(self, window=1):
         rr = RequestRecords()
-        df = rr.get_records_df()
-        df["start_time"] = pd.to_datetime(df["start_time"])
-        df = df.sort_values(by='start_time')
-        self.df = df
+        rr.sink()
+        self.stats = analyze_records(record_files(rr.file_name), window=window)
         self.chaos_info = get_chaos_info()
         self.chaos_start_time = self.chaos_info['create_time'] if self.chaos_info is not None else None
         self.chaos_end_time = self.chaos_info['delete_time'] if self.chaos_info is not None else None
         self.recovery_time = self.chaos_info['recovery_time'] if self.chaos_info is not None else None
 
     def get_stage_success_rate(self):
-        df = self.df
-        window = pd.offsets.Milli(1000)
-
-        result = df.groupby([pd.Grouper(key='start_time', freq=window), 'operation_name']).apply(lambda x: pd.Series({
-            'success_count': x[x['result'] == 'True'].shape[0],
-            'failed_count': x[x['result'] == 'False'].shape[0]
-        }))
-        data = result.reset_index()
-        data['success_rate'] = data['success_count'] / (data['success_count'] + data['failed_count']).replace(0, 1)
-        grouped_data = data.groupby('operation_name')
         if self.chaos_info is None:
-            chaos_start_time = datetime.fromtimestamp(time.time()).strftime('%Y-%m-%d %H:%M:%S.%f')
-            chaos_end_time = datetime.fromtimestamp(time.time()).strftime('%Y-%m-%d %H:%M:%S.%f')
-            recovery_time = datetime.fromtimestamp(time.time()).strftime('%Y-%m-%d %H:%M:%S.%f')
+            chaos_start_ns = chaos_end_ns = recovery_ns = time.time_ns()
         else:
-            chaos_start_time = self.chaos_info['create_time']
-            chaos_end_time = self.chaos_info['delete_time']
-            recovery_time = self.chaos_info['recovery_time']
-        stage_success_rate = {}
-        for name, group in grouped_data:
-            log.info(f"operation_name: {name}")
-            # spilt data to 3 parts by chaos start time and chaos end time and aggregate the success rate
-            data_before_chaos = group[group['start_time'] < chaos_start_time].agg(
-                {'success_rate': 'mean', 'failed_count': 'sum', 'success_count': 'sum'})
-            data_during_chaos = group[
-                (group['start_time'] >= chaos_start_time) & (group['start_time'] <= chaos_end_time)].agg(
-                {'success_rate': 'mean', 'failed_count': 'sum', 'success_count': 'sum'})
-            data_after_chaos = group[group['start_time'] > recovery_time].agg(
-                {'success_rate': 'mean', 'failed_count': 'sum', 'success_count': 'sum'})
-            stage_success_rate[name] = {
-                'before_chaos': f"{data_before_chaos['success_rate']}({data_before_chaos['success_count']}/{data_before_chaos['success_count'] + data_before_chaos['failed_count']})" if not data_before_chaos.empty else "no data",
-                'during_chaos': f"{data_during_chaos['success_rate']}({data_during_chaos['success_count']}/{data_during_chaos['success_count'] + data_during_chaos['failed_count']})" if not data_during_chaos.empty else "no data",
-                'after_chaos': f"{data_after_chaos['success_rate']}({data_after_chaos['success_count']}/{data_after_chaos['success_count'] + data_after_chaos['failed_count']})" if not data_after_chaos.empty else "no data",
-            }
+            chaos_start_ns = to_ns(self.chaos_info['create_time'])
+            chaos_end_ns = to_ns(self.chaos_info['delete_time'])
+            recovery_ns = to_ns(self.chaos_info['recovery_time'])
+        stage_success_rate = summarize_stages(self.stats, chaos_start_ns, chaos_end_ns, recovery_ns)
         log.info(f"stage_success_rate: {stage_success_rate}")
         return stage_success_rate
 
     def get_realtime_success_rate(self, interval=10):
-        df = self.df
-        window = pd.offsets.Second(interval)
-        result = df.groupby([pd.Grouper(key='start_time', freq=window), 'operation_name']).apply(lambda x: pd.Series({
-            'success_count': x[x['result'] == 'True'].shape[0],
-            'failed_count': x[x['result'] == 'False'].shape[0]
-        }))
-        data = result.reset_index()
-        data['success_rate'] = data['success_count'] / (data['success_count'] + data['failed_count']).replace(0, 1)
+        data = window_frame(self.stats, interval=interval)
         grouped_data = data.groupby('operation_name')
         return grouped_data
 
+    def get_latency_percentiles(self, percentiles=DEFAULT_PERCENTILES):
+        latency_percentiles = self.stats.percentiles(percentiles)
+        log.info(f"latency percentiles: {latency_percentiles}")
+        return latency_percentiles
+
+    def get_rto(self):
+        rto = self.stats.rto()
+        log.info(f"rto: {rto}")
+        return rto
+
     def show_result_table(self):
         table = PrettyTable()
         table.field_names = ['operation_name', 'before_chaos',
                              f'during_chaos: {self.chaos_start_time}~{self.recovery_time}',
-                             'after_chaos']
+                             'after_chaos', 'p99 latency', 'rto']
         data = self.get_stage_success_rate()
+        latency = self.stats.percentiles((99,))
+        rto = self.stats.rto()
         for operation, values in data.items():
-            row = [operation, values['before_chaos'], values['during_chaos'], values['after_chaos']]
+            p99 = latency[operation].get(99)
+            row = [operation, values['before_chaos'], values['during_chaos'], values['after_chaos'],
+                   f"{p99:.4f}" if p99 is not None else "no data", rto[operation]]
             table.add_row(row)
         log.info(f"succ rate for operations in different stage\n{table}")
 
@@ -256,22 +246,19 @@ def trace(fmt=DEFAULT_FMT, prefix='test', flag=True):
     def decorate(func):
         @functools.wraps(func)
         def inner_wrapper(self, *args, **kwargs):
-            start_time = datetime.fromtimestamp(time.time()).strftime('%Y-%m-%d %H:%M:%S.%f')
-            start_time_ts = time.time()
+            start_ns = time.time_ns()
+            start_time_ts = start_ns / 1e9
+            start_time = datetime.fromtimestamp(start_time_ts).strftime('%Y-%m-%d %H:%M:%S.%f')
             t0 = time.perf_counter()
             res, result = func(self, *args, **kwargs)
             elapsed = time.perf_counter() - t0
-            end_time = datetime.fromtimestamp(time.time()).strftime('%Y-%m-%d %H:%M:%S.%f')
             operation_name = func.__name__
             if flag:
                 collection_name = self.c_wrap.name
                 log_str = f"[{prefix}]" + fmt.format(**locals())
                 # TODO: add report function in this place, like uploading to influxdb
                 try:
-                    t0 = time.perf_counter()
-                    request_records.insert(operation_name, collection_name, start_time, elapsed, str(result))
-                    tt = time.perf_counter() - t0
-                    log.debug(f"insert request record cost {tt}s")
+                    request_records.insert(operation_name, collection_name, start_ns, elapsed, bool(result))
                 except Exception as e:
                     log.error(e)
                 log.debug(log_str)
@@ -328,6 +315,11 @@ class Checker:
        a. check whether milvus is servicing
        b. count operations and success rate
     """
+    # index the inserted text match fields to verify the results of text and phrase match,
+    # only for a collection created by the checker, other checkers change a shared collection
+    text_match_reference = False
+    # index the inserted input texts of the bm25 functions to verify the results of full text search, same restriction
+    bm25_reference = False
 
     def __init__(self, collection_name=None, partition_name=None, shards_num=2, dim=ct.default_dim, insert_data=True,
                  schema=None, replica_number=1, **kwargs):
@@ -435,11 +427,23 @@ class Checker:
         self.c_wrap.load(replica_number=self.replica_number)
 
         self.p_wrap.init_partition(self.c_name, self.p_name)
+        # private_collection: the name was generated by the checker, not given by the test
+        private_collection = kwargs.get("private_collection", collection_name is None)
+        self.text_index = TextMatchIndex(self.text_match_field_name_list) \
+            if self.text_match_reference and private_collection else None
+        # bm25 output field -> (input field, reference index), the analyzer of the schema is the standard tokenizer
+        self.bm25_indexes = {func.output_field_names[0]: (func.input_field_names[0], BM25Index(language="standard"))
+                             for func in getattr(schema, "functions", []) if func.type == FunctionType.BM25} \
+            if self.bm25_reference and private_collection else {}
         if insert_data and self.c_wrap.num_entities == 0:
             log.info(f"collection {c_name} created, start to insert data")
             t0 = time.perf_counter()
             self.insert_data(nb=constants.ENTITIES_FOR_SEARCH, partition_name=self.p_name)
             log.info(f"insert data for collection {c_name} cost {time.perf_counter() - t0}s")
+        else:
+            # the entities of an existing collection are unknown, their results can not be verified
+            self.text_index = None
+            self.bm25_indexes = {}
 
         self.initial_entities = self.c_wrap.collection.num_entities
         self.scale = 100000  # timestamp scale to make time.time() as int64
@@ -447,27 +451,60 @@ class Checker:
     def insert_data(self, nb=constants.DELTA_PER_INS, partition_name=None):
         partition_name = self.p_name if partition_name is None else partition_name
         data = cf.gen_row_data_by_schema(nb=nb, schema=self.schema)
-        ts_data = []
-        for i in range(nb):
-            time.sleep(0.001)
-            offset_ts = int(time.time() * self.scale)
-            ts_data.append(offset_ts)
-        for i in range(nb):
+        ts_data = TimestampPkAllocator.of_scale(self.scale).allocate(len(data))
+        for i in range(len(data)):
             data[i][self.int64_field_name] = ts_data[i]
-        df = pd.DataFrame(data)
         for text_field in self.text_match_field_name_list:
-            if text_field in df.columns:
-                texts = df[text_field].tolist()
-                wf = cf.analyze_documents(texts)
-                self.word_freq.update(wf)
+            cf.count_words([row[text_field] for row in data if text_field in row], counter=self.word_freq)
 
         res, result = self.c_wrap.insert(data=data,
                                          partition_name=partition_name,
                                          timeout=timeout,
                                          enable_traceback=enable_traceback,
                                          check_task=CheckTasks.check_nothing)
+        if result and self.text_index is not None:
+            self.text_index.add(ts_data, data)
+        if result:
+            for text_field, bm25_index in self.bm25_indexes.values():
+                bm25_index.add([row.get(text_field) for row in data], ids=ts_data)
         return res, result
 
+    def text_match_limit(self, expected_ids):
+        """
+        The limit of a text or phrase match query, one more than the expected ids so that an unexpected id is
+        returned too, None to query as before if the ids are not verified
+        """
+        if expected_ids is None or len(expected_ids) + 1 > ct.max_limit:
+            return None
+        return len(expected_ids) + 1
+
+    def check_text_match_result(self, res, expected_ids):
+        """ The ids of a text or phrase match query must be the ids of the reference, None skips the check """
+        if expected_ids is None:
+            return True
+        ids = {r[self.int64_field_name] for r in res}
+        expected_ids = set(expected_ids)
+        if ids == expected_ids:
+            return True
+        log.warning(f"{self.term_expr} of {self.c_name} returns {len(ids)} entities, expected {len(expected_ids)}: "
+                    f"{len(expected_ids - ids)} missing, {len(ids - expected_ids)} unexpected")
+        return False
+
+    def check_full_text_search_result(self, res, queries, anns_field, limit):
+        """ The recall of a full text search against the reference must reach the threshold, no reference skips it """
+        if anns_field not in self.bm25_indexes:
+            return True
+        _, bm25_index = self.bm25_indexes[anns_field]
+        expected_ids, _ = bm25_index.search(queries, top_k=limit)
+        hit_num = sum(len(set(hits.ids) & set(ids)) for hits, ids in zip(res, expected_ids))
+        expected_num = sum(len(ids) for ids in expected_ids)
+        recall = hit_num / expected_num if expected_num else 1.0
+        if recall >= constants.BM25_RECALL_THRESHOLD:
+            return True
+        log.warning(f"full text search on {anns_field} of {self.c_name} recalls {recall:.3f} of the reference, "
+                    f"expected at least {constants.BM25_RECALL_THRESHOLD}")
+        return False
+
     def total(self):
         return self._succ + self._fail
 
@@ -541,12 +578,24 @@ class Checker:
             log.error(f"prepare data for bulk insert failed with error {e}")
             return [], False
 
+    def submit_bulk_insert(self, files):
+        task_id, result = self.utility_wrap.do_bulk_insert(collection_name=self.c_name, files=files)
+        if not result:
+            raise Exception(f"do bulk insert to {self.c_name} failed: {task_id}")
+        return task_id
+
+    def bulk_insert_orchestrator(self, timeout=720):
+        """ Wait for the bulk insert tasks with adaptive backoff polling and record their phase timings """
+        return ImportJobOrchestrator(
+            submit=self.submit_bulk_insert,
+            get_progress=lambda task_id: bulk_insert_progress(self.utility_wrap.get_bulk_insert_state(task_id)[0]),
+            timeout=timeout, log=log)
+
     def do_bulk_insert(self):
         log.info(f"bulk insert collection name: {self.c_name}")
-        task_ids, result = self.utility_wrap.do_bulk_insert(collection_name=self.c_name,
-                                                            files=self.files)
-        log.info(f"task ids {task_ids}")
-        completed, result = self.utility_wrap.wait_for_bulk_insert_tasks_completed(task_ids=[task_ids], timeout=720)
+        completed, records = self.bulk_insert_orchestrator(timeout=720).run([self.files], names=[self.c_name])
+        task_ids = records[0].job_id
+        log.info(f"task ids {task_ids}, timings {records[0].to_dict()}")
         return task_ids, completed
 
 
@@ -699,26 +748,32 @@ class SearchChecker(Checker):
 
 class FullTextSearchChecker(Checker):
     """check full text search operations in a dependent thread"""
+    bm25_reference = True
 
     def __init__(self, collection_name=None, shards_num=2, replica_number=1, schema=None, ):
+        private_collection = collection_name is None
         if collection_name is None:
             collection_name = cf.gen_unique_str("FullTextSearchChecker_")
-        super().__init__(collection_name=collection_name, shards_num=shards_num, schema=schema)
+        super().__init__(collection_name=collection_name, shards_num=shards_num, schema=schema,
+                         private_collection=private_collection)
         self.insert_data()
 
     @trace()
     def full_text_search(self):
 
         bm25_anns_field = random.choice(self.bm25_sparse_field_names)
+        queries = cf.gen_vectors(5, self.dim, vector_data_type="TEXT_SPARSE_VECTOR")
         res, result = self.c_wrap.search(
-            data=cf.gen_vectors(5, self.dim, vector_data_type="TEXT_SPARSE_VECTOR"),
+            data=queries,
             anns_field=bm25_anns_field,
             param=constants.DEFAULT_BM25_SEARCH_PARAM,
-            limit=1,
+            limit=constants.BM25_SEARCH_LIMIT,
             partition_names=self.p_names,
             timeout=search_timeout,
             check_task=CheckTasks.check_nothing
         )
+        if result:
+            result = self.check_full_text_search_result(res, queries, bm25_anns_field, constants.BM25_SEARCH_LIMIT)
         return res, result
 
     @exception_handler()
@@ -872,11 +927,7 @@ class InsertChecker(Checker):
     def insert_entities(self):
         data = cf.gen_row_data_by_schema(nb=constants.DELTA_PER_INS, schema=self.schema)
         rows = len(data)
-        ts_data = []
-        for i in range(constants.DELTA_PER_INS):
-            time.sleep(0.001)
-            offset_ts = int(time.time() * self.scale)
-            ts_data.append(offset_ts)
+        ts_data = TimestampPkAllocator.of_scale(self.scale).allocate(rows)
 
         for i in range(rows):
             data[i][self.int64_field_name] = ts_data[i]
@@ -911,7 +962,7 @@ class InsertChecker(Checker):
         except Exception as e:
             log.error(f"create index error: {e}")
         self.c_wrap.load()
-        end_time_stamp = int(time.time() * self.scale)
+        end_time_stamp = TimestampPkAllocator.of_scale(self.scale).upper_bound()
         self.term_expr = f'{self.int64_field_name} >= {self.start_time_stamp} and ' \
                          f'{self.int64_field_name} <= {end_time_stamp}'
         data_in_client = []
@@ -948,11 +999,7 @@ class InsertFreshnessChecker(Checker):
 
     def insert_entities(self):
         data = cf.gen_row_data_by_schema(nb=constants.DELTA_PER_INS, schema=self.schema)
-        ts_data = []
-        for i in range(constants.DELTA_PER_INS):
-            time.sleep(0.001)
-            offset_ts = int(time.time() * self.scale)
-            ts_data.append(offset_ts)
+        ts_data = TimestampPkAllocator.of_scale(self.scale).allocate(constants.DELTA_PER_INS)
 
         data[0] = ts_data  # set timestamp (ms) as int64
         log.debug(f"insert data: {len(ts_data)}")
@@ -1406,11 +1453,14 @@ class QueryChecker(Checker):
 
 class TextMatchChecker(Checker):
     """check text match query operations in a dependent thread"""
+    text_match_reference = True
 
     def __init__(self, collection_name=None, shards_num=2, replica_number=1, schema=None):
+        private_collection = collection_name is None
         if collection_name is None:
             collection_name = cf.gen_unique_str("QueryChecker_")
-        super().__init__(collection_name=collection_name, shards_num=shards_num, schema=schema)
+        super().__init__(collection_name=collection_name, shards_num=shards_num, schema=schema,
+                         private_collection=private_collection)
         res, result = self.c_wrap.create_index(self.float_vector_field_name,
                                                constants.DEFAULT_INDEX_PARAM,
                                                timeout=timeout,
@@ -1421,11 +1471,17 @@ class TextMatchChecker(Checker):
         key_word = self.word_freq.most_common(1)[0][0]
         text_match_field_name = random.choice(self.text_match_field_name_list)
         self.term_expr = f"TEXT_MATCH({text_match_field_name}, '{key_word}')"
+        self.expected_ids = self.text_index.text_match(text_match_field_name, key_word) \
+            if self.text_index is not None else None
 
     @trace()
     def text_match(self):
-        res, result = self.c_wrap.query(self.term_expr, timeout=query_timeout,
-                                        check_task=CheckTasks.check_query_not_empty)
+        limit = self.text_match_limit(self.expected_ids)
+        kwargs = {} if limit is None else {"limit": limit}
+        res, result = self.c_wrap.query(self.term_expr, output_fields=[self.int64_field_name], timeout=query_timeout,
+                                        check_task=CheckTasks.check_query_not_empty, **kwargs)
+        if result and limit is not None:
+            result = self.check_text_match_result(res, self.expected_ids)
         return res, result
 
     @exception_handler()
@@ -1433,6 +1489,8 @@ class TextMatchChecker(Checker):
         key_word = self.word_freq.most_common(1)[0][0]
         text_match_field_name = random.choice(self.text_match_field_name_list)
         self.term_expr = f"TEXT_MATCH({text_match_field_name}, '{key_word}')"
+        self.expected_ids = self.text_index.text_match(text_match_field_name, key_word) \
+            if self.text_index is not None else None
         res, result = self.text_match()
         return res, result
 
@@ -1444,11 +1502,14 @@ class TextMatchChecker(Checker):
 
 class PhraseMatchChecker(Checker):
     """check phrase match query operations in a dependent thread"""
+    text_match_reference = True
 
     def __init__(self, collection_name=None, shards_num=2, replica_number=1, schema=None):
+        private_collection = collection_name is None
         if collection_name is None:
             collection_name = cf.gen_unique_str("PhraseMatchChecker_")
-        super().__init__(collection_name=collection_name, shards_num=shards_num, schema=schema)
+        super().__init__(collection_name=collection_name, shards_num=shards_num, schema=schema,
+                         private_collection=private_collection)
         res, result = self.c_wrap.create_index(self.float_vector_field_name,
                                                constants.DEFAULT_INDEX_PARAM,
                                                timeout=timeout,
@@ -1461,11 +1522,17 @@ class PhraseMatchChecker(Checker):
         slop=5
         text_match_field_name = random.choice(self.text_match_field_name_list)
         self.term_expr = f"PHRASE_MATCH({text_match_field_name}, '{key_word_1} {key_word_2}', {slop})"
+        self.expected_ids = self.text_index.phrase_match(text_match_field_name, f"{key_word_1} {key_word_2}", slop) \
+            if self.text_index is not None else None
 
     @trace()
     def phrase_match(self):
-        res, result = self.c_wrap.query(self.term_expr, timeout=query_timeout,
-                                        check_task=CheckTasks.check_query_not_empty)
+        limit = self.text_match_limit(self.expected_ids)
+        kwargs = {} if limit is None else {"limit": limit}
+        res, result = self.c_wrap.query(self.term_expr, output_fields=[self.int64_field_name], timeout=query_timeout,
+                                        check_task=CheckTasks.check_query_not_empty, **kwargs)
+        if result and limit is not None:
+            result = self.check_text_match_result(res, self.expected_ids)
         return res, result
 
     @exception_handler()
@@ -1475,6 +1542,8 @@ class PhraseMatchChecker(Checker):
         slop=5
         text_match_field_name = random.choice(self.text_match_field_name_list)
         self.term_expr = f"PHRASE_MATCH({text_match_field_name}, '{key_word_1} {key_word_2}', {slop})"
+        self.expected_ids = self.text_index.phrase_match(text_match_field_name, f"{key_word_1} {key_word_2}", slop) \
+            if self.text_index is not None else None
         res, result = self.phrase_match()
         return res, result
 
@@ -1796,12 +1865,11 @@ class BulkInsertChecker(Checker):
 
     @trace()
     def bulk_insert(self):
-        log.info(f"bulk insert collection name: {self.c_name}")
-        task_ids, result = self.utility_wrap.do_bulk_insert(collection_name=self.c_name,
-                                                            files=self.files)
-        log.info(f"task ids {task_ids}")
-        completed, result = self.utility_wrap.wait_for_bulk_insert_tasks_completed(task_ids=[task_ids], timeout=720)
-        return task_ids, completed
+        try:
+            return self.do_bulk_insert()
+        except Exception as e:
+            log.error(f"bulk insert to {self.c_name} failed: {e}")
+            return None, False
 
     @exception_handler()
     def run_task(self):
@@ -27,4 +27,7 @@ DEFAULT_BINARY_INDEX_PARAM = {"index_type": "BIN_IVF_FLAT", "metric_type": "JACC
 DEFAULT_BINARY_SEARCH_PARAM = {"metric_type": "JACCARD", "params": {"nprobe": 10}}
 DEFAULT_BM25_INDEX_PARAM = {"index_type": "SPARSE_INVERTED_INDEX", "metric_type": "BM25", "params": {"bm25_k1": 1.5, "bm25_b": 0.75}}
 DEFAULT_BM25_SEARCH_PARAM = {"metric_type": "BM25", "params": {}}
+BM25_SEARCH_LIMIT = 10
+# the tokenizer of the reference differs slightly from the analyzer of milvus, the ties at the limit too
+BM25_RECALL_THRESHOLD = 0.8
 CHAOS_INFO_SAVE_PATH = "/tmp/ci_logs/chaos_info.json"
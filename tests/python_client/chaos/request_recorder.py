@@ -0,0 +1,226 @@
+import os
+import time
+import uuid
+import threading
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from utils.util_log import test_log as log
+
+"""
+Columnar recorder of the requests issued by the chaos checkers.
+Every thread records into its own preallocated ring of numpy columns, so recording takes no lock:
+    start_time: int64 ns since epoch
+    time_cost: float64 seconds
+    operation/collection: int codes of the interned names
+    result: bool
+A background flusher drains the rings into one arrow record batch and writes it as a parquet part file
+of the records directory, names are written as dictionary columns.
+"""
+
+DEFAULT_RING_SIZE = 64 * 1024
+DEFAULT_FLUSH_INTERVAL = 5
+DEFAULT_BATCH_ROWS = 256 * 1024
+
+RECORD_SCHEMA = pa.schema([
+    ("operation_name", pa.dictionary(pa.int16(), pa.string())),
+    ("collection_name", pa.dictionary(pa.int32(), pa.string())),
+    ("start_time", pa.int64()),
+    ("time_cost", pa.float64()),
+    ("result", pa.bool_()),
+])
+
+
+def to_ns(ts):
+    """ ns since epoch of a '%Y-%m-%d %H:%M:%S.%f' local time string, a datetime or a timestamp in seconds """
+    if isinstance(ts, str):
+        ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S.%f')
+    if isinstance(ts, datetime):
+        ts = ts.timestamp()
+    return int(ts * 1e9)
+
+
+def ns_to_local_datetime(ns):
+    """ Convert int64 ns since epoch to naive local datetime64, the same clock as the chaos info time strings """
+    offset = datetime.now().astimezone().utcoffset()
+    return pd.to_datetime(np.asarray(ns, dtype=np.int64), unit="ns") + offset
+
+
+class NameTable:
+    """ Intern names to int codes, only a new name takes the lock """
+
+    def __init__(self):
+        self.names = []
+        self._codes = {}
+        self._lock = threading.Lock()
+
+    def code(self, name):
+        code = self._codes.get(name)
+        if code is None:
+            with self._lock:
+                code = self._codes.get(name)
+                if code is None:
+                    code = len(self.names)
+                    self.names.append(name)
+                    self._codes[name] = code
+        return code
+
+
+class RecordRing:
+    """
+    Single producer single consumer ring of record columns,
+    the owner thread only moves head and the flusher only moves tail
+    """
+
+    def __init__(self, size=DEFAULT_RING_SIZE):
+        self.size = size
+        self.thread = threading.current_thread()
+        self.op = np.zeros(size, dtype=np.int16)
+        self.collection = np.zeros(size, dtype=np.int32)
+        self.start = np.zeros(size, dtype=np.int64)
+        self.cost = np.zeros(size, dtype=np.float64)
+        self.result = np.zeros(size, dtype=np.bool_)
+        self.head = 0
+        self.tail = 0
+
+    def __len__(self):
+        return self.head - self.tail
+
+    def full(self):
+        return self.head - self.tail >= self.size
+
+    def put(self, op, collection, start, cost, result):
+        i = self.head % self.size
+        self.op[i] = op
+        self.collection[i] = collection
+        self.start[i] = start
+        self.cost[i] = cost
+        self.result[i] = result
+        # publish the slot after it is written
+        self.head += 1
+
+    def drain(self):
+        """ Copy out the records between tail and head, None if empty """
+        head, tail = self.head, self.tail
+        if head == tail:
+            return None
+        idx = np.arange(tail, head) % self.size
+        columns = (self.op[idx], self.collection[idx], self.start[idx], self.cost[idx], self.result[idx])
+        self.tail = head
+        return columns
+
+
+class ColumnarRecorder:
+    def __init__(self, path, ring_size=DEFAULT_RING_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 batch_rows=DEFAULT_BATCH_ROWS):
+        self.path = path
+        self.ring_size = ring_size
+        self.flush_interval = flush_interval
+        self.batch_rows = batch_rows
+        self.ops = NameTable()
+        self.collections = NameTable()
+        self.rings = []
+        self.parts = 0
+        self.rows = 0
+        self._local = threading.local()
+        self._register_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = []
+        self._pending_rows = 0
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._flusher = None
+
+    def _ring(self):
+        ring = getattr(self._local, "ring", None)
+        if ring is None:
+            ring = self._local.ring = RecordRing(self.ring_size)
+            with self._register_lock:
+                self.rings.append(ring)
+            self.start()
+        return ring
+
+    def record(self, operation_name, collection_name, start_ns, time_cost, result):
+        ring = self._ring()
+        while ring.full():
+            # back pressure instead of dropping records, the flusher drains the ring
+            self._wakeup.set()
+            time.sleep(0.001)
+        ring.put(self.ops.code(operation_name), self.collections.code(collection_name), start_ns, time_cost,
+                 bool(result))
+
+    def start(self):
+        if self._flusher is None or not self._flusher.is_alive():
+            with self._register_lock:
+                if self._flusher is None or not self._flusher.is_alive():
+                    self._stopped.clear()
+                    self._flusher = threading.Thread(target=self._run, name="request-recorder-flusher", daemon=True)
+                    self._flusher.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush(force=False)
+            except Exception as e:
+                log.error(f"flush request records to {self.path} error: {e}")
+
+    def _drain(self):
+        with self._register_lock:
+            rings = list(self.rings)
+        for ring in rings:
+            columns = ring.drain()
+            if columns is not None:
+                self._pending.append(columns)
+                self._pending_rows += len(columns[0])
+            elif not ring.thread.is_alive():
+                with self._register_lock:
+                    self.rings.remove(ring)
+
+    def _record_batch(self):
+        op, collection, start, cost, result = (np.concatenate(c) for c in zip(*self._pending))
+        return pa.RecordBatch.from_arrays([
+            pa.DictionaryArray.from_arrays(pa.array(op, type=pa.int16()), pa.array(list(self.ops.names),
+                                                                                  type=pa.string())),
+            pa.DictionaryArray.from_arrays(pa.array(collection, type=pa.int32()),
+                                           pa.array(list(self.collections.names), type=pa.string())),
+            pa.array(start, type=pa.int64()),
+            pa.array(cost, type=pa.float64()),
+            pa.array(result, type=pa.bool_()),
+        ], schema=RECORD_SCHEMA)
+
+    def flush(self, force=True):
+        """ Drain the rings, write a part file if there are batch_rows pending or force is set """
+        with self._flush_lock:
+            self._drain()
+            if self._pending_rows == 0 or (not force and self._pending_rows < self.batch_rows):
+                return 0
+            batch = self._record_batch()
+            os.makedirs(self.path, exist_ok=True)
+            part_file = os.path.join(self.path, f"part-{self.parts:05d}.parquet")
+            pq.write_table(pa.Table.from_batches([batch]), part_file)
+            self.parts += 1
+            self.rows += batch.num_rows
+            self._pending = []
+            self._pending_rows = 0
+            return batch.num_rows
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+
+    def read_table(self):
+        self.flush()
+        if self.parts == 0:
+            return RECORD_SCHEMA.empty_table()
+        return pq.read_table(self.path, schema=RECORD_SCHEMA)
+
+
+def new_records_path(prefix="request_records", root="/tmp/ci_logs"):
+    return os.path.join(root, f"{prefix}_{uuid.uuid4()}")
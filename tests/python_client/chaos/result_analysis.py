@@ -0,0 +1,286 @@
+import os
+import glob
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from utils.util_log import test_log as log
+
+"""
+Streaming analysis of the request records written by the columnar recorder.
+The parquet part files are read batch by batch and folded into small per operation accumulators,
+so the memory does not grow with the number of records:
+    success/failure counts of 1s windows, by np.bincount over (operation, window)
+    a log scaled histogram of the latency of the successful requests, for the percentiles
+    the first and the last failure, and the first success after the last failure for the RTO
+Times are int64 ns since epoch, windows are aligned on the local clock like the chaos info time strings.
+"""
+
+NS = 10 ** 9
+READ_BATCH_ROWS = 256 * 1024
+# latency histogram: BINS_PER_DECADE log bins per decade from MIN_LATENCY to MIN_LATENCY * 10 ** DECADES seconds
+MIN_LATENCY = 1e-6
+DECADES = 10
+BINS_PER_DECADE = 100
+LATENCY_BINS = DECADES * BINS_PER_DECADE
+DEFAULT_PERCENTILES = (50, 90, 99, 99.9)
+
+
+def local_offset_ns():
+    return int(datetime.now().astimezone().utcoffset().total_seconds() * NS)
+
+
+def record_files(path):
+    return sorted(glob.glob(os.path.join(path, "*.parquet")))
+
+
+def iter_record_batches(files, columns=None, min_start_ns=None, batch_rows=READ_BATCH_ROWS):
+    """
+    Yield the record batches of files row group by row group,
+    row groups whose max start_time is less than min_start_ns are skipped by the parquet statistics
+    """
+    for file in files:
+        pf = pq.ParquetFile(file)
+        row_groups = list(range(pf.metadata.num_row_groups))
+        if min_start_ns is not None:
+            start_col = pf.schema_arrow.get_field_index("start_time")
+            kept = []
+            for i in row_groups:
+                stats = pf.metadata.row_group(i).column(start_col).statistics
+                if stats is None or not stats.has_min_max or stats.max >= min_start_ns:
+                    kept.append(i)
+            row_groups = kept
+        if not row_groups:
+            continue
+        for batch in pf.iter_batches(batch_size=batch_rows, row_groups=row_groups, columns=columns):
+            yield batch
+
+
+def latency_bin(cost):
+    idx = np.floor(np.log10(np.maximum(cost, MIN_LATENCY) / MIN_LATENCY) * BINS_PER_DECADE)
+    return np.clip(idx, 0, LATENCY_BINS - 1).astype(np.int64)
+
+
+def latency_bin_value(idx):
+    """ The geometric middle of the latency bin """
+    return MIN_LATENCY * 10 ** ((np.asarray(idx) + 0.5) / BINS_PER_DECADE)
+
+
+class RecordStats:
+    """ Accumulators of the records per operation, fed batch by batch """
+
+    def __init__(self, window=1, utc_offset_ns=None):
+        self.window_ns = int(window * NS)
+        self.utc_offset_ns = local_offset_ns() if utc_offset_ns is None else utc_offset_ns
+        self.ops = []
+        self._op_codes = {}
+        self.first_window = None
+        # [operation, window]
+        self.success = np.zeros((0, 0), dtype=np.int64)
+        self.failed = np.zeros((0, 0), dtype=np.int64)
+        # [operation, latency bin] of the successful requests
+        self.latency_hist = np.zeros((0, LATENCY_BINS), dtype=np.int64)
+        self.latency_sum = np.zeros(0, dtype=np.float64)
+        self.latency_max = np.zeros(0, dtype=np.float64)
+        self.first_fail = np.zeros(0, dtype=np.int64)
+        self.last_fail = np.zeros(0, dtype=np.int64)
+        self.recovered_at = np.zeros(0, dtype=np.int64)
+        self.rows = 0
+
+    def _op_code(self, name):
+        code = self._op_codes.get(name)
+        if code is None:
+            code = self._op_codes[name] = len(self.ops)
+            self.ops.append(name)
+        return code
+
+    def op_codes(self, column):
+        """ Map an operation_name column, dictionary encoded or not, to the codes of this accumulator """
+        if isinstance(column, pa.ChunkedArray):
+            column = column.combine_chunks()
+        if not pa.types.is_dictionary(column.type):
+            column = pc.dictionary_encode(column)
+        lookup = np.array([self._op_code(name) for name in column.dictionary.to_pylist()], dtype=np.int64)
+        indices = column.indices.to_numpy(zero_copy_only=False)
+        codes = lookup[indices] if len(lookup) else np.zeros(len(indices), dtype=np.int64)
+        self._grow_ops()
+        return codes
+
+    def _grow_ops(self):
+        n = len(self.ops)
+        extra = n - len(self.latency_sum)
+        if extra <= 0:
+            return
+        self.success = np.pad(self.success, ((0, extra), (0, 0)))
+        self.failed = np.pad(self.failed, ((0, extra), (0, 0)))
+        self.latency_hist = np.pad(self.latency_hist, ((0, extra), (0, 0)))
+        self.latency_sum = np.pad(self.latency_sum, (0, extra))
+        self.latency_max = np.pad(self.latency_max, (0, extra))
+        self.first_fail = np.pad(self.first_fail, (0, extra), constant_values=np.iinfo(np.int64).max)
+        self.last_fail = np.pad(self.last_fail, (0, extra), constant_values=-1)
+        self.recovered_at = np.pad(self.recovered_at, (0, extra), constant_values=np.iinfo(np.int64).max)
+
+    def _grow_windows(self, lo, hi):
+        if self.first_window is None:
+            self.first_window = lo
+            self.success = np.zeros((len(self.ops), hi - lo + 1), dtype=np.int64)
+            self.failed = np.zeros_like(self.success)
+            return
+        before = max(0, self.first_window - lo)
+        after = max(0, hi - (self.first_window + self.success.shape[1] - 1))
+        if before or after:
+            self.success = np.pad(self.success, ((0, 0), (before, after)))
+            self.failed = np.pad(self.failed, ((0, 0), (before, after)))
+            self.first_window -= before
+
+    def add(self, codes, start, cost, result):
+        if len(codes) == 0:
+            return
+        n_ops = len(self.ops)
+        windows = (start + self.utc_offset_ns) // self.window_ns
+        self._grow_windows(int(windows.min()), int(windows.max()))
+        n_windows = self.success.shape[1]
+        keys = codes * n_windows + (windows - self.first_window)
+        size = n_ops * n_windows
+        self.success += np.bincount(keys[result], minlength=size).reshape(n_ops, n_windows)
+        self.failed += np.bincount(keys[~result], minlength=size).reshape(n_ops, n_windows)
+
+        ok_codes = codes[result]
+        ok_cost = cost[result]
+        self.latency_hist += np.bincount(ok_codes * LATENCY_BINS + latency_bin(ok_cost),
+                                         minlength=n_ops * LATENCY_BINS).reshape(n_ops, LATENCY_BINS)
+        self.latency_sum += np.bincount(ok_codes, weights=ok_cost, minlength=n_ops)
+        np.maximum.at(self.latency_max, ok_codes, ok_cost)
+
+        fail_codes = codes[~result]
+        fail_start = start[~result]
+        np.minimum.at(self.first_fail, fail_codes, fail_start)
+        np.maximum.at(self.last_fail, fail_codes, fail_start)
+        self.rows += len(codes)
+
+    def add_batch(self, batch):
+        self.add(self.op_codes(batch.column("operation_name")),
+                 batch.column("start_time").to_numpy(zero_copy_only=False),
+                 batch.column("time_cost").to_numpy(zero_copy_only=False),
+                 batch.column("result").to_numpy(zero_copy_only=False))
+
+    def add_recovery_batch(self, batch):
+        """ Second pass: the first success after the last failure of every operation """
+        codes = self.op_codes(batch.column("operation_name"))
+        start = batch.column("start_time").to_numpy(zero_copy_only=False)
+        result = batch.column("result").to_numpy(zero_copy_only=False)
+        mask = result & (start > self.last_fail[codes])
+        np.minimum.at(self.recovered_at, codes[mask], start[mask])
+
+    def window_start_ns(self, window_idx):
+        """ Epoch ns of the start of the windows """
+        return (self.first_window + np.asarray(window_idx)) * self.window_ns - self.utc_offset_ns
+
+    def coarsen(self, factor):
+        """ (first window start ns, success, failed) summed over factor consecutive windows, aligned on the clock """
+        if self.first_window is None:
+            empty = np.zeros((len(self.ops), 0), dtype=np.int64)
+            return 0, empty, empty.copy()
+        lead = self.first_window % factor
+        n = self.success.shape[1] + lead
+        pad = (0, -n % factor)
+        success = np.pad(self.success, ((0, 0), (lead, pad[1]))).reshape(len(self.ops), -1, factor).sum(axis=2)
+        failed = np.pad(self.failed, ((0, 0), (lead, pad[1]))).reshape(len(self.ops), -1, factor).sum(axis=2)
+        first_start = (self.first_window - lead) * self.window_ns - self.utc_offset_ns
+        return first_start, success, failed
+
+    def percentiles(self, percentiles=DEFAULT_PERCENTILES):
+        """ Approximate latency percentiles of the successful requests, {operation: {p: seconds}} """
+        cum = np.cumsum(self.latency_hist, axis=1)
+        res = {}
+        for code, name in enumerate(self.ops):
+            total = cum[code, -1] if cum.shape[1] else 0
+            if total == 0:
+                res[name] = {}
+                continue
+            ranks = np.ceil(np.asarray(percentiles) / 100 * total)
+            bins = np.searchsorted(cum[code], np.maximum(ranks, 1))
+            values = np.minimum(latency_bin_value(bins), self.latency_max[code])
+            res[name] = {p: float(v) for p, v in zip(percentiles, values)}
+        return res
+
+    def rto(self):
+        """
+        Seconds from the first failure to the first success after the last failure of every operation,
+        to the last failure if it never recovered, 0 if it never failed
+        """
+        res = {}
+        for code, name in enumerate(self.ops):
+            if self.last_fail[code] < 0:
+                res[name] = 0
+                continue
+            end = self.recovered_at[code] if self.recovered_at[code] != np.iinfo(np.int64).max \
+                else self.last_fail[code]
+            res[name] = (end - self.first_fail[code]) / NS
+        return res
+
+
+def analyze_records(files, window=1, utc_offset_ns=None, batch_rows=READ_BATCH_ROWS):
+    """ Fold the record files into RecordStats in two streaming passes """
+    stats = RecordStats(window=window, utc_offset_ns=utc_offset_ns)
+    for batch in iter_record_batches(files, batch_rows=batch_rows):
+        stats.add_batch(batch)
+    failed_ops = stats.last_fail[stats.last_fail >= 0]
+    if len(failed_ops):
+        # only the row groups after the earliest last failure are read again
+        columns = ["operation_name", "start_time", "result"]
+        for batch in iter_record_batches(files, columns=columns, min_start_ns=int(failed_ops.min()),
+                                         batch_rows=batch_rows):
+            stats.add_recovery_batch(batch)
+    log.info(f"analyzed {stats.rows} request records of {len(stats.ops)} operations in {len(files)} files")
+    return stats
+
+
+def window_frame(stats, interval=1):
+    """ A small DataFrame of the non empty windows: start_time, operation_name, success_count, failed_count, success_rate """
+    first_start, success, failed = stats.coarsen(int(interval))
+    op_idx, win_idx = np.nonzero(success + failed)
+    start_ns = first_start + win_idx * stats.window_ns * int(interval)
+    df = pd.DataFrame({
+        "start_time": pd.to_datetime(start_ns + stats.utc_offset_ns, unit="ns"),
+        "operation_name": np.array(stats.ops, dtype=object)[op_idx] if len(stats.ops) else np.array([], dtype=object),
+        "success_count": success[op_idx, win_idx],
+        "failed_count": failed[op_idx, win_idx],
+    })
+    df["success_rate"] = df["success_count"] / (df["success_count"] + df["failed_count"]).replace(0, 1)
+    return df.sort_values(by=["start_time", "operation_name"], kind="stable").reset_index(drop=True)
+
+
+def summarize_stages(stats, chaos_start_ns, chaos_end_ns, recovery_ns):
+    """
+    Mean success rate of the 1s windows and the request counts of every operation
+    before the chaos, during the chaos and after the recovery, a window is staged by its start time
+    """
+    first_start, success, failed = stats.coarsen(1)
+    n_windows = success.shape[1]
+    starts = first_start + np.arange(n_windows, dtype=np.int64) * stats.window_ns
+    # windows of [0, before_end) are before the chaos, [during_start, during_end) during and [after_start, n) after
+    before_end = np.searchsorted(starts, chaos_start_ns, side="left")
+    during_end = np.searchsorted(starts, chaos_end_ns, side="right")
+    after_start = np.searchsorted(starts, recovery_ns, side="right")
+    stages = {
+        "before_chaos": slice(0, before_end),
+        "during_chaos": slice(before_end, during_end),
+        "after_chaos": slice(after_start, n_windows),
+    }
+    res = {}
+    for code, name in enumerate(stats.ops):
+        res[name] = {}
+        for stage, s in stages.items():
+            succ = success[code, s]
+            fail = failed[code, s]
+            total = succ + fail
+            observed = total > 0
+            if not observed.any():
+                res[name][stage] = "no data"
+                continue
+            rate = float(np.mean(succ[observed] / total[observed]))
+            res[name][stage] = f"{rate}({int(succ.sum())}/{int(total.sum())})"
+    return res
@@ -416,11 +416,12 @@ class ResponseChecker:
         else:
             log.info("search_results_check: Numbers of query searched is correct")
         enable_milvus_client_api = check_items.get("enable_milvus_client_api", False)
+        # the hits of all the queries are gathered and their distances checked in one batch
+        hit_ids = []
+        hit_distances = []
         # log.debug(search_res)
         for hits in search_res:
-            searched_original_vectors = []
             ids = []
-            vector_id = 0
             if enable_milvus_client_api:
                 for hit in hits:
                     ids.append(hit['id'])
@@ -445,15 +446,18 @@ class ResponseChecker:
                         raise Exception("vector for searched (nq) is needed for distance check")
                     if check_items.get("original_vectors") is None:
                         raise Exception("inserted vectors are needed for distance check")
-                    for id in hits.ids:
-                        searched_original_vectors.append(check_items["original_vectors"][id])
-                    cf.compare_distance_vector_and_vector_list(check_items["vector_nq"][vector_id],
-                                                               searched_original_vectors,
-                                                               check_items["metric"], hits.distances)
-                    log.info("search_results_check: Checked the distances for one nq: OK")
+                    hit_ids.append(ids)
+                    if enable_milvus_client_api:
+                        hit_distances.append([hit['distance'] for hit in hits])
+                    else:
+                        hit_distances.append(list(hits.distances))
                 else:
                     pass  # just check nq and topk, not specific ids need check
-            vector_id +=  1
+        if hit_ids:
+            cf.compare_search_distances(check_items["vector_nq"][:len(hit_ids)], check_items["original_vectors"],
+                                        hit_ids, hit_distances, check_items["metric"],
+                                        epsilon=check_items.get("epsilon", ct.epsilon))
+            log.info("search_results_check: Checked the distances for %d nq: OK" % len(hit_ids))
         log.info("search_results_check: limit (topK) and "
                  "ids searched for %d queries are correct" % len(search_res))
 
@@ -0,0 +1,5 @@
+"""
+Common modules of the python client tests,
+import_jobs and transfer_manager are also used by the RESTful v2 tests, they do not import the utils of a suite,
+the logger is passed by the caller
+"""
@@ -0,0 +1,221 @@
+import re
+import hashlib
+import numpy as np
+import scipy.sparse as sp
+import jieba
+from bm25s.stopwords import STOPWORDS_EN
+from utils.util_log import test_log as log
+
+"""
+Incremental BM25 reference index for full text search checks.
+Documents can be appended and deleted, the statistics (document frequency, average length) are updated in place,
+and the tokenization of a document is cached by the hash of its text.
+Scores are computed for a batch of queries at once by a sparse matrix product:
+    score(q, d) = sum over the tokens t of q: count(t, q) * idf(t) * tf(t, d) / (tf(t, d) + norm(d))
+    norm(d) = k1 * (1 - b + b * |d| / avgdl)
+    idf(t) = log(1 + (N - df(t) + 0.5) / (df(t) + 0.5))
+which is the lucene variant used by bm25s.BM25 and gives the same ranking as the BM25 metric of milvus.
+"""
+
+DEFAULT_K1 = 1.5
+DEFAULT_B = 0.75
+# queries scored together, the scores of a block are a sparse (queries x documents) matrix
+QUERY_BLOCK = 256
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+STOPWORDS = frozenset(STOPWORDS_EN)
+
+
+def remove_punctuation(text):
+    text = text.strip()
+    text = text.replace("\n", " ")
+    return re.sub(r'[^\w\s]', ' ', text)
+
+
+def tokenize(text, language="en"):
+    """ The tokens of get_bm25_ground_truth: lowercase, english stopwords removed, jieba for chinese """
+    text = text.lower()
+    if language in ["zh", "cn", "chinese"]:
+        return [t for t in jieba.lcut(remove_punctuation(text)) if t.strip()]
+    tokens = TOKEN_PATTERN.findall(text)
+    if language in ["en", "english"]:
+        return [t for t in tokens if t not in STOPWORDS]
+    return tokens
+
+
+def text_hash(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class BM25Index:
+    def __init__(self, language="en", k1=DEFAULT_K1, b=DEFAULT_B):
+        self.language = language
+        self.k1 = k1
+        self.b = b
+        self.vocab = {}
+        # document text hash -> (token ids, token counts)
+        self._token_cache = {}
+        self.ids = []
+        self._rows = {}
+        # per document row
+        self._lengths = np.zeros(0, dtype=np.int64)
+        self._alive = np.zeros(0, dtype=bool)
+        # per token
+        self._df = np.zeros(0, dtype=np.int64)
+        # appended chunks of the (documents x vocab) term frequency matrix
+        self._chunks = []
+        self._matrix = None
+        self._weights = None
+        self.cache_hits = 0
+
+    def __len__(self):
+        return int(self._alive.sum())
+
+    @property
+    def avgdl(self):
+        n = len(self)
+        return float(self._lengths[self._alive].sum()) / n if n else 0.0
+
+    def _token_ids(self, tokens, add):
+        ids = []
+        for t in tokens:
+            tid = self.vocab.get(t)
+            if tid is None:
+                if not add:
+                    continue
+                tid = self.vocab[t] = len(self.vocab)
+            ids.append(tid)
+        return ids
+
+    def analyze(self, text, add=True):
+        """ (token ids, counts) of a text, documents are cached by hash, queries are not added to the vocab """
+        if not isinstance(text, str):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        key = text_hash(text) if add else None
+        if key is not None and key in self._token_cache:
+            self.cache_hits += 1
+            return self._token_cache[key]
+        ids = np.asarray(self._token_ids(tokenize(text, self.language), add), dtype=np.int64)
+        res = np.unique(ids, return_counts=True)
+        if key is not None:
+            self._token_cache[key] = res
+        return res
+
+    def add(self, documents, ids=None):
+        """ Append documents, ids default to the row of the document in the index """
+        start = len(self.ids)
+        ids = list(range(start, start + len(documents))) if ids is None else list(ids)
+        if len(ids) != len(documents):
+            raise Exception(f"{len(documents)} documents with {len(ids)} ids")
+        analyzed = [self.analyze(doc) for doc in documents]
+        nnz = np.array([len(tids) for tids, _ in analyzed], dtype=np.int64)
+        cols = np.concatenate([tids for tids, _ in analyzed]) if analyzed else np.zeros(0, dtype=np.int64)
+        tfs = np.concatenate([counts for _, counts in analyzed]) if analyzed else np.zeros(0, dtype=np.int64)
+        indptr = np.concatenate([[0], np.cumsum(nnz)])
+        # documents without tokens have a length of 0, everything is computed before the state is changed
+        lengths = np.bincount(np.repeat(np.arange(len(documents)), nnz), weights=tfs,
+                              minlength=len(documents)).astype(np.int64)
+        df = np.bincount(cols, minlength=len(self.vocab))
+
+        self._chunks.append((indptr, cols, tfs))
+        self._matrix = None
+        self._weights = None
+        self._df = np.pad(self._df, (0, len(self.vocab) - len(self._df))) + df
+        self._lengths = np.concatenate([self._lengths, lengths])
+        self._alive = np.concatenate([self._alive, np.ones(len(documents), dtype=bool)])
+        for row, i in enumerate(ids, start=start):
+            old = self._rows.get(i)
+            if old is not None:
+                # the same id is upserted, the old document is deleted
+                self._delete_rows([old])
+            self._rows[i] = row
+        self.ids.extend(ids)
+        return ids
+
+    def _delete_rows(self, rows):
+        rows = np.asarray([r for r in rows if self._alive[r]], dtype=np.int64)
+        if len(rows) == 0:
+            return
+        matrix = self.matrix()
+        deleted = matrix[rows]
+        self._df -= np.bincount(deleted.indices, minlength=len(self._df))
+        self._alive[rows] = False
+        self._weights = None
+
+    def delete(self, ids):
+        rows = [self._rows.pop(i) for i in ids if i in self._rows]
+        self._delete_rows(rows)
+        return len(rows)
+
+    def matrix(self):
+        """ The term frequency matrix of all rows, deleted rows included """
+        if self._matrix is None or self._matrix.shape != (len(self.ids), len(self.vocab)):
+            blocks = [sp.csr_matrix((tfs, cols, indptr), shape=(len(indptr) - 1, len(self.vocab)))
+                      for indptr, cols, tfs in self._chunks]
+            self._matrix = sp.vstack(blocks, format="csr") if blocks else \
+                sp.csr_matrix((0, len(self.vocab)), dtype=np.int64)
+            self._chunks = [(self._matrix.indptr, self._matrix.indices, self._matrix.data)]
+        return self._matrix
+
+    def idf(self):
+        n = len(self)
+        df = self._df.astype(np.float64)
+        return np.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def weights(self):
+        """ (documents x vocab) tf component of every term, 0 for deleted rows """
+        if self._weights is not None:
+            return self._weights
+        tf = self.matrix().astype(np.float64)
+        row_of_nnz = np.repeat(np.arange(tf.shape[0]), np.diff(tf.indptr))
+        avgdl = self.avgdl or 1.0
+        norm = self.k1 * (1 - self.b + self.b * self._lengths / avgdl)
+        data = tf.data / (tf.data + norm[row_of_nnz])
+        data[~self._alive[row_of_nnz]] = 0
+        w = sp.csr_matrix((data, tf.indices, tf.indptr), shape=tf.shape)
+        w.eliminate_zeros()
+        self._weights = w
+        return w
+
+    def query_matrix(self, queries):
+        """ (queries x vocab) count(t, q) * idf(t), the tokens out of the vocab match nothing """
+        idf = self.idf()
+        rows, cols, vals = [], [], []
+        for i, q in enumerate(queries):
+            tids, counts = self.analyze(q, add=False)
+            rows.append(np.full(len(tids), i))
+            cols.append(tids)
+            vals.append(counts * idf[tids])
+        if not rows:
+            return sp.csr_matrix((0, len(self.vocab)))
+        return sp.csr_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+                             shape=(len(queries), len(self.vocab)))
+
+    def search(self, queries, top_k=100, query_block=QUERY_BLOCK):
+        """
+        Score the queries against all documents in blocks of query_block,
+        only the documents sharing a token with the query are returned, in the descending order of score
+        :param top_k: int or list of int, the results of a list are computed once for the max top_k
+        :return: (ids, scores) lists per query, or {top_k: (ids, scores)} if top_k is a list
+        """
+        if isinstance(queries, str):
+            queries = [queries]
+        top_ks = list(top_k) if isinstance(top_k, (list, tuple)) else [top_k]
+        k = max(top_ks)
+        wt = self.weights().T.tocsc()
+        ids = np.asarray(self.ids, dtype=object)
+        all_ids, all_scores = [], []
+        for start in range(0, len(queries), query_block):
+            scores = (self.query_matrix(queries[start:start + query_block]) @ wt).tocsr()
+            for i in range(scores.shape[0]):
+                lo, hi = scores.indptr[i], scores.indptr[i + 1]
+                rows, values = scores.indices[lo:hi], scores.data[lo:hi]
+                if len(values) > k:
+                    part = np.argpartition(-values, k - 1)[:k]
+                    rows, values = rows[part], values[part]
+                order = np.lexsort((rows, -values))
+                all_ids.append(ids[rows[order]].tolist())
+                all_scores.append(values[order].tolist())
+        log.debug(f"bm25 searched {len(queries)} queries in {len(self)} documents")
+        if isinstance(top_k, (list, tuple)):
+            return {t: ([r[:t] for r in all_ids], [s[:t] for s in all_scores]) for t in top_ks}
+        return all_ids, all_scores
@@ -11,10 +11,15 @@ from pathlib import Path
 import uuid
 from faker import Faker
 from sklearn import preprocessing
+from functools import partial
 from common.common_func import gen_unique_str
 from common.minio_comm import copy_files_to_minio
+from common.transfer_manager import DEFAULT_WORKERS, DEFAULT_PART_SIZE
+from common import bulk_insert_writer as bw
+from common import column_generator as cg
 from utils.util_log import test_log as log
 import pyarrow as pa
+import pyarrow.parquet as pq
 
 data_source = "/tmp/bulk_insert_data"
 fake = Faker()
@@ -362,31 +367,33 @@ def gen_column_base_json_file(col_file, str_pk, data_fields, float_vect,
         f.write("\n")
 
 
-def gen_vectors_in_numpy_file(dir, data_field, float_vector, rows, dim, vector_type="float32", force=False):
+def gen_vector_batch_for_numpy(vector_type, rows, dim):
+    """ A batch of vectors as saved in npy files: float32 vectors are l2 normalized float64, others are uint8 bytes """
+    gen = cg.get_generator()
+    if vector_type == "float32":
+        return gen.float_vectors(rows, dim, normalize=True, dtype=np.float64)
+    if vector_type == "fp16":
+        return gen.fp16_vectors(rows, dim)[1].view(np.uint8)
+    if vector_type == "bf16":
+        return gen.bf16_vectors(rows, dim)[1].view(np.uint8)
+    return gen.binary_vectors(rows, dim)[1]
+
+
+def gen_vectors_in_numpy_file(dir, data_field, float_vector, rows, dim, vector_type="float32", force=False,
+                              batch_rows=bw.DEFAULT_BATCH_ROWS):
     file_name = f"{data_field}.npy"
     file = f'{dir}/{file_name}'
 
     if not os.path.exists(file) or force:
-        # vector columns
-        vectors = []
+        # vector columns, written batch by batch into the memory-mapped file
         if rows > 0:
-            if vector_type == "float32":
-                vectors = gen_float_vectors(rows, dim)
-                arr = np.array(vectors)
-            elif vector_type == "fp16":
-                vectors = gen_fp16_vectors(rows, dim)[1]
-                arr = np.array(vectors, dtype=np.dtype("uint8"))
-            elif vector_type == "bf16":
-                vectors = gen_bf16_vectors(rows, dim)[1]
-                arr = np.array(vectors, dtype=np.dtype("uint8"))
-            elif vector_type == "binary":
-                vectors = gen_binary_vectors(rows, (dim // 8))
-                arr = np.array(vectors, dtype=np.dtype("uint8"))
-            else:
-                vectors = gen_binary_vectors(rows, (dim // 8))
-                arr = np.array(vectors, dtype=np.dtype("uint8"))
-            log.info(f"file_name: {file_name} data type: {arr.dtype} data shape: {arr.shape}")
-            np.save(file, arr)
+            first = gen_vector_batch_for_numpy(vector_type, min(rows, batch_rows), dim)
+            with bw.NpyStreamWriter(file, rows, first.dtype, first.shape[1:]) as writer:
+                writer.write(first)
+                for start, n in bw.iter_batches(rows, batch_rows):
+                    if start > 0:
+                        writer.write(gen_vector_batch_for_numpy(vector_type, n, dim))
+            log.info(f"file_name: {file_name} data type: {first.dtype} data shape: {(rows,) + first.shape[1:]}")
     return file_name
 
 
@@ -826,13 +833,13 @@ def gen_new_json_files(float_vector, rows, dim, data_fields, file_nums=1, array_
     for i in range(file_nums):
         file_name = f"data-fields-{len(data_fields)}-rows-{rows}-dim-{dim}-file-num-{i}-{str(uuid.uuid4())}.json"
         file = f"{data_source_new}/{file_name}"
-        Path(file).parent.mkdir(parents=True, exist_ok=True)
-        data = gen_dict_data_by_data_field(data_fields=data_fields, rows=rows, start=start_uid,
-                                           float_vector=float_vector, dim=dim, array_length=array_length,
-                                           enable_dynamic_field=enable_dynamic_field, **kwargs)
-        # log.info(f"data: {data}")
-        with open(file, "w") as f:
-            json.dump(data, f)
+        # rows are generated and dumped batch by batch, shuffle is done inside every batch
+        with bw.JsonRowStreamWriter(file) as writer:
+            for start, n in bw.iter_batches(rows):
+                data = gen_dict_data_by_data_field(data_fields=data_fields, rows=n, start=start_uid + start,
+                                                   float_vector=float_vector, dim=dim, array_length=array_length,
+                                                   enable_dynamic_field=enable_dynamic_field, **kwargs)
+                writer.write(data)
         # get the file size
         if file_size is not None:
             batch_file_size = os.path.getsize(f"{data_source_new}/{file_name}")
@@ -841,12 +848,12 @@ def gen_new_json_files(float_vector, rows, dim, data_fields, file_nums=1, array_
             total_batch = int(file_size*1024*1024*1024/batch_file_size)
             total_rows = total_batch * rows
             log.info(f"total_rows: {total_rows}")
-            all_data = []
-            for _ in range(total_batch):
-                all_data += data
             file_name = f"data-fields-{len(data_fields)}-rows-{total_rows}-dim-{dim}-file-num-{i}-{str(uuid.uuid4())}.json"
-            with open(f"{data_source_new}/{file_name}", "w") as f:
-                json.dump(all_data, f)
+            # the sample rows are encoded once and written total_batch times
+            with bw.JsonRowStreamWriter(f"{data_source_new}/{file_name}") as writer:
+                body = writer.encode(data)
+                for _ in range(total_batch):
+                    writer.write_encoded(body, len(data))
             batch_file_size = os.path.getsize(f"{data_source_new}/{file_name}")
             log.info(f"file_size with rows {total_rows} for {file_name}: {batch_file_size/1024/1024/1024} GB")
         files.append(file_name)
@@ -855,6 +862,15 @@ def gen_new_json_files(float_vector, rows, dim, data_fields, file_nums=1, array_
     return files
 
 
+def repeat_numpy_file(file, times):
+    """ Rewrite the npy file with its rows repeated times, only the original rows are held in memory """
+    arr = np.load(file)
+    with bw.NpyStreamWriter(file, len(arr) * times, arr.dtype, arr.shape[1:]) as writer:
+        for _ in range(times):
+            writer.write(arr)
+    log.info(f"file_name: {file} data type: {arr.dtype} data shape: {(len(arr) * times,) + arr.shape[1:]}")
+
+
 def gen_npy_files(float_vector, rows, dim, data_fields, file_size=None, file_nums=1, err_type="", force=False, enable_dynamic_field=False, include_meta=True, **kwargs):
     # gen numpy files
     schema = kwargs.get("schema", None)
@@ -871,7 +887,8 @@ def gen_npy_files(float_vector, rows, dim, data_fields, file_size=None, file_num
     nullable = False
     shuffle_pk = kwargs.get("shuffle_pk", False)
     if file_nums == 1:
-        # gen the numpy file without subfolders if only one set of files
+        # gen the numpy file without subfolders if only one set of files, fields are written in parallel
+        tasks = []
         for data_field in data_fields:
             if schema is not None:
                 fields = schema.get("fields", [])
@@ -895,23 +912,27 @@ def gen_npy_files(float_vector, rows, dim, data_fields, file_size=None, file_num
                     float_vector = True
                     vector_type = "fp16"
 
-                file_name = gen_vectors_in_numpy_file(dir=data_source_new, data_field=data_field, float_vector=float_vector,
-                                                      vector_type=vector_type, rows=rows, dim=dim, force=force)
+                tasks.append(partial(gen_vectors_in_numpy_file, dir=data_source_new, data_field=data_field,
+                                     float_vector=float_vector, vector_type=vector_type, rows=rows, dim=dim,
+                                     force=force))
             elif data_field == DataField.string_field:  # string field for numpy not supported yet at 2022-10-17
-                file_name = gen_string_in_numpy_file(dir=data_source_new, data_field=data_field, rows=rows, force=force, shuffle_pk=shuffle_pk)
+                tasks.append(partial(gen_string_in_numpy_file, dir=data_source_new, data_field=data_field, rows=rows,
+                                     force=force, shuffle_pk=shuffle_pk))
             elif data_field == DataField.text_field:
-                file_name = gen_text_in_numpy_file(dir=data_source_new, data_field=data_field, rows=rows, force=force, nullable=nullable)
+                tasks.append(partial(gen_text_in_numpy_file, dir=data_source_new, data_field=data_field, rows=rows,
+                                     force=force, nullable=nullable))
             elif data_field == DataField.bool_field:
-                file_name = gen_bool_in_numpy_file(dir=data_source_new, data_field=data_field, rows=rows, force=force)
+                tasks.append(partial(gen_bool_in_numpy_file, dir=data_source_new, data_field=data_field, rows=rows,
+                                     force=force))
             elif data_field == DataField.json_field:
-                file_name = gen_json_in_numpy_file(dir=data_source_new, data_field=data_field, rows=rows, force=force)
+                tasks.append(partial(gen_json_in_numpy_file, dir=data_source_new, data_field=data_field, rows=rows,
+                                     force=force))
             else:
-                file_name = gen_int_or_float_in_numpy_file(dir=data_source_new, data_field=data_field,
-                                                           rows=rows, force=force, nullable=nullable, shuffle_pk=shuffle_pk)
-            files.append(file_name)
+                tasks.append(partial(gen_int_or_float_in_numpy_file, dir=data_source_new, data_field=data_field,
+                                     rows=rows, force=force, nullable=nullable, shuffle_pk=shuffle_pk))
         if enable_dynamic_field and include_meta:
-            file_name = gen_dynamic_field_in_numpy_file(dir=data_source_new, rows=rows, force=force)
-            files.append(file_name)
+            tasks.append(partial(gen_dynamic_field_in_numpy_file, dir=data_source_new, rows=rows, force=force))
+        files = bw.run_parallel(tasks)
         if file_size is not None:
             batch_file_size = 0
             for file_name in files:
@@ -920,15 +941,7 @@ def gen_npy_files(float_vector, rows, dim, data_fields, file_size=None, file_num
             # calculate the rows to be generated
             total_batch = int(file_size*1024*1024*1024/batch_file_size)
             total_rows = total_batch * rows
-            new_files = []
-            for f in files:
-                arr = np.load(f"{data_source_new}/{f}")
-                all_arr = np.concatenate([arr for _ in range(total_batch)], axis=0)
-                file_name = f
-                np.save(f"{data_source_new}/{file_name}", all_arr)
-                log.info(f"file_name: {file_name} data type: {all_arr.dtype} data shape: {all_arr.shape}")
-                new_files.append(file_name)
-            files = new_files
+            bw.run_parallel([partial(repeat_numpy_file, f"{data_source_new}/{f}", total_batch) for f in files])
             batch_file_size = 0
             for file_name in files:
                 batch_file_size += os.path.getsize(f"{data_source_new}/{file_name}")
@@ -959,6 +972,35 @@ def gen_dynamic_field_data_in_parquet_file(rows, start=0):
     return data
 
 
+def write_parquet_file(file, data_fields, rows, start=0, float_vector=True, dim=128, array_length=None,
+                       with_meta=False, row_group_size=None, batch_rows=bw.DEFAULT_BATCH_ROWS, **kwargs):
+    """
+    Generate the data of data_fields batch by batch, the row groups are cut at row_group_size, not at the batches,
+    the memory used is bounded by batch_rows and row_group_size whatever rows is
+    """
+    # the array length is chosen once for every field of the file, not for every batch
+    array_lengths = {data_field: array_length if array_length is not None else random.randint(0, 10)
+                     for data_field in data_fields}
+    with bw.ParquetStreamWriter(file, row_group_size=row_group_size) as writer:
+        # an empty file still gets its schema from an empty batch
+        batches = bw.iter_batches(rows, batch_rows) if rows > 0 else [(0, 0)]
+        for batch_start, n in batches:
+            all_field_data = {}
+            for data_field in data_fields:
+                all_field_data[data_field] = gen_data_by_data_field(data_field=data_field, rows=n,
+                                                                    start=start + batch_start,
+                                                                    float_vector=float_vector, dim=dim,
+                                                                    array_length=array_lengths[data_field], **kwargs)
+            if with_meta:
+                all_field_data["$meta"] = gen_dynamic_field_data_in_parquet_file(rows=n, start=start + batch_start)
+            df = pd.DataFrame(all_field_data)
+            if batch_start == 0:
+                log.info(f"df: \n{df}")
+            writer.write(df)
+    log.info(f"file_name: {file} rows: {rows}")
+    return file
+
+
 def gen_parquet_files(float_vector, rows, dim, data_fields, file_size=None, row_group_size=None, file_nums=1,
                       array_length=None, err_type="", enable_dynamic_field=False, include_meta=True,
                       sparse_format="doc", **kwargs):
@@ -979,23 +1021,11 @@ def gen_parquet_files(float_vector, rows, dim, data_fields, file_size=None, row_
     #  generate 5000 entities and check the file size, then calculate the rows to be generated
     if file_size is not None:
         rows = 5000
-    start_uid = 0
     if file_nums == 1:
-        all_field_data = {}
-        for data_field in data_fields:
-            data = gen_data_by_data_field(data_field=data_field, rows=rows, start=0,
-                                          float_vector=float_vector, dim=dim, array_length=array_length,
-                                          sparse_format=sparse_format, **kwargs)
-            all_field_data[data_field] = data
-        if enable_dynamic_field and include_meta:
-            all_field_data["$meta"] = gen_dynamic_field_data_in_parquet_file(rows=rows, start=0)
-        df = pd.DataFrame(all_field_data)
-        log.info(f"df: \n{df}")
         file_name = f"data-fields-{len(data_fields)}-rows-{rows}-dim-{dim}-file-num-{file_nums}-error-{err_type}-{str(uuid.uuid4())}.parquet"
-        if row_group_size is not None:
-            df.to_parquet(f"{data_source_new}/{file_name}", engine='pyarrow', row_group_size=row_group_size)
-        else:
-            df.to_parquet(f"{data_source_new}/{file_name}", engine='pyarrow')
+        write_parquet_file(f"{data_source_new}/{file_name}", data_fields, rows, float_vector=float_vector, dim=dim,
+                           array_length=array_length, with_meta=enable_dynamic_field and include_meta,
+                           row_group_size=row_group_size, sparse_format=sparse_format, **kwargs)
         # get the file size
         if file_size is not None:
             batch_file_size = os.path.getsize(f"{data_source_new}/{file_name}")
@@ -1003,33 +1033,24 @@ def gen_parquet_files(float_vector, rows, dim, data_fields, file_size=None, row_
             # calculate the rows to be generated
             total_batch = int(file_size*1024*1024*1024/batch_file_size)
             total_rows = total_batch * rows
-            all_df = pd.concat([df for _ in range(total_batch)], axis=0, ignore_index=True)
+            table = pq.read_table(f"{data_source_new}/{file_name}")
             file_name = f"data-fields-{len(data_fields)}-rows-{total_rows}-dim-{dim}-file-num-{file_nums}-error-{err_type}-{str(uuid.uuid4())}.parquet"
-            log.info(f"all df: \n {all_df}")
-            if row_group_size is not None:
-                all_df.to_parquet(f"{data_source_new}/{file_name}", engine='pyarrow', row_group_size=row_group_size)
-            else:
-                all_df.to_parquet(f"{data_source_new}/{file_name}", engine='pyarrow')
+            # write the sample table repeatedly instead of concatenating it in memory
+            with bw.ParquetStreamWriter(f"{data_source_new}/{file_name}", row_group_size=row_group_size) as writer:
+                for _ in range(total_batch):
+                    writer.write(table)
             batch_file_size = os.path.getsize(f"{data_source_new}/{file_name}")
             log.info(f"file_size with rows {total_rows} for {file_name}: {batch_file_size/1024/1024} MB")
         files.append(file_name)
     else:
+        tasks = []
         for i in range(file_nums):
-            all_field_data = {}
-            for data_field in data_fields:
-                data = gen_data_by_data_field(data_field=data_field, rows=rows, start=0,
-                                              float_vector=float_vector, dim=dim, array_length=array_length)
-                all_field_data[data_field] = data
-            if enable_dynamic_field:
-                all_field_data["$meta"] = gen_dynamic_field_data_in_parquet_file(rows=rows, start=0)
-            df = pd.DataFrame(all_field_data)
             file_name = f"data-fields-{len(data_fields)}-rows-{rows}-dim-{dim}-file-num-{i}-error-{err_type}-{str(uuid.uuid4())}.parquet"
-            if row_group_size is not None:
-                df.to_parquet(f"{data_source_new}/{file_name}", engine='pyarrow', row_group_size=row_group_size)
-            else:
-                df.to_parquet(f"{data_source_new}/{file_name}", engine='pyarrow')
+            tasks.append(partial(write_parquet_file, f"{data_source_new}/{file_name}", data_fields, rows,
+                                 float_vector=float_vector, dim=dim, array_length=array_length,
+                                 with_meta=enable_dynamic_field, row_group_size=row_group_size))
             files.append(file_name)
-            start_uid += rows
+        bw.run_parallel(tasks)
     files = [f"{u_id}/{f}" for f in files]
     return files
 
@@ -1103,7 +1124,9 @@ def prepare_bulk_insert_json_files(minio_endpoint="", bucket_name="milvus-bucket
                            data_fields=data_fields_c, file_nums=file_nums, multi_folder=multi_folder,
                            file_type=file_type, err_type=err_type, force=force, **kwargs)
 
-    copy_files_to_minio(host=minio_endpoint, r_source=data_source, files=files, bucket_name=bucket_name, force=force)
+    copy_files_to_minio(host=minio_endpoint, r_source=data_source, files=files, bucket_name=bucket_name, force=force,
+                        workers=kwargs.get("upload_workers", DEFAULT_WORKERS),
+                        part_size=kwargs.get("upload_part_size", DEFAULT_PART_SIZE))
     return files
 
 
@@ -1115,7 +1138,9 @@ def prepare_bulk_insert_new_json_files(minio_endpoint="", bucket_name="milvus-bu
     log.info(f"data_fields: {data_fields}")
     files = gen_new_json_files(float_vector=float_vector, rows=rows, dim=dim,  data_fields=data_fields, file_nums=file_nums, file_size=file_size, err_type=err_type, enable_dynamic_field=enable_dynamic_field, **kwargs)
 
-    copy_files_to_minio(host=minio_endpoint, r_source=data_source, files=files, bucket_name=bucket_name, force=force)
+    copy_files_to_minio(host=minio_endpoint, r_source=data_source, files=files, bucket_name=bucket_name, force=force,
+                        workers=kwargs.get("upload_workers", DEFAULT_WORKERS),
+                        part_size=kwargs.get("upload_part_size", DEFAULT_PART_SIZE))
     return files
 
 
@@ -1154,7 +1179,9 @@ def prepare_bulk_insert_numpy_files(minio_endpoint="", bucket_name="milvus-bucke
                           data_fields=data_fields, enable_dynamic_field=enable_dynamic_field,
                           file_nums=file_nums, force=force, include_meta=include_meta, **kwargs)
 
-    copy_files_to_minio(host=minio_endpoint, r_source=data_source, files=files, bucket_name=bucket_name, force=force)
+    copy_files_to_minio(host=minio_endpoint, r_source=data_source, files=files, bucket_name=bucket_name, force=force,
+                        workers=kwargs.get("upload_workers", DEFAULT_WORKERS),
+                        part_size=kwargs.get("upload_part_size", DEFAULT_PART_SIZE))
     return files
 
 
@@ -1194,39 +1221,38 @@ def prepare_bulk_insert_parquet_files(minio_endpoint="", bucket_name="milvus-buc
     files = gen_parquet_files(rows=rows, dim=dim, float_vector=float_vector, enable_dynamic_field=enable_dynamic_field,
                               data_fields=data_fields, array_length=array_length, file_size=file_size, row_group_size=row_group_size,
                               file_nums=file_nums, include_meta=include_meta, sparse_format=sparse_format, **kwargs)
-    copy_files_to_minio(host=minio_endpoint, r_source=data_source, files=files, bucket_name=bucket_name, force=force)
+    copy_files_to_minio(host=minio_endpoint, r_source=data_source, files=files, bucket_name=bucket_name, force=force,
+                        workers=kwargs.get("upload_workers", DEFAULT_WORKERS),
+                        part_size=kwargs.get("upload_part_size", DEFAULT_PART_SIZE))
     return files
 
 
-def gen_csv_file(file, float_vector, data_fields, rows, dim, start_uid):
-    with open(file, "w") as f:
-        # field name
-        for i in range(len(data_fields)):
-            f.write(data_fields[i])
-            if i != len(data_fields) - 1:
-                f.write(",")
-        f.write("\n")
+def gen_csv_columns(float_vector, data_fields, rows, dim, start_uid):
+    gen = cg.get_generator()
+    columns = {}
+    for data_field in data_fields:
+        if data_field == DataField.pk_field:
+            columns[data_field] = range(start_uid, start_uid + rows)
+        if data_field == DataField.int_field:
+            columns[data_field] = gen.rng.integers(-999999, 9999999, size=rows, endpoint=True).tolist()
+        if data_field == DataField.float_field:
+            columns[data_field] = gen.doubles(rows).tolist()
+        if data_field == DataField.string_field:
+            columns[data_field] = [gen_unique_str() for _ in range(rows)]
+        if data_field == DataField.bool_field:
+            columns[data_field] = np.where(gen.bools(rows), "true", "false").tolist()
+        if data_field == DataField.vec_field:
+            if float_vector:
+                columns[data_field] = gen.float_vectors(rows, dim, normalize=True, dtype=np.float64)
+            else:
+                columns[data_field] = gen.binary_vectors(rows, dim)[1]
+    return columns
 
-        for i in range(rows):
-            # field value
-            for j in range(len(data_fields)):
-                data_field = data_fields[j]
-                if data_field == DataField.pk_field:
-                    f.write(str(i + start_uid))
-                if data_field == DataField.int_field:
-                    f.write(str(random.randint(-999999, 9999999)))
-                if data_field == DataField.float_field:
-                    f.write(str(random.random()))
-                if data_field == DataField.string_field:
-                    f.write(str(gen_unique_str()))
-                if data_field == DataField.bool_field:
-                    f.write(str(random.choice(["true", "false"])))
-                if data_field == DataField.vec_field:
-                    vectors = gen_float_vectors(1, dim) if float_vector else gen_binary_vectors(1, dim//8)
-                    f.write('"' + ','.join(str(x) for x in vectors) + '"')
-                if j != len(data_fields) - 1:
-                    f.write(",")
-            f.write("\n")
+
+def gen_csv_file(file, float_vector, data_fields, rows, dim, start_uid, batch_rows=bw.DEFAULT_BATCH_ROWS):
+    with bw.CsvStreamWriter(file, data_fields) as writer:
+        for start, n in bw.iter_batches(rows, batch_rows):
+            writer.write(gen_csv_columns(float_vector, data_fields, n, dim, start_uid + start))
 
 
 def gen_csv_files(rows, dim, auto_id, float_vector, data_fields, file_nums, force):
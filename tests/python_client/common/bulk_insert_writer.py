@@ -0,0 +1,231 @@
+import os
+import json
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from common import column_generator as cg
+from utils.util_log import test_log as log
+
+"""
+Streaming writers for bulk insert files.
+Data is written batch by batch, so the memory used is bounded by the batch size instead of the file size:
+    parquet: batches are buffered until a row group is full
+    npy: batches are copied into a memory-mapped npy file of the final shape
+    json/csv: rows are dumped compactly batch by batch
+"""
+
+DEFAULT_BATCH_ROWS = 10000
+# the row group size of pyarrow when none is given
+DEFAULT_ROW_GROUP_ROWS = 1024 * 1024
+
+
+def iter_batches(rows, batch_rows=DEFAULT_BATCH_ROWS):
+    """ yield (start, batch size) covering rows """
+    for start in range(0, rows, batch_rows):
+        yield start, min(batch_rows, rows - start)
+
+
+def _mkdir(file):
+    Path(file).parent.mkdir(parents=True, exist_ok=True)
+
+
+class ParquetStreamWriter:
+    """
+    Write pandas/dict batches, the arrow schema is fixed by the first batch,
+    the batches are buffered so that every row group but the last one has row_group_size rows whatever the batch size
+    """
+
+    def __init__(self, file, schema=None, row_group_size=None):
+        self.file = file
+        self.schema = schema
+        self.row_group_size = row_group_size if row_group_size else DEFAULT_ROW_GROUP_ROWS
+        self.rows = 0
+        self._writer = None
+        self._pending = []
+        self._pending_rows = 0
+        _mkdir(file)
+
+    def write(self, batch):
+        if isinstance(batch, pa.Table):
+            table = batch
+        else:
+            df = batch if isinstance(batch, pd.DataFrame) else pd.DataFrame(batch)
+            table = pa.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+        if self._writer is None:
+            self.schema = table.schema
+            self._writer = pq.ParquetWriter(self.file, self.schema)
+        self._pending.append(table)
+        self._pending_rows += table.num_rows
+        self.rows += table.num_rows
+        while self._pending_rows >= self.row_group_size:
+            self._flush(self.row_group_size)
+        return table
+
+    def _flush(self, rows=None):
+        """ Write the first rows of the buffered batches as one row group, all of them if rows is None """
+        table = pa.concat_tables(self._pending)
+        rows = table.num_rows if rows is None else rows
+        self._writer.write_table(table.slice(0, rows), row_group_size=rows)
+        rest = table.slice(rows)
+        self._pending = [rest] if rest.num_rows else []
+        self._pending_rows = rest.num_rows
+
+    def close(self):
+        if self._writer is not None:
+            if self._pending_rows:
+                self._flush()
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class NpyStreamWriter:
+    """ Write batches into a npy file of known shape, only the written batch is held in memory """
+
+    def __init__(self, file, rows, dtype, row_shape=()):
+        self.file = file
+        self.rows = rows
+        _mkdir(file)
+        self._arr = np.lib.format.open_memmap(file, mode="w+", dtype=np.dtype(dtype), shape=(rows,) + tuple(row_shape))
+        self._offset = 0
+
+    def write(self, batch):
+        batch = np.asarray(batch)
+        end = self._offset + len(batch)
+        if end > self.rows:
+            raise Exception(f"write {end} rows to {self.file}, which is created with {self.rows} rows")
+        self._arr[self._offset:end] = batch
+        self._offset = end
+
+    def close(self):
+        if self._arr is not None:
+            self._arr.flush()
+            self._arr = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class JsonRowStreamWriter:
+    """
+    Write rows as a json list, or as {rows_key: [...]} if rows_key is set,
+    rows are dumped without indent
+    """
+
+    def __init__(self, file, rows_key=None, default=None):
+        self.file = file
+        self.rows = 0
+        self.default = default
+        _mkdir(file)
+        self._f = open(file, "w")
+        self._rows_key = rows_key
+        if rows_key is not None:
+            self._f.write('{"%s":' % rows_key)
+        self._f.write("[")
+
+    def encode(self, rows):
+        return ",\n".join(json.dumps(row, default=self.default, separators=(",", ":")) for row in rows)
+
+    def write_encoded(self, body, count):
+        """ Write rows encoded by encode(), so that the same rows can be repeated without dumping them again """
+        if count <= 0:
+            return
+        if self.rows > 0:
+            self._f.write(",\n")
+        self._f.write(body)
+        self.rows += count
+
+    def write(self, rows):
+        self.write_encoded(self.encode(rows), len(rows))
+
+    def close(self):
+        if self._f is not None:
+            self._f.write("]")
+            if self._rows_key is not None:
+                self._f.write("}")
+            self._f.close()
+            self._f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class CsvStreamWriter:
+    """ Write column batches to a csv file with header, list values are written as quoted json arrays """
+
+    def __init__(self, file, columns):
+        self.file = file
+        self.columns = columns
+        self.rows = 0
+        _mkdir(file)
+        self._f = open(file, "w")
+        self._f.write(",".join(columns))
+        self._f.write("\n")
+
+    @staticmethod
+    def _format(value):
+        if isinstance(value, (list, tuple, np.ndarray)):
+            return '"' + json.dumps(np.asarray(value).tolist(), separators=(",", ":")) + '"'
+        return str(value)
+
+    def write(self, batch):
+        columns = [batch[c] for c in self.columns]
+        lines = [",".join(self._format(v) for v in row) for row in zip(*columns)]
+        if lines:
+            self._f.write("\n".join(lines))
+            self._f.write("\n")
+        self.rows += len(lines)
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _run_with_generator(task, generator):
+    with cg.use_generator(generator):
+        return task()
+
+
+def run_parallel(tasks, workers=None, use_process=False):
+    """
+    Run the zero-argument callables concurrently, each task writes one file,
+    return the results in the order of tasks.
+    Threads are used by default: numpy, pyarrow and the file io release the GIL.
+    Every task gets its own child of the column generator, so the data of a task does not depend on
+    the scheduling of the others or on the number of workers, and is the same for the same seed
+    """
+    if not tasks:
+        return []
+    tasks = [partial(_run_with_generator, task, generator)
+             for task, generator in zip(tasks, cg.get_generator().spawn(len(tasks)))]
+    if workers is None:
+        workers = min(len(tasks), os.cpu_count() or 1)
+    if workers <= 1 or len(tasks) == 1:
+        return [task() for task in tasks]
+    executor_cls = ProcessPoolExecutor if use_process else ThreadPoolExecutor
+    log.info(f"write {len(tasks)} files with {workers} workers")
+    with executor_cls(max_workers=workers) as executor:
+        futures = [executor.submit(task) for task in tasks]
+        return [f.result() for f in futures]
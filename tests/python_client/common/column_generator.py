@@ -0,0 +1,119 @@
+import os
+import random
+import threading
+from contextlib import contextmanager
+import numpy as np
+from ml_dtypes import bfloat16
+from utils.util_log import test_log as log
+
+"""
+Columnar data generator based on np.random.Generator,
+every column is generated as one contiguous array instead of element by element.
+The stream is reproducible: set MILVUS_TEST_DATA_SEED or call set_seed() to replay the data of a failed run,
+tasks run concurrently get their own child generators, see spawn() and use_generator().
+"""
+
+SEED_ENV = "MILVUS_TEST_DATA_SEED"
+ASCII_LOWER_START = 97
+ASCII_LOWER_END = 122
+
+INT_RANGES = {
+    "int8": (-128, 127),
+    "int16": (-32768, 32767),
+    "int32": (-2147483648, 2147483647),
+    "int64": (-9223372036854775808, 9223372036854775807),
+}
+
+
+class ColumnGenerator:
+    def __init__(self, seed=None):
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        self.seed = seed
+        self.seed_seq = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self.rng = np.random.default_rng(self.seed_seq)
+
+    def spawn(self, n):
+        """ n independent child generators, the same children for the same seed and the same previous spawns """
+        return [ColumnGenerator(child) for child in self.seed_seq.spawn(n)]
+
+    def float_vectors(self, nb, dim, normalize=False, dtype=np.float32):
+        """ (nb, dim) vectors uniform in [0, 1), l2 normalized by row if normalize """
+        vectors = self.rng.random((nb, dim), dtype=np.float32)
+        if normalize:
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors.astype(dtype, copy=False)
+
+    def fp16_vectors(self, nb, dim):
+        """ return: raw float32 vectors and the float16 vectors used for insert """
+        raw = self.float_vectors(nb, dim)
+        return raw, raw.astype(np.float16)
+
+    def bf16_vectors(self, nb, dim):
+        """ return: raw float32 vectors and the bfloat16 vectors used for insert """
+        raw = self.float_vectors(nb, dim)
+        return raw, raw.astype(bfloat16)
+
+    def binary_vectors(self, nb, dim):
+        """ return: (nb, dim) bits and (nb, dim // 8) packed bytes used for insert """
+        bits = self.rng.integers(0, 2, size=(nb, dim), dtype=np.uint8)
+        return bits, np.packbits(bits, axis=-1)
+
+    def bools(self, nb):
+        return self.rng.integers(0, 2, size=nb, dtype=np.uint8).astype(bool)
+
+    def ints(self, nb, dtype="int64", shape=None):
+        """ Integers over the full range of dtype, shape defaults to (nb,) """
+        low, high = INT_RANGES[dtype]
+        size = nb if shape is None else shape
+        return self.rng.integers(low, high, size=size, dtype=np.dtype(dtype), endpoint=True)
+
+    def floats(self, nb, shape=None):
+        return self.rng.random(nb if shape is None else shape, dtype=np.float32)
+
+    def doubles(self, nb, shape=None):
+        return self.rng.random(nb if shape is None else shape, dtype=np.float64)
+
+    def varchars(self, nb, length):
+        """ nb strings of length lowercase ascii letters, as a numpy unicode array """
+        if length <= 0:
+            return np.full(nb, "", dtype="<U1")
+        codes = self.rng.integers(ASCII_LOWER_START, ASCII_LOWER_END, size=(nb, length), dtype=np.uint8,
+                                  endpoint=True)
+        return codes.view("S%d" % length).ravel().astype("U%d" % length)
+
+
+def _seed_from_env():
+    seed = os.environ.get(SEED_ENV)
+    return int(seed) if seed else None
+
+
+default_generator = ColumnGenerator(_seed_from_env())
+# the generator of the current thread set by use_generator, the default generator if none
+_local = threading.local()
+log.debug(f"column generator seed: {default_generator.seed}")
+
+
+def set_seed(seed):
+    """ Reset the default generator, the following data is the same for the same seed """
+    global default_generator
+    default_generator = ColumnGenerator(seed)
+    log.info(f"column generator seed: {seed}")
+    return default_generator
+
+
+def get_generator():
+    generator = getattr(_local, "generator", None)
+    return generator if generator is not None else default_generator
+
+
+@contextmanager
+def use_generator(generator):
+    """ get_generator() returns generator in the current thread inside the block """
+    previous = getattr(_local, "generator", None)
+    _local.generator = generator
+    try:
+        yield generator
+    finally:
+        _local.generator = previous
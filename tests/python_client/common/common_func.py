@@ -1,25 +1,26 @@
 import os
 import random
-import math
 import string
 import json
 import time
 import uuid
-from functools import singledispatch
+from functools import singledispatch, partial
 import numpy as np
 import pandas as pd
 from ml_dtypes import bfloat16
-from sklearn import preprocessing
-from npy_append_array import NpyAppendArray
 from faker import Faker
 from pathlib import Path
 from minio import Minio
 from base.schema_wrapper import ApiCollectionSchemaWrapper, ApiFieldSchemaWrapper
 from common import common_type as ct
+from common import column_generator as cg
+from common import bulk_insert_writer as bw
+from common.text_match_index import TextMatchIndex
+from common.hybrid_rerank import fuse, weighted_rerank
+from common.dataset_cache import cached_dataset
 from common.common_params import ExprCheckParams
 from utils.util_log import test_log as log
 from customize.milvus_operator import MilvusOperator
-import pickle
 from collections import Counter
 import bm25s
 import jieba
@@ -144,41 +145,28 @@ def patch_faker_text(fake_instance, vocabularies_distribution):
     fake_instance.text = new_text
 
 
-def get_bm25_ground_truth(corpus, queries, top_k=100, language="en"):
+def get_bm25_ground_truth(corpus, queries, top_k=100, language="en", index=None):
     """
     Get the ground truth for BM25 search.
-    :param corpus: The corpus of documents
+    :param corpus: The corpus of documents, used to build the index if index is None
     :param queries: The query string or list of query strings
-    :return: The ground truth for BM25 search
+    :param top_k: int or list of int
+    :param index: a BM25Index kept by the caller and updated incrementally, the ids of the index are returned
+    :return: The ground truth for BM25 search, the documents (or ids of index) and scores of every query
     """
-
-    def remove_punctuation(text):
-        text = text.strip()
-        text = text.replace("\n", " ")
-        return re.sub(r'[^\w\s]', ' ', text)
-
-    # Tokenize the corpus
-    def jieba_split(text):
-        text_without_punctuation = remove_punctuation(text)
-        return jieba.lcut(text_without_punctuation)
-
-    stopwords = "english" if language in ["en", "english"] else [" "]
-    stemmer = None
-    if language in ["zh", "cn", "chinese"]:
-        splitter = jieba_split
-        tokenizer = Tokenizer(
-            stemmer=stemmer, splitter=splitter, stopwords=stopwords
-        )
+    # scipy is only needed for the reference, not by every test importing common_func
+    from common.bm25_index import BM25Index
+    if index is None:
+        index = BM25Index(language=language)
+        index.add(corpus)
+        to_result = lambda rows: [corpus[r] for r in rows]
     else:
-        tokenizer = Tokenizer(
-            stemmer=stemmer, stopwords=stopwords
-        )
-    corpus_tokens = tokenizer.tokenize(corpus, return_as="tuple")
-    retriever = bm25s.BM25()
-    retriever.index(corpus_tokens)
-    query_tokens = tokenizer.tokenize(queries,return_as="tuple")
-    results, scores = retriever.retrieve(query_tokens, corpus=corpus, k=top_k)
-    return results, scores
+        to_result = lambda ids: ids
+    res = index.search(queries, top_k=top_k)
+    if isinstance(top_k, (list, tuple)):
+        return {k: ([to_result(r) for r in ids], scores) for k, (ids, scores) in res.items()}
+    ids, scores = res
+    return [to_result(r) for r in ids], scores
 
 
 def custom_tokenizer(language="en"):
@@ -211,14 +199,14 @@ def custom_tokenizer(language="en"):
     return tokenizer
 
 
-def manual_check_text_match(df, word, col):
-    id_list = []
-    for i in range(len(df)):
-        row = df.iloc[i]
-        # log.info(f"word :{word}, row: {row[col]}")
-        if word in row[col]:
-            id_list.append(row["id"])
-    return id_list
+def manual_check_text_match(df, word, col, index=None):
+    """
+    ids of the rows whose tokens of col contain word
+    :param index: a TextMatchIndex of df, build it once with TextMatchIndex.from_dataframe to check many words
+    """
+    if index is None:
+        index = TextMatchIndex.from_dataframe(df, [col])
+    return index.text_match(col, [word])
 
 
 def get_top_english_tokens(counter, n=10):
@@ -263,6 +251,26 @@ def analyze_documents(texts, language="en"):
     return word_freq
 
 
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def count_words(texts, counter=None, language="en"):
+    """
+    Update counter with the word frequency of texts, the same words as analyze_documents for blank space
+    split languages, but the texts are lowercased and split in one pass without building a vocabulary
+    """
+    if language in ["zh", "cn", "chinese"]:
+        word_freq = analyze_documents(texts, language=language)
+        if counter is None:
+            return word_freq
+        counter.update(word_freq)
+        return counter
+    counter = Counter() if counter is None else counter
+    joined = "\n".join(text for text in texts if isinstance(text, str)).lower()
+    counter.update(WORD_PATTERN.findall(joined))
+    return counter
+
+
 def check_token_overlap(text_a, text_b, language="en"):
     word_freq_a = analyze_documents([text_a], language)
     word_freq_b = analyze_documents([text_b], language)
@@ -284,20 +292,22 @@ def split_dataframes(df, fields, language="en"):
     return df_copy
 
 
-def generate_pandas_text_match_result(expr, df):
-    def manual_check(expr):
-        if "not" in expr:
-            key = expr["not"]["field"]
-            value = expr["not"]["value"]
-            return lambda row: value not in row[key]
-        key = expr["field"]
-        value = expr["value"]
-        return lambda row: value in row[key]
+def generate_pandas_text_match_result(expr, df, index=None):
+    """
+    Rows of df matching a query node of generate_text_match_expr
+    :param index: a TextMatchIndex of df, build it once with TextMatchIndex.from_dataframe to check many nodes
+    """
     if "not" in expr:
         key = expr["not"]["field"]
     else:
         key = expr["field"]
-    manual_result = df[df.apply(manual_check(expr), axis=1)]
+    if index is None:
+        index = TextMatchIndex.from_dataframe(df, [key])
+    # the value is a token of split_dataframes, match it as is
+    term = expr["not"] if "not" in expr else expr
+    node = {"field": term["field"], "value": [term["value"]]}
+    ids = index.evaluate({"not": node} if "not" in expr else node)
+    manual_result = df[df["id"].isin(ids)]
     log.info(f"pandas filter result {len(manual_result)}\n{manual_result[key]}")
     return manual_result
 
@@ -1107,7 +1117,8 @@ def gen_schema_multi_string_fields(string_fields):
 def gen_vectors(nb, dim, vector_data_type="FLOAT_VECTOR"):
     vectors = []
     if vector_data_type == "FLOAT_VECTOR":
-        vectors = [[random.random() for _ in range(dim)] for _ in range(nb)]
+        # normalized by row if dim > 1
+        vectors = cg.get_generator().float_vectors(nb, dim, normalize=dim > 1).tolist()
     elif vector_data_type == "FLOAT16_VECTOR":
         vectors = gen_fp16_vectors(nb, dim)[1]
     elif vector_data_type == "BFLOAT16_VECTOR":
@@ -1119,10 +1130,6 @@ def gen_vectors(nb, dim, vector_data_type="FLOAT_VECTOR"):
     else:
         log.error(f"Invalid vector data type: {vector_data_type}")
         raise Exception(f"Invalid vector data type: {vector_data_type}")
-    if dim > 1:
-        if vector_data_type == "FLOAT_VECTOR":
-            vectors = preprocessing.normalize(vectors, axis=1, norm='l2')
-            vectors = vectors.tolist()
     return vectors
 
 
@@ -1141,16 +1148,13 @@ def gen_string(nb):
 
 
 def gen_binary_vectors(num, dim):
-    raw_vectors = []
-    binary_vectors = []
-    for _ in range(num):
-        raw_vector = [random.randint(0, 1) for _ in range(dim)]
-        raw_vectors.append(raw_vector)
-        # packs a binary-valued array into bits in a unit8 array, and bytes array_of_ints
-        binary_vectors.append(bytes(np.packbits(raw_vector, axis=-1).tolist()))
-    return raw_vectors, binary_vectors
+    # packs a binary-valued array into bits in a unit8 array, and bytes array_of_ints
+    raw_vectors, packed = cg.get_generator().binary_vectors(num, dim)
+    binary_vectors = [row.tobytes() for row in packed]
+    return raw_vectors.tolist(), binary_vectors
 
 
+@cached_dataset
 def gen_default_dataframe_data(nb=ct.default_nb, dim=ct.default_dim, start=0, with_json=True,
                                random_primary_key=False, multiple_dim_array=[], multiple_vector_field_name=[],
                                vector_data_type="FLOAT_VECTOR", auto_id=False,
@@ -1213,6 +1217,7 @@ def gen_default_dataframe_data(nb=ct.default_nb, dim=ct.default_dim, start=0, wi
     return df
 
 
+@cached_dataset
 def gen_default_list_data(nb=ct.default_nb, dim=ct.default_dim, start=0, with_json=True,
                           random_primary_key=False, multiple_dim_array=[], multiple_vector_field_name=[],
                           vector_data_type="FLOAT_VECTOR", auto_id=False,
@@ -1268,6 +1273,7 @@ def gen_default_list_data(nb=ct.default_nb, dim=ct.default_dim, start=0, with_js
     return insert_list
 
 
+@cached_dataset
 def gen_default_rows_data(nb=ct.default_nb, dim=ct.default_dim, start=0, with_json=True, multiple_dim_array=[],
                           multiple_vector_field_name=[], vector_data_type="FLOAT_VECTOR", auto_id=False,
                           primary_field = ct.default_int64_field_name, nullable_fields={}, language=None):
@@ -1435,6 +1441,7 @@ def gen_dataframe_multi_string_fields(string_fields, nb=ct.default_nb):
     return df
 
 
+@cached_dataset
 def gen_dataframe_all_data_type(nb=ct.default_nb, dim=ct.default_dim, start=0, with_json=True,
                                 auto_id=False, random_primary_key=False, multiple_dim_array=[],
                                 multiple_vector_field_name=[], primary_field=ct.default_int64_field_name):
@@ -1482,6 +1489,7 @@ def gen_dataframe_all_data_type(nb=ct.default_nb, dim=ct.default_dim, start=0, w
     return df
 
 
+@cached_dataset
 def gen_general_list_all_data_type(nb=ct.default_nb, dim=ct.default_dim, start=0, with_json=True,
                                    auto_id=False, random_primary_key=False, multiple_dim_array=[],
                                    multiple_vector_field_name=[], primary_field=ct.default_int64_field_name,
@@ -1579,6 +1587,7 @@ def gen_general_list_all_data_type(nb=ct.default_nb, dim=ct.default_dim, start=0
     return insert_list
 
 
+@cached_dataset
 def gen_default_rows_data_all_data_type(nb=ct.default_nb, dim=ct.default_dim, start=0, with_json=True,
                                         multiple_dim_array=[], multiple_vector_field_name=[], partition_id=0,
                                         auto_id=False, primary_field=ct.default_int64_field_name, language=None):
@@ -1611,14 +1620,11 @@ def gen_default_rows_data_all_data_type(nb=ct.default_nb, dim=ct.default_dim, st
             for i in range(len(multiple_dim_array)):
                 dict[multiple_vector_field_name[i]] = gen_vectors(nb, multiple_dim_array[i],
                                                                   ct.append_vector_type[i])[0]
-    if len(multiple_dim_array) != 0:
-        with open(ct.rows_all_data_type_file_path + f'_{partition_id}' + f'_dim{dim}.txt', 'wb') as json_file:
-            pickle.dump(array, json_file)
-            log.info("generated rows data")
 
     return array
 
 
+@cached_dataset
 def gen_default_binary_dataframe_data(nb=ct.default_nb, dim=ct.default_dim, start=0, auto_id=False,
                                       primary_field=ct.default_int64_field_name, nullable_fields={}, language=None):
     int_data = [i for i in range(start, start + nb)]
@@ -1946,7 +1952,7 @@ def gen_varchar_data(length: int, nb: int, text_mode=False):
     if text_mode:
         return [fake.text() for _ in range(nb)]
     else:
-        return ["".join([chr(random.randint(97, 122)) for _ in range(length)]) for _ in range(nb)]
+        return cg.get_generator().varchars(nb, length).tolist()
 
 
 def gen_data_by_collection_field(field, nb=None, start=None):
@@ -1957,36 +1963,37 @@ def gen_data_by_collection_field(field, nb=None, start=None):
             return None
     data_type = field.dtype
     enable_analyzer = field.params.get("enable_analyzer", False)
+    gen = cg.get_generator()
     if data_type == DataType.BOOL:
         if nb is None:
             return random.choice([True, False])
-        return [random.choice([True, False]) for _ in range(nb)]
+        return gen.bools(nb).tolist()
     if data_type == DataType.INT8:
         if nb is None:
             return random.randint(-128, 127)
-        return [random.randint(-128, 127) for _ in range(nb)]
+        return gen.ints(nb, "int8").tolist()
     if data_type == DataType.INT16:
         if nb is None:
             return random.randint(-32768, 32767)
-        return [random.randint(-32768, 32767) for _ in range(nb)]
+        return gen.ints(nb, "int16").tolist()
     if data_type == DataType.INT32:
         if nb is None:
             return random.randint(-2147483648, 2147483647)
-        return [random.randint(-2147483648, 2147483647) for _ in range(nb)]
+        return gen.ints(nb, "int32").tolist()
     if data_type == DataType.INT64:
         if nb is None:
             return random.randint(-9223372036854775808, 9223372036854775807)
         if start is not None:
-            return [i for i in range(start, start+nb)]
-        return [random.randint(-9223372036854775808, 9223372036854775807) for _ in range(nb)]
+            return list(range(start, start+nb))
+        return gen.ints(nb, "int64").tolist()
     if data_type == DataType.FLOAT:
         if nb is None:
             return np.float32(random.random())
-        return [np.float32(random.random()) for _ in range(nb)]
+        return list(gen.floats(nb))
     if data_type == DataType.DOUBLE:
         if nb is None:
             return np.float64(random.random())
-        return [np.float64(random.random()) for _ in range(nb)]
+        return list(gen.doubles(nb))
     if data_type == DataType.VARCHAR:
         max_length = field.params['max_length']
         max_length = min(20, max_length-1)
@@ -2003,12 +2010,12 @@ def gen_data_by_collection_field(field, nb=None, start=None):
         dim = field.params['dim']
         if nb is None:
             return [random.random() for i in range(dim)]
-        return [[random.random() for i in range(dim)] for _ in range(nb)]
+        return gen.float_vectors(nb, dim).tolist()
     if data_type == DataType.BFLOAT16_VECTOR:
         dim = field.params['dim']
         if nb is None:
             return RNG.uniform(size=dim).astype(bfloat16)
-        return [RNG.uniform(size=dim).astype(bfloat16) for _ in range(int(nb))]
+        return list(gen.bf16_vectors(int(nb), dim)[1])
         # if nb is None:
         #     raw_vector = [random.random() for _ in range(dim)]
         #     bf16_vector = np.array(raw_vector, dtype=bfloat16).view(np.uint8).tolist()
@@ -2023,14 +2030,14 @@ def gen_data_by_collection_field(field, nb=None, start=None):
         dim = field.params['dim']
         if nb is None:
             return np.array([random.random() for _ in range(int(dim))], dtype=np.float16)
-        return [np.array([random.random() for _ in range(int(dim))], dtype=np.float16) for _ in range(int(nb))]
+        return list(gen.fp16_vectors(int(nb), int(dim))[1])
     if data_type == DataType.BINARY_VECTOR:
         dim = field.params['dim']
         if nb is None:
             raw_vector = [random.randint(0, 1) for _ in range(dim)]
             binary_byte = bytes(np.packbits(raw_vector, axis=-1).tolist())
             return binary_byte
-        return [bytes(np.packbits([random.randint(0, 1) for _ in range(dim)], axis=-1).tolist()) for _ in range(nb)]
+        return [row.tobytes() for row in gen.binary_vectors(nb, dim)[1]]
     if data_type == DataType.SPARSE_FLOAT_VECTOR:
         if nb is None:
             return gen_sparse_vectors(nb=1)[0]
@@ -2041,33 +2048,33 @@ def gen_data_by_collection_field(field, nb=None, start=None):
         if element_type == DataType.INT8:
             if nb is None:
                 return [random.randint(-128, 127) for _ in range(max_capacity)]
-            return [[random.randint(-128, 127) for _ in range(max_capacity)] for _ in range(nb)]
+            return gen.ints(nb, "int8", shape=(nb, max_capacity)).tolist()
         if element_type == DataType.INT16:
             if nb is None:
                 return [random.randint(-32768, 32767) for _ in range(max_capacity)]
-            return [[random.randint(-32768, 32767) for _ in range(max_capacity)] for _ in range(nb)]
+            return gen.ints(nb, "int16", shape=(nb, max_capacity)).tolist()
         if element_type == DataType.INT32:
             if nb is None:
                 return [random.randint(-2147483648, 2147483647) for _ in range(max_capacity)]
-            return [[random.randint(-2147483648, 2147483647) for _ in range(max_capacity)] for _ in range(nb)]
+            return gen.ints(nb, "int32", shape=(nb, max_capacity)).tolist()
         if element_type == DataType.INT64:
             if nb is None:
                 return [random.randint(-9223372036854775808, 9223372036854775807) for _ in range(max_capacity)]
-            return [[random.randint(-9223372036854775808, 9223372036854775807) for _ in range(max_capacity)] for _ in range(nb)]
+            return gen.ints(nb, "int64", shape=(nb, max_capacity)).tolist()
 
         if element_type == DataType.BOOL:
             if nb is None:
                 return [random.choice([True, False]) for _ in range(max_capacity)]
-            return [[random.choice([True, False]) for _ in range(max_capacity)] for _ in range(nb)]
+            return gen.bools(nb * max_capacity).reshape(nb, max_capacity).tolist()
 
         if element_type == DataType.FLOAT:
             if nb is None:
                 return [np.float32(random.random()) for _ in range(max_capacity)]
-            return [[np.float32(random.random()) for _ in range(max_capacity)] for _ in range(nb)]
+            return [list(row) for row in gen.floats(nb, shape=(nb, max_capacity))]
         if element_type == DataType.DOUBLE:
             if nb is None:
                 return [np.float64(random.random()) for _ in range(max_capacity)]
-            return [[np.float64(random.random()) for _ in range(max_capacity)] for _ in range(nb)]
+            return [list(row) for row in gen.doubles(nb, shape=(nb, max_capacity))]
 
         if element_type == DataType.VARCHAR:
             max_length = field.params['max_length']
@@ -2075,7 +2082,7 @@ def gen_data_by_collection_field(field, nb=None, start=None):
             length = random.randint(0, max_length)
             if nb is None:
                 return ["".join([chr(random.randint(97, 122)) for _ in range(length)]) for _ in range(max_capacity)]
-            return [["".join([chr(random.randint(97, 122)) for _ in range(length)]) for _ in range(max_capacity)] for _ in range(nb)]
+            return gen.varchars(nb * max_capacity, length).reshape(nb, max_capacity).tolist()
     return None
 
 
@@ -2093,7 +2100,7 @@ def gen_data_by_collection_schema(schema, nb, r=0):
 
 
 def gen_varchar_values(nb: int, length: int = 0):
-    return ["".join([chr(random.randint(97, 122)) for _ in range(length)]) for _ in range(nb)]
+    return cg.get_generator().varchars(nb, length).tolist()
 
 
 def gen_values(schema: CollectionSchema, nb, start_id=0, default_values: dict = {}):
@@ -2145,29 +2152,37 @@ def gen_json_files_for_bulk_insert(data, schema, data_dir):
     data_source = os.path.join(data_dir, file_name)
     Path(data_source).parent.mkdir(parents=True, exist_ok=True)
     log.info(f"file name: {data_source}")
-    with open(data_source, "w") as f:
-        f.write("{")
-        f.write("\n")
-        f.write('"rows":[')
-        f.write("\n")
-        for i in range(nb):
-            entity_value = [None for _ in range(len(fields_name))]
-            for j in range(len(data)):
-                if j == vec_field_index:
-                    entity_value[j] = [random.random() for _ in range(dim)]
-                else:
-                    entity_value[j] = data[j][i]
-            entity = dict(zip(fields_name, entity_value))
-            f.write(json.dumps(entity, indent=4, default=to_serializable))
-            if i != nb - 1:
-                f.write(",")
-            f.write("\n")
-        f.write("]")
-        f.write("\n")
-        f.write("}")
+    gen = cg.get_generator()
+    with bw.JsonRowStreamWriter(data_source, rows_key="rows", default=to_serializable) as writer:
+        for start, n in bw.iter_batches(nb):
+            vectors = gen.doubles(n, shape=(n, dim)).tolist()
+            rows = []
+            for i in range(start, start + n):
+                entity_value = [None for _ in range(len(fields_name))]
+                for j in range(len(data)):
+                    if j == vec_field_index:
+                        entity_value[j] = vectors[i - start]
+                    else:
+                        entity_value[j] = data[j][i]
+                rows.append(dict(zip(fields_name, entity_value)))
+            writer.write(rows)
     return files
 
 
+def _save_npy_field(data_source, values):
+    if isinstance(values[0], dict):
+        values = [json.dumps(d) for d in values]
+    np.save(data_source, np.array(values))
+
+
+def _save_npy_vectors(data_source, nb, dim):
+    gen = cg.get_generator()
+    log.info(f"generate {nb} vectors with dim {dim} for {data_source}")
+    with bw.NpyStreamWriter(data_source, nb, np.float64, (dim,)) as writer:
+        for _, n in bw.iter_batches(nb):
+            writer.write(gen.doubles(n, shape=(n, dim)))
+
+
 def gen_npy_files_for_bulk_insert(data, schema, data_dir):
     for d in data:
         if len(d) > 0:
@@ -2179,26 +2194,18 @@ def gen_npy_files_for_bulk_insert(data, schema, data_dir):
     uuid_str = uuid.uuid4()
     for field in fields_name:
         files.append(f"{uuid_str}/{field}.npy")
+    tasks = []
     for i, file in enumerate(files):
         data_source = os.path.join(data_dir, file)
         #  mkdir for npy file
         Path(data_source).parent.mkdir(parents=True, exist_ok=True)
         log.info(f"save file {data_source}")
         if vec_field_name in file:
-            log.info(f"generate {nb} vectors with dim {dim} for {data_source}")
-            with NpyAppendArray(data_source, "wb") as npaa:
-                for j in range(nb):
-                    vector = np.array([[random.random() for _ in range(dim)]])
-                    npaa.append(vector)
-
-        elif isinstance(data[i][0], dict):
-            tmp = []
-            for d in data[i]:
-                tmp.append(json.dumps(d))
-            data[i] = tmp
-            np.save(data_source, np.array(data[i]))
+            tasks.append(partial(_save_npy_vectors, data_source, nb, dim))
         else:
-            np.save(data_source, np.array(data[i]))
+            tasks.append(partial(_save_npy_field, data_source, data[i]))
+    # the files of the fields are written in parallel
+    bw.run_parallel(tasks)
     return files
 
 
@@ -2759,28 +2766,94 @@ def superstructure(x, y):
     return 1 - np.double(np.bitwise_and(x, y).sum()) / np.count_nonzero(x)
 
 
-def compare_distance_2d_vector(x, y, distance, metric, sqrt):
-    for i in range(len(x)):
-        for j in range(len(y)):
-            if metric == "L2":
-                distance_i = l2(x[i], y[j])
-                if not sqrt:
-                    distance_i = math.pow(distance_i, 2)
-            elif metric == "IP":
-                distance_i = ip(x[i], y[j])
-            elif metric == "HAMMING":
-                distance_i = hamming(x[i], y[j])
-            elif metric == "TANIMOTO":
-                distance_i = tanimoto_calc(x[i], y[j])
-            elif metric == "JACCARD":
-                distance_i = jaccard(x[i], y[j])
-            else:
-                raise Exception("metric type is invalid")
-            assert abs(distance_i - distance[i][j]) < ct.epsilon
+BINARY_METRICS = ["HAMMING", "JACCARD", "TANIMOTO", "SUBSTRUCTURE", "SUPERSTRUCTURE"]
+
+
+def to_vector_matrix(vectors, metric):
+    """
+    Stack vectors into one matrix: float64 for float metrics,
+    bool bits for binary metrics, packed bytes are unpacked
+    """
+    if metric in BINARY_METRICS:
+        if len(vectors) > 0 and isinstance(vectors[0], (bytes, bytearray)):
+            packed = np.frombuffer(b"".join(vectors), dtype=np.uint8).reshape(len(vectors), -1)
+            return np.unpackbits(packed, axis=1).astype(np.bool_)
+        return np.asarray(vectors, dtype=np.bool_)
+    return np.asarray(vectors, dtype=np.float64)
+
 
+def _distance_from_products(xx, yy, xy, dim, metric, sqrt=False):
+    """
+    Distance from the dot products, works for a matrix of pairs or for pairs row by row:
+    xx/yy are the squared norms (float) or the bit counts (binary), xy is the dot product or the common bit count
+    """
+    if metric == "L2":
+        distance = np.maximum(xx - 2 * xy + yy, 0)
+        return np.sqrt(distance) if sqrt else distance
+    if metric == "IP":
+        return xy
+    if metric == "COSINE":
+        return xy / np.sqrt(xx * yy)
+    xor = xx + yy - 2 * xy
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if metric == "HAMMING":
+            return xor
+        if metric == "JACCARD":
+            return 1 - xy / (xx + yy - xy)
+        if metric == "TANIMOTO":
+            return (dim - xor) / (dim + xor)
+        if metric == "SUBSTRUCTURE":
+            return 1 - xy / yy
+        if metric == "SUPERSTRUCTURE":
+            return 1 - xy / xx
+    raise Exception("metric type is invalid")
+
+
+def pairwise_distances(x, y, metric, sqrt=False):
+    """ (len(x), len(y)) distances of every pair of x[i] and y[j], L2 is squared unless sqrt """
+    x = to_vector_matrix(x, metric)
+    y = to_vector_matrix(y, metric)
+    if metric in BINARY_METRICS:
+        x = x.astype(np.float64)
+        y = y.astype(np.float64)
+        xx, yy = x.sum(axis=1), y.sum(axis=1)
+    else:
+        xx, yy = np.einsum("ij,ij->i", x, x), np.einsum("ij,ij->i", y, y)
+    return _distance_from_products(xx[:, None], yy[None, :], x @ y.T, x.shape[1], metric, sqrt)
+
+
+def rowwise_distances(x, y, metric, sqrt=False):
+    """ distances of x[i] and y[i] for every row i, L2 is squared unless sqrt """
+    x = to_vector_matrix(x, metric)
+    y = to_vector_matrix(y, metric)
+    if metric in BINARY_METRICS:
+        xy = np.logical_and(x, y).sum(axis=1).astype(np.float64)
+        return _distance_from_products(x.sum(axis=1).astype(np.float64), y.sum(axis=1).astype(np.float64), xy,
+                                       x.shape[1], metric, sqrt)
+    return _distance_from_products(np.einsum("ij,ij->i", x, x), np.einsum("ij,ij->i", y, y),
+                                   np.einsum("ij,ij->i", x, y), x.shape[1], metric, sqrt)
+
+
+def assert_distances_close(expected, actual, epsilon=ct.epsilon, name="distance"):
+    """ Assert all the distances match within epsilon, log the count and the worst of the mismatches """
+    expected = np.asarray(expected, dtype=np.float64)
+    actual = np.asarray(actual, dtype=np.float64).reshape(expected.shape)
+    # inf is expected for the empty sets of the binary metrics
+    diff = np.where(np.isinf(expected) & (expected == actual), 0, np.abs(expected - actual))
+    bad = ~(diff <= epsilon)
+    if bad.any():
+        worst = np.unravel_index(np.argmax(np.where(bad, np.nan_to_num(diff, nan=np.inf), -np.inf)), diff.shape)
+        log.error(f"{np.count_nonzero(bad)} of {bad.size} {name}s mismatch with epsilon {epsilon}, "
+                  f"the worst at {tuple(int(i) for i in worst)}: expected {expected[worst]}, actual {actual[worst]}")
+        assert not bad.any()
     return True
 
 
+def compare_distance_2d_vector(x, y, distance, metric, sqrt):
+    expected = pairwise_distances(x, y, metric, sqrt)
+    return assert_distances_close(expected, [list(row) for row in distance])
+
+
 def compare_distance_vector_and_vector_list(x, y, metric, distance):
     """
     target: compare the distance between x and y[i] with the expected distance array
@@ -2790,20 +2863,32 @@ def compare_distance_vector_and_vector_list(x, y, metric, distance):
     if not isinstance(y, list):
         log.error("%s is not a list." % str(y))
         assert False
-    for i in range(len(y)):
-        if metric == "L2":
-            distance_i = l2(x, y[i])
-        elif metric == "IP":
-            distance_i = ip(x, y[i])
-        elif metric == "COSINE":
-            distance_i = cosine(x, y[i])
-        else:
-            raise Exception("metric type is invalid")
-        if abs(distance_i - distance[i]) > ct.epsilon:
-            log.error("The distance between %f and %f is not equal with %f" % (x, y[i], distance[i]))
-            assert abs(distance_i - distance[i]) < ct.epsilon
+    if metric not in ["L2", "IP", "COSINE"]:
+        raise Exception("metric type is invalid")
+    # l2 here is not squared, as the former l2()
+    expected = pairwise_distances([x], y, metric, sqrt=True)[0]
+    return assert_distances_close(expected, list(distance))
 
-    return True
+
+def compare_search_distances(queries, vectors, hit_ids, hit_distances, metric, epsilon=ct.epsilon):
+    """
+    Verify the distances of all the hits of a search in one batch
+    queries: the nq searched vectors
+    vectors: inserted vectors indexed by id, a list or a matrix
+    hit_ids/hit_distances: ids and distances of the hits of every query
+    """
+    lengths = [len(ids) for ids in hit_ids]
+    if sum(lengths) == 0:
+        return True
+    flat_ids = np.concatenate([np.asarray(ids, dtype=np.int64) for ids in hit_ids])
+    query_matrix = to_vector_matrix(queries, metric)
+    if isinstance(vectors, np.ndarray):
+        hit_vectors = to_vector_matrix(vectors[flat_ids], metric)
+    else:
+        hit_vectors = to_vector_matrix([vectors[i] for i in flat_ids], metric)
+    expected = rowwise_distances(np.repeat(query_matrix, lengths, axis=0), hit_vectors, metric)
+    actual = np.concatenate([np.asarray(d, dtype=np.float64) for d in hit_distances])
+    return assert_distances_close(expected, actual, epsilon, name=f"{metric} distance")
 
 
 def modify_file(file_path_list, is_modify=False, input_content=""):
@@ -2970,17 +3055,14 @@ def insert_data(collection_w, nb=ct.default_nb, is_binary=False, is_all_data_typ
                                                                       auto_id=auto_id, primary_field=primary_field,
                                                                       nullable_fields=nullable_fields, language=language)
                 else:
-                    if os.path.exists(ct.rows_all_data_type_file_path + f'_{i}' + f'_dim{dim}.txt'):
-                        with open(ct.rows_all_data_type_file_path + f'_{i}' + f'_dim{dim}.txt', 'rb') as f:
-                            default_data = pickle.load(f)
-                    else:
-                        default_data = gen_default_rows_data_all_data_type(nb // num, dim=dim, start=start,
-                                                                           with_json=with_json,
-                                                                           multiple_dim_array=multiple_dim_array,
-                                                                           multiple_vector_field_name=vector_name_list,
-                                                                           partition_id=i, auto_id=auto_id,
-                                                                           primary_field=primary_field,
-                                                                           language=language)
+                    # the rows are reused from MILVUS_TEST_DATA_CACHE for the same arguments if it is set
+                    default_data = gen_default_rows_data_all_data_type(nb // num, dim=dim, start=start,
+                                                                       with_json=with_json,
+                                                                       multiple_dim_array=multiple_dim_array,
+                                                                       multiple_vector_field_name=vector_name_list,
+                                                                       partition_id=i, auto_id=auto_id,
+                                                                       primary_field=primary_field,
+                                                                       language=language)
         else:
             default_data, binary_raw_data = gen_default_binary_dataframe_data(nb // num, dim=dim, start=start,
                                                                               auto_id=auto_id,
@@ -3153,82 +3235,30 @@ def extract_vector_field_name_list(collection_w):
     return vector_name_list
 
 
-def get_activate_func_from_metric_type(metric_type):
-    activate_function = lambda x: x
-    if metric_type == "COSINE":
-        activate_function = lambda x: (1 + x) * 0.5
-    elif metric_type == "IP":
-        activate_function = lambda x: 0.5 + math.atan(x)/ math.pi
-    elif metric_type == "BM25":
-        activate_function = lambda x: 2 * math.atan(x) / math.pi
-    else:
-        activate_function  = lambda x: 1.0 - 2*math.atan(x) / math.pi
-    return activate_function
-
-
 def get_hybrid_search_base_results_rrf(search_res_dict_array, round_decimal=-1):
     """
     merge the element in the dicts array
-    search_res_dict_array : the dict array in which the elements to be merged
+    search_res_dict_array : the dict array in which the elements to be merged, {id: rrf score} of each request
     return: the sorted id and score answer
     """
     # calculate hybrid search base line
-
-    search_res_dict_merge = {}
-    ids_answer = []
-    score_answer = []
-
-    for i, result in enumerate(search_res_dict_array, 0):
-        for key, distance in result.items():
-            search_res_dict_merge[key] = search_res_dict_merge.get(key, 0) + distance
-
-    if round_decimal != -1 :
-        for k, v in search_res_dict_merge.items():
-            multiplier = math.pow(10.0, round_decimal)
-            v = math.floor(v*multiplier+0.5) / multiplier
-            search_res_dict_merge[k] = v
-
-    sorted_list = sorted(search_res_dict_merge.items(), key=lambda x: x[1], reverse=True)
-
-    for sort in sorted_list:
-        ids_answer.append(int(sort[0]))
-        score_answer.append(float(sort[1]))
-
-    return ids_answer, score_answer
+    res_ids, res_scores = fuse([[list(result.keys())] for result in search_res_dict_array],
+                               [[list(result.values())] for result in search_res_dict_array],
+                               round_decimal=round_decimal)
+    return res_ids[0], res_scores[0]
 
 
 def get_hybrid_search_base_results(search_res_dict_array, weights, metric_types, round_decimal=-1):
     """
     merge the element in the dicts array
-    search_res_dict_array : the dict array in which the elements to be merged
+    search_res_dict_array : the dict array in which the elements to be merged, {id: distance} of each request
     return: the sorted id and score answer
     """
-    # calculate hybrid search base line
-
-    search_res_dict_merge = {}
-    ids_answer = []
-    score_answer = []
-
-    for i, result in enumerate(search_res_dict_array, 0):
-        activate_function = get_activate_func_from_metric_type(metric_types[i])
-        for key, distance in result.items():
-            activate_distance = activate_function(distance)
-            weight = weights[i]
-            search_res_dict_merge[key] = search_res_dict_merge.get(key, 0) + activate_function(distance) * weights[i]
-
-    if round_decimal != -1 :
-        for k, v in search_res_dict_merge.items():
-            multiplier = math.pow(10.0, round_decimal)
-            v = math.floor(v*multiplier+0.5) / multiplier
-            search_res_dict_merge[k] = v
-
-    sorted_list = sorted(search_res_dict_merge.items(), key=lambda x: x[1], reverse=True)
-
-    for sort in sorted_list:
-        ids_answer.append(int(sort[0]))
-        score_answer.append(float(sort[1]))
-
-    return ids_answer, score_answer
+    # calculate hybrid search base line, use weighted_rerank directly to get the base line of all nq at once
+    res_ids, res_scores = weighted_rerank([[list(result.keys())] for result in search_res_dict_array],
+                                          [[list(result.values())] for result in search_res_dict_array],
+                                          weights, metric_types, round_decimal=round_decimal)
+    return res_ids[0], res_scores[0]
 
 
 def gen_bf16_vectors(num, dim):
@@ -3238,15 +3268,8 @@ def gen_bf16_vectors(num, dim):
     bf16_vectors: the bytes used for insert
     return: raw_vectors and bf16_vectors
     """
-    raw_vectors = []
-    bf16_vectors = []
-    for _ in range(num):
-        raw_vector = [random.random() for _ in range(dim)]
-        raw_vectors.append(raw_vector)
-        bf16_vector = np.array(raw_vector, dtype=bfloat16)
-        bf16_vectors.append(bf16_vector)
-
-    return raw_vectors, bf16_vectors
+    raw_vectors, bf16_vectors = cg.get_generator().bf16_vectors(num, dim)
+    return raw_vectors.tolist(), list(bf16_vectors)
 
 
 def gen_fp16_vectors(num, dim):
@@ -3256,15 +3279,8 @@ def gen_fp16_vectors(num, dim):
     fp16_vectors: the bytes used for insert
     return: raw_vectors and fp16_vectors
     """
-    raw_vectors = []
-    fp16_vectors = []
-    for _ in range(num):
-        raw_vector = [random.random() for _ in range(dim)]
-        raw_vectors.append(raw_vector)
-        fp16_vector = np.array(raw_vector, dtype=np.float16)
-        fp16_vectors.append(fp16_vector)
-
-    return raw_vectors, fp16_vectors
+    raw_vectors, fp16_vectors = cg.get_generator().fp16_vectors(num, dim)
+    return raw_vectors.tolist(), list(fp16_vectors)
 
 
 def gen_sparse_vectors(nb, dim=1000, sparse_format="dok", empty_percentage=0):
@@ -3295,7 +3311,7 @@ def gen_vectors_based_on_vector_type(num, dim, vector_data_type=ct.float_type):
     return: raw_vectors and fp16_vectors
     """
     if vector_data_type == ct.float_type:
-        vectors = [[random.random() for _ in range(dim)] for _ in range(num)]
+        vectors = cg.get_generator().float_vectors(num, dim).tolist()
     elif vector_data_type == ct.float16_type:
         vectors = gen_fp16_vectors(num, dim)[1]
     elif vector_data_type == ct.bfloat16_type:
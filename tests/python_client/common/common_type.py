@@ -109,8 +109,6 @@ err_msg = "err_msg"
 in_cluster_env = "IN_CLUSTER"
 default_count_output = "count(*)"
 
-rows_all_data_type_file_path = "/tmp/rows_all_data_type"
-
 """" List of parameters used to pass """
 invalid_resource_names = [
     None,               # None
@@ -0,0 +1,272 @@
+import os
+import json
+import time
+import shutil
+import pickle
+import fcntl
+import hashlib
+import inspect
+import importlib
+import functools
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from utils.util_log import test_log as log
+
+"""
+Content addressed cache of generated test datasets, shared by the tests and the pytest-xdist workers of a host.
+A dataset is keyed by the hash of the generator (name and source, and the source of the helper modules it calls)
+and all its arguments (nb, dim, start, nullable fields, language, ...) and the MILVUS_TEST_DATA_SEED,
+the first caller generates it and the others load it:
+    numeric columns and vectors    .npy files, memory mapped copy-on-write
+    strings    arrow ipc files, memory mapped
+    json documents    arrow ipc files of the serialized documents
+    anything else    pickle
+The cache is enabled by MILVUS_TEST_DATA_CACHE=<directory>, without it the generators run as before.
+Cached datasets are not random between the calls with the same arguments any more.
+"""
+
+CACHE_DIR_ENV = "MILVUS_TEST_DATA_CACHE"
+SEED_ENV = "MILVUS_TEST_DATA_SEED"
+# bump to invalidate the datasets written by an older layout
+CACHE_VERSION = 1
+MANIFEST = "manifest.json"
+# the generators build the data with the helpers of these modules, gen_vectors, column_generator, ...
+HELPER_MODULES = ["common.common_func", "common.column_generator"]
+
+
+def cache_dir():
+    return os.environ.get(CACHE_DIR_ENV) or None
+
+
+def source_hash(func):
+    """ A change of the generator or of the helper modules invalidates its datasets, OSError if no source """
+    sha = hashlib.sha256(inspect.getsource(func).encode("utf-8"))
+    for name in HELPER_MODULES:
+        with open(importlib.import_module(name).__file__, "rb") as f:
+            sha.update(f.read())
+    return sha.hexdigest()
+
+
+def dataset_key(func, args, kwargs, source=None):
+    """ The hash of the generator and its bound arguments """
+    bound = inspect.signature(func).bind(*args, **kwargs)
+    bound.apply_defaults()
+    content = json.dumps({
+        "version": CACHE_VERSION,
+        "generator": f"{func.__module__}.{func.__qualname__}",
+        "source": source if source is not None else source_hash(func),
+        "seed": os.environ.get(SEED_ENV),
+        "arguments": bound.arguments,
+    }, sort_keys=True, default=repr)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+
+
+class DatasetWriter:
+    def __init__(self, path):
+        self.path = path
+        self.files = 0
+
+    def _file(self, suffix):
+        self.files += 1
+        return f"{self.files:04d}{suffix}"
+
+    def save_array(self, array):
+        name = self._file(".npy")
+        dtype = array.dtype
+        if dtype.kind not in "biuf":
+            # extension dtypes like bfloat16 are saved as their bits
+            array = array.view(f"u{dtype.itemsize}")
+        np.save(os.path.join(self.path, name), np.ascontiguousarray(array))
+        return {"file": name, "dtype": dtype.name}
+
+    def save_strings(self, values):
+        name = self._file(".arrow")
+        table = pa.table({"values": pa.array(values, type=pa.large_string())})
+        with pa.OSFile(os.path.join(self.path, name), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        return {"file": name}
+
+    def save_pickle(self, value):
+        name = self._file(".pkl")
+        with open(os.path.join(self.path, name), "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return {"file": name}
+
+    def column(self, values):
+        """ The node of a column given as a list or an ndarray """
+        if isinstance(values, np.ndarray):
+            return {"codec": "ndarray", **self.save_array(values)}
+        values = list(values)
+        if len(values) == 0:
+            return {"codec": "pickle", **self.save_pickle(values)}
+        first = values[0]
+        if all(isinstance(v, str) or v is None for v in values):
+            return {"codec": "string", **self.save_strings(values)}
+        if isinstance(first, bytes) and all(isinstance(v, bytes) and len(v) == len(first) for v in values):
+            return {"codec": "bytes", **self.save_array(np.frombuffer(b"".join(values), dtype=np.uint8)
+                                                        .reshape(len(values), len(first)))}
+        if not isinstance(first, (dict, str, bytes)) and first is not None:
+            try:
+                array = np.asarray(values)
+            except ValueError:
+                array = None
+            if array is not None and array.dtype != object and array.ndim in (1, 2):
+                # numpy scalars and rows are restored as numpy, python values as python, both only if exact
+                if isinstance(first, (np.ndarray, np.generic)):
+                    if all(getattr(v, "dtype", None) == first.dtype for v in values):
+                        return {"codec": "array", "rows": "ndarray", **self.save_array(array)}
+                elif array.tolist() == values and all(type(v) is type(first) for v in values):
+                    if array.dtype == np.float64 and np.array_equal(array.astype(np.float32), array):
+                        # vectors generated as float32 keep their values in half the space
+                        array = array.astype(np.float32)
+                    return {"codec": "array", "rows": "list", **self.save_array(array)}
+        if all(isinstance(v, dict) for v in values):
+            try:
+                docs = [json.dumps(v) for v in values]
+                if all(json.loads(d) == v for d, v in zip(docs, values)):
+                    return {"codec": "json", **self.save_strings(docs)}
+            except (TypeError, ValueError):
+                pass
+        return {"codec": "pickle", **self.save_pickle(values)}
+
+    def series(self, series):
+        if series.dtype.kind in "biuf":
+            return {"kind": "series", "dtype": str(series.dtype), "values": self.column(series.to_numpy())}
+        return {"kind": "series", "dtype": str(series.dtype), "values": self.column(series.tolist())}
+
+    def value(self, obj):
+        """ The node of a value returned by a generator """
+        if isinstance(obj, pd.DataFrame):
+            return {"kind": "frame", "columns": [[str(name), self.series(obj[name])] for name in obj.columns]}
+        if isinstance(obj, pd.Series):
+            return self.series(obj)
+        if isinstance(obj, tuple):
+            return {"kind": "tuple", "items": [self.value(item) for item in obj]}
+        if isinstance(obj, list) and obj and all(isinstance(row, dict) for row in obj):
+            keys = list(obj[0].keys())
+            if all(list(row.keys()) == keys for row in obj):
+                # rows of the same fields are saved by column
+                return {"kind": "rows", "keys": keys, "columns": [self.column([row[k] for row in obj]) for k in keys]}
+        if isinstance(obj, list) and any(isinstance(item, pd.Series) for item in obj):
+            # a list of columns like gen_general_list_all_data_type, a list without any series is a column
+            return {"kind": "list", "items": [self.value(item) if isinstance(item, pd.Series)
+                                              else {"kind": "column", "values": self.column(item)} for item in obj]}
+        return {"kind": "column", "values": self.column(obj) if isinstance(obj, list) else self.save_pickle(obj)}
+
+
+class DatasetReader:
+    def __init__(self, path):
+        self.path = path
+
+    def load_array(self, node):
+        # copy-on-write, the tests may modify the data they get
+        array = np.load(os.path.join(self.path, node["file"]), mmap_mode="c")
+        if array.dtype.name != node["dtype"]:
+            array = array.view(np.dtype(node["dtype"]))
+        return array
+
+    def load_strings(self, node):
+        with pa.memory_map(os.path.join(self.path, node["file"]), "r") as source:
+            return pa.ipc.open_file(source).read_all().column("values").to_pylist()
+
+    def load_pickle(self, node):
+        with open(os.path.join(self.path, node["file"]), "rb") as f:
+            return pickle.load(f)
+
+    def column(self, node):
+        codec = node.get("codec", "pickle")
+        if codec == "ndarray":
+            return self.load_array(node)
+        if codec == "string":
+            return self.load_strings(node)
+        if codec == "json":
+            return [json.loads(doc) for doc in self.load_strings(node)]
+        if codec == "bytes":
+            return [row.tobytes() for row in self.load_array(node)]
+        if codec == "array":
+            array = self.load_array(node)
+            return list(array) if node["rows"] == "ndarray" else array.tolist()
+        return self.load_pickle(node)
+
+    def series(self, node):
+        values = self.column(node["values"])
+        return pd.Series(data=values, dtype=node["dtype"])
+
+    def value(self, node):
+        kind = node["kind"]
+        if kind == "frame":
+            return pd.DataFrame({name: self.series(column) for name, column in node["columns"]})
+        if kind == "series":
+            return self.series(node)
+        if kind == "tuple":
+            return tuple(self.value(item) for item in node["items"])
+        if kind == "rows":
+            columns = [self.column(c) for c in node["columns"]]
+            return [dict(zip(node["keys"], values)) for values in zip(*columns)]
+        if kind == "list":
+            return [self.value(item) for item in node["items"]]
+        return self.column(node["values"])
+
+
+def save_dataset(path, obj):
+    """ Write the dataset into a temporary directory and publish it by an atomic rename """
+    tmp = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    node = DatasetWriter(tmp).value(obj)
+    with open(os.path.join(tmp, MANIFEST), "w") as f:
+        json.dump(node, f)
+    os.rename(tmp, path)
+
+
+def load_dataset(path):
+    with open(os.path.join(path, MANIFEST)) as f:
+        node = json.load(f)
+    return DatasetReader(path).value(node)
+
+
+def get_or_create(root, name, key, generate):
+    """ Load the dataset of key, or generate and save it, one process generates it at a time """
+    path = os.path.join(root, f"{name}-{key}")
+    if os.path.exists(os.path.join(path, MANIFEST)):
+        return load_dataset(path)
+    os.makedirs(root, exist_ok=True)
+    with open(f"{path}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if os.path.exists(os.path.join(path, MANIFEST)):
+                return load_dataset(path)
+            t0 = time.perf_counter()
+            obj = generate()
+            save_dataset(path, obj)
+            log.debug(f"dataset {name}-{key} cached in {time.perf_counter() - t0:.3f}s")
+            # the caller gets the loaded copy, the same as the other callers
+            return load_dataset(path)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def cached_dataset(func):
+    """
+    Cache the datasets of a generator in MILVUS_TEST_DATA_CACHE if it is set,
+    the source is hashed at the first cached call, the generator runs uncached if its source is not available
+    """
+    source = None
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        nonlocal source
+        root = cache_dir()
+        if root is None:
+            return func(*args, **kwargs)
+        if source is None:
+            try:
+                source = source_hash(func)
+            except OSError as e:
+                log.warning(f"dataset of {func.__name__} not cached, no source: {e}")
+                return func(*args, **kwargs)
+        key = dataset_key(func, args, kwargs, source=source)
+        return get_or_create(root, func.__name__, key, lambda: func(*args, **kwargs))
+    return wrapper
@@ -0,0 +1,128 @@
+import numpy as np
+
+"""
+Reference reranking of hybrid search for all queries at once.
+The results of every sub-request are given as (nq x k) id and score matrices (a list of nq lists each,
+rows may be shorter than k), the fused score of an id is the sum of its contributions in the sub-requests:
+    WeightedRanker    weight * activate(score) of the metric type of the sub-request
+    RRFRanker    1 / (k + rank + 1) of the rank of the id in the sub-request
+the ids of a query are merged by one bincount over (query, id) keys, the top (offset + limit) are selected by
+argpartition and sorted by score descending, the ties by id ascending.
+"""
+
+DEFAULT_RRF_K = 60
+
+
+def activate(scores, metric_type):
+    """ The normalization of the scores of a metric type into [0, 1], larger is more similar """
+    scores = np.asarray(scores, dtype=np.float64)
+    if metric_type == "COSINE":
+        return (1 + scores) * 0.5
+    if metric_type == "IP":
+        return 0.5 + np.arctan(scores) / np.pi
+    if metric_type == "BM25":
+        return 2 * np.arctan(scores) / np.pi
+    return 1.0 - 2 * np.arctan(scores) / np.pi
+
+
+def round_scores(scores, round_decimal=-1):
+    """ Round half up to round_decimal digits like the server, -1 keeps the scores """
+    if round_decimal == -1:
+        return scores
+    multiplier = 10.0 ** round_decimal
+    return np.floor(scores * multiplier + 0.5) / multiplier
+
+
+def to_matrix(rows, fill, dtype=None):
+    """ Pad the nq rows of a sub-request into a (nq x k) matrix, return the matrix and the mask of the results """
+    if isinstance(rows, np.ndarray) and rows.ndim == 2:
+        return rows, np.ones(rows.shape, dtype=bool)
+    rows = [list(r) for r in rows]
+    k = max((len(r) for r in rows), default=0)
+    matrix = np.array([r + [fill] * (k - len(r)) for r in rows], dtype=dtype)
+    mask = np.array([[True] * len(r) + [False] * (k - len(r)) for r in rows], dtype=bool)
+    return matrix.reshape(len(rows), k), mask.reshape(len(rows), k)
+
+
+def fuse(ids, contributions, limit=None, offset=0, round_decimal=-1):
+    """
+    Sum the contributions of the same id of a query and keep the top results
+    :param ids: the id rows of every sub-request, nq rows each
+    :param contributions: the contribution rows or matrices of every sub-request in the same shape as ids
+    :return: (ids, scores), nq lists each
+    """
+    id_matrices, masks, values = [], [], []
+    for req_ids, req_values in zip(ids, contributions):
+        id_matrix, mask = to_matrix(req_ids, fill=None, dtype=object)
+        value_matrix, _ = to_matrix(req_values, fill=0.0, dtype=np.float64)
+        id_matrices.append(id_matrix)
+        masks.append(mask)
+        values.append(value_matrix)
+    nq = len(id_matrices[0]) if id_matrices else 0
+    if nq == 0:
+        return [], []
+    all_ids = np.concatenate(id_matrices, axis=1)
+    mask = np.concatenate(masks, axis=1)
+    values = np.concatenate(values, axis=1)[mask]
+    queries = np.nonzero(mask)[0]
+    # ids of any type are replaced by their codes, the codes keep the order of the ids
+    unique_ids, codes = np.unique(np.array(all_ids[mask].tolist()), return_inverse=True)
+    keys, inverse = np.unique(queries * len(unique_ids) + codes.reshape(-1), return_inverse=True)
+    scores = round_scores(np.bincount(inverse.reshape(-1), weights=values), round_decimal)
+    queries, codes = np.divmod(keys, max(len(unique_ids), 1))
+
+    # the merged results of a query are a row of a (nq x max results) matrix padded by -inf
+    counts = np.bincount(queries, minlength=nq)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    width = int(counts.max()) if len(counts) else 0
+    columns = np.arange(len(keys)) - starts[queries]
+    score_matrix = np.full((nq, width), -np.inf)
+    code_matrix = np.full((nq, width), len(unique_ids), dtype=np.int64)
+    score_matrix[queries, columns] = scores
+    code_matrix[queries, columns] = codes
+
+    top = width if limit is None else min(width, offset + limit)
+    if 0 < top < width:
+        # the top-th score of every query, the ties of it are all kept so that the smaller ids win them
+        kth = np.partition(-score_matrix, top - 1, axis=1)[:, top - 1:top]
+        selected = -score_matrix <= kth
+        part = np.argsort(~selected, axis=1, kind="stable")[:, :int(selected.sum(axis=1).max())]
+        score_matrix = np.take_along_axis(score_matrix, part, axis=1)
+        code_matrix = np.take_along_axis(code_matrix, part, axis=1)
+    order = np.lexsort((code_matrix, -score_matrix), axis=1)
+    score_matrix = np.take_along_axis(score_matrix, order, axis=1)
+    code_matrix = np.take_along_axis(code_matrix, order, axis=1)
+    end = None if limit is None else offset + limit
+    res_ids, res_scores = [], []
+    for q in range(nq):
+        n = min(counts[q], score_matrix.shape[1])
+        res_ids.append(unique_ids[code_matrix[q, :n]][offset:end].tolist())
+        res_scores.append(score_matrix[q, :n][offset:end].tolist())
+    return res_ids, res_scores
+
+
+def weighted_rerank(ids, scores, weights, metric_types, limit=None, offset=0, round_decimal=-1):
+    """
+    Reference results of hybrid search with WeightedRanker(*weights)
+    :param ids: the id rows of the search results of every sub-request
+    :param scores: the distance rows of the search results of every sub-request
+    :param metric_types: the metric type of every sub-request
+    """
+    contributions = []
+    for req_scores, weight, metric_type in zip(scores, weights, metric_types):
+        score_matrix, _ = to_matrix(req_scores, fill=0.0, dtype=np.float64)
+        contributions.append(weight * activate(score_matrix, metric_type))
+    return fuse(ids, contributions, limit=limit, offset=offset, round_decimal=round_decimal)
+
+
+def rrf_rerank(ids, k=DEFAULT_RRF_K, limit=None, offset=0, round_decimal=-1):
+    """
+    Reference results of hybrid search with RRFRanker(k)
+    :param ids: the id rows of the search results of every sub-request, in the order of the search results
+    """
+    contributions = []
+    for req_ids in ids:
+        id_matrix, _ = to_matrix(req_ids, fill=None, dtype=object)
+        ranks = np.broadcast_to(np.arange(id_matrix.shape[1]), id_matrix.shape)
+        contributions.append(1 / (k + ranks + 1))
+    return fuse(ids, contributions, limit=limit, offset=offset, round_decimal=round_decimal)
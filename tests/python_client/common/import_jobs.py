@@ -0,0 +1,256 @@
+import time
+import heapq
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pymilvus import BulkInsertState
+
+"""
+Orchestration of import (bulk insert) jobs:
+    jobs are submitted concurrently and all of them are polled by one scheduler,
+    the poll interval of a job starts short and backs off while its state and progress do not change,
+    so a finished job is noticed within a fraction of its duration instead of a fixed 5s step,
+    every job records the time it first entered each state and the imported rows/s.
+The server is reached through two callables, so the same orchestrator works for the RESTful import api
+and for utility.do_bulk_insert:
+    submit(spec) -> job id
+    get_progress(job id) -> ImportProgress, an exception is retried at the next poll
+The module does not import the utils of a test suite, the suites share it and pass their own logger.
+"""
+
+COMPLETED = "Completed"
+FAILED = "Failed"
+TIMEOUT = "Timeout"
+TERMINAL_STATES = (COMPLETED, FAILED)
+
+DEFAULT_WORKERS = 8
+DEFAULT_MIN_INTERVAL = 0.2
+DEFAULT_MAX_INTERVAL = 5
+DEFAULT_BACKOFF = 1.5
+DEFAULT_TIMEOUT = 3600
+# consecutive errors of get_progress before a job is failed, a single error is usually transient
+DEFAULT_MAX_ERRORS = 5
+
+
+class ImportProgress:
+    def __init__(self, state, progress=None, imported_rows=None, total_rows=None, reason=None, raw=None):
+        self.state = state
+        self.progress = progress
+        self.imported_rows = imported_rows
+        self.total_rows = total_rows
+        self.reason = reason
+        self.raw = raw
+
+    def key(self):
+        """ A job whose key does not change between two polls is backed off """
+        return self.state, self.progress, self.imported_rows
+
+
+class ImportJobRecord:
+    def __init__(self, job_id, name=None, submitted_at=None):
+        self.job_id = job_id
+        self.name = name
+        self.submitted_at = time.time() if submitted_at is None else submitted_at
+        self.finished_at = None
+        self.state = None
+        self.reason = None
+        self.imported_rows = None
+        self.total_rows = None
+        self.polls = 0
+        # state -> time the state is first seen, in order
+        self.phases = {}
+        self.last_progress = None
+
+    @property
+    def done(self):
+        return self.state in TERMINAL_STATES or self.state == TIMEOUT
+
+    @property
+    def success(self):
+        return self.state == COMPLETED
+
+    @property
+    def latency(self):
+        end = self.finished_at if self.finished_at is not None else time.time()
+        return end - self.submitted_at
+
+    def phase_durations(self):
+        """ Seconds spent in each state, a state lasts until the next state is first seen """
+        times = list(self.phases.items())
+        end = self.finished_at if self.finished_at is not None else time.time()
+        durations = {}
+        for i, (state, t) in enumerate(times):
+            if state in TERMINAL_STATES:
+                continue
+            next_t = times[i + 1][1] if i + 1 < len(times) else end
+            durations[state] = round(next_t - t, 3)
+        return durations
+
+    @property
+    def rows_per_sec(self):
+        rows = self.imported_rows if self.imported_rows else self.total_rows
+        if not rows or self.latency <= 0:
+            return 0.0
+        return rows / self.latency
+
+    def update(self, progress, now):
+        self.polls += 1
+        self.last_progress = progress
+        if progress.state not in self.phases:
+            self.phases[progress.state] = now
+        self.state = progress.state
+        self.reason = progress.reason
+        if progress.imported_rows is not None:
+            self.imported_rows = progress.imported_rows
+        if progress.total_rows is not None:
+            self.total_rows = progress.total_rows
+        if progress.state in TERMINAL_STATES:
+            self.finished_at = now
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "name": self.name,
+            "state": self.state,
+            "reason": self.reason,
+            "latency": round(self.latency, 3),
+            "phases": self.phase_durations(),
+            "imported_rows": self.imported_rows,
+            "rows_per_sec": round(self.rows_per_sec, 1),
+            "polls": self.polls,
+        }
+
+
+class ImportJobOrchestrator:
+    def __init__(self, submit=None, get_progress=None, workers=DEFAULT_WORKERS, min_interval=DEFAULT_MIN_INTERVAL,
+                 max_interval=DEFAULT_MAX_INTERVAL, backoff=DEFAULT_BACKOFF, timeout=DEFAULT_TIMEOUT,
+                 max_errors=DEFAULT_MAX_ERRORS, log=None):
+        self.submit = submit
+        self.get_progress = get_progress
+        self.workers = workers
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.timeout = timeout
+        self.max_errors = max_errors
+        self.log = log if log is not None else logging.getLogger(__name__)
+
+    def submit_jobs(self, specs, names=None):
+        """ Submit the specs concurrently, return the records in the order of specs """
+        names = names if names is not None else [None] * len(specs)
+
+        def submit(spec, name):
+            t0 = time.time()
+            return ImportJobRecord(self.submit(spec), name=name, submitted_at=t0)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(specs)))) as executor:
+            futures = [executor.submit(submit, spec, name) for spec, name in zip(specs, names)]
+            return [f.result() for f in futures]
+
+    def wait(self, records):
+        """
+        Poll the jobs until all of them are completed or failed, or the timeout,
+        return True if all jobs are completed
+        """
+        if not records:
+            return True
+        start = time.time()
+        deadline = start + self.timeout if self.timeout is not None else None
+        intervals = {}
+        errors = {}
+        # (next poll time, index of the record)
+        schedule = [(start, i) for i in range(len(records)) if not records[i].done]
+        heapq.heapify(schedule)
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(records)))) as executor:
+            while schedule:
+                next_at = schedule[0][0]
+                if deadline is not None and next_at > deadline:
+                    break
+                now = time.time()
+                if next_at > now:
+                    time.sleep(next_at - now)
+                due = []
+                now = time.time()
+                while schedule and schedule[0][0] <= now:
+                    due.append(heapq.heappop(schedule)[1])
+                futures = {i: executor.submit(self.get_progress, records[i].job_id) for i in due}
+                for i, f in futures.items():
+                    record = records[i]
+                    previous = record.last_progress.key() if record.last_progress is not None else None
+                    try:
+                        progress = f.result()
+                        errors[i] = 0
+                    except Exception as e:
+                        errors[i] = errors.get(i, 0) + 1
+                        self.log.warning(f"get progress of import job {record.job_id} error {errors[i]}/{self.max_errors}: {e}")
+                        progress = None
+                        if errors[i] >= self.max_errors:
+                            progress = ImportProgress(FAILED, reason=str(e))
+                    polled_at = time.time()
+                    if progress is not None:
+                        record.update(progress, polled_at)
+                        if record.done:
+                            self.log.info(f"import job {record.job_id} {record.state}: {record.to_dict()}")
+                            continue
+                    interval = intervals.get(i, self.min_interval)
+                    if progress is not None and progress.key() != previous:
+                        interval = self.min_interval
+                    else:
+                        interval = min(interval * self.backoff, self.max_interval)
+                    intervals[i] = interval
+                    heapq.heappush(schedule, (polled_at + interval, i))
+        for record in records:
+            if not record.done:
+                record.state = TIMEOUT
+                record.finished_at = time.time()
+                self.log.warning(f"import job {record.job_id} is not finished in {self.timeout}s: {record.to_dict()}")
+        return all(record.success for record in records)
+
+    def run(self, specs, names=None):
+        """ Submit the specs concurrently and wait for them, return (all completed, records) """
+        records = self.submit_jobs(specs, names=names)
+        success = self.wait(records)
+        self.log.info(f"import jobs summary: {summarize(records)}")
+        return success, records
+
+
+def summarize(records):
+    latencies = sorted(r.latency for r in records)
+    rows = sum(r.imported_rows or 0 for r in records)
+    start = min((r.submitted_at for r in records), default=0)
+    end = max((r.finished_at or time.time() for r in records), default=0)
+    return {
+        "jobs": len(records),
+        "completed": sum(1 for r in records if r.state == COMPLETED),
+        "failed": sum(1 for r in records if r.state == FAILED),
+        "timeout": sum(1 for r in records if r.state == TIMEOUT),
+        "max_latency": round(latencies[-1], 3) if latencies else 0,
+        "median_latency": round(latencies[len(latencies) // 2], 3) if latencies else 0,
+        "imported_rows": rows,
+        "rows_per_sec": round(rows / (end - start), 1) if end > start else 0.0,
+    }
+
+
+def restful_progress(response):
+    """
+    ImportProgress of the json of /v2/vectordb/jobs/import/get_progress,
+    an error code raises so that the orchestrator polls again instead of failing the job at once
+    """
+    if response.get("code", 0) != 0:
+        raise Exception(f"get import progress error: code {response.get('code')}, {response.get('message')}")
+    data = response.get("data") or {}
+    if not data:
+        return ImportProgress(None, reason=response.get("message"), raw=response)
+    return ImportProgress(data.get("state"), progress=data.get("progress"), imported_rows=data.get("importedRows"),
+                          total_rows=data.get("totalRows"), reason=data.get("reason"), raw=response)
+
+
+def bulk_insert_progress(state):
+    """ ImportProgress of a pymilvus BulkInsertState """
+    if state.state == BulkInsertState.ImportCompleted:
+        job_state = COMPLETED
+    elif state.state in (BulkInsertState.ImportFailed, BulkInsertState.ImportFailedAndCleaned):
+        job_state = FAILED
+    else:
+        job_state = state.state_name
+    return ImportProgress(job_state, progress=getattr(state, "progress", None), imported_rows=state.row_count,
+                          reason=state.failed_reason, raw=state)
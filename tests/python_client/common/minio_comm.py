@@ -1,35 +1,27 @@
 import os
 from minio import Minio
 from minio.error import S3Error
+from common.transfer_manager import TransferManager, DEFAULT_WORKERS, DEFAULT_PART_SIZE
 from utils.util_log import test_log as log
 
 
-def copy_files_to_bucket(client, r_source, target_files, bucket_name, force=False):
+def copy_files_to_bucket(client, r_source, target_files, bucket_name, force=False, workers=DEFAULT_WORKERS,
+                         part_size=DEFAULT_PART_SIZE):
     # check the bucket exist
     found = client.bucket_exists(bucket_name)
     if not found:
         log.error(f"Bucket {bucket_name} not found.")
         return
 
-    # copy target files from root source folder
+    # copy target files from root source folder, the files with the same etag in the bucket are skipped
     os.chdir(r_source)
-    for target_file in target_files:
-        found = False
-        try:
-            result = client.stat_object(bucket_name, target_file)
-            found = True
-        except S3Error as exc:
-            pass
-
-        if force or not found:
-            res = client.fput_object(bucket_name, target_file, f"{r_source}/{target_file}")
-            log.info(f"copied {res.object_name} to minio")
-        else:
-            log.info(f"skip copy {target_file} to minio")
+    manager = TransferManager(client, bucket_name, workers=workers, part_size=part_size, log=log)
+    return manager.upload_files([(f"{r_source}/{target_file}", target_file) for target_file in target_files],
+                                force=force)
 
 
 def copy_files_to_minio(host, r_source, files, bucket_name, access_key="minioadmin", secret_key="minioadmin",
-                        secure=False, force=False):
+                        secure=False, force=False, workers=DEFAULT_WORKERS, part_size=DEFAULT_PART_SIZE):
     client = Minio(
         host,
         access_key=access_key,
@@ -37,7 +29,7 @@ def copy_files_to_minio(host, r_source, files, bucket_name, access_key="minioadm
         secure=secure,
     )
     try:
-        copy_files_to_bucket(client, r_source=r_source, target_files=files, bucket_name=bucket_name, force=force)
+        return copy_files_to_bucket(client, r_source=r_source, target_files=files, bucket_name=bucket_name,
+                                    force=force, workers=workers, part_size=part_size)
     except S3Error as exc:
         log.error("fail to copy files to minio", exc)
-
@@ -1,8 +1,8 @@
 import re
 import jieba
 from faker import Faker
-from tantivy import SchemaBuilder, Document, Index, Query
 from typing import List, Dict
+from common.text_match_index import TextMatchIndex
 import numpy as np
 import random
 
@@ -218,27 +218,9 @@ class PhraseMatchTestGenerator:
                 }
             )
 
-        # Initialize Tantivy index
-        schema_builder = SchemaBuilder()
-
-        schema_builder.add_text_field("text", stored=True)
-        schema_builder.add_unsigned_field("doc_id", stored=True)
-        schema = schema_builder.build()
-
-        self.index = Index(schema=schema, path=None)
-
-        writer = self.index.writer()
-
-        # Index all documents
-        for doc in self.documents:
-            document = Document()
-            new_text = " ".join(self.tokenize_text(doc["text"]))
-            document.add_text("text", new_text)
-            document.add_unsigned("doc_id", doc["id"])
-            writer.add_document(document)
-
-        writer.commit()
-        self.index.reload()
+        # Index all documents, the tokens are lowercased like the default tokenizer of tantivy
+        self.index = TextMatchIndex(["text"], tokenize=lambda text: [t.lower() for t in self.tokenize_text(text)])
+        self.index.add([doc["id"] for doc in self.documents], self.documents)
 
         return self.documents
 
@@ -353,19 +335,8 @@ class PhraseMatchTestGenerator:
         # Clean and normalize query
         query_terms = self.tokenize_text(query)
 
-        # Create phrase query
-        searcher = self.index.searcher()
-        phrase_query = Query.phrase_query(self.index.schema, "text", query_terms, slop)
-
-        # Search for matches
-        results = searcher.search(phrase_query, limit=len(self.documents))
-
-        # Extract all matching documents
-        matched_docs = []
-        for _, doc_address in results.hits:
-            doc = searcher.doc(doc_address)
-            doc_id = doc.to_dict()["doc_id"]
-            matched_docs.extend(doc_id)
+        # Search the positional index, the terms must be in order with at most slop terms between two neighbours
+        matched_docs = self.index.phrase_match("text", query_terms, slop)
 
         return matched_docs
 
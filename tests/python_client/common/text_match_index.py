@@ -0,0 +1,256 @@
+import re
+import numpy as np
+import jieba
+from common.bm25_index import remove_punctuation
+from utils.util_log import test_log as log
+
+"""
+Reference evaluator of TEXT_MATCH and PHRASE_MATCH expressions.
+The documents are analyzed once into a positional inverted index per text field:
+    token -> sorted rows of the documents containing it, and the positions of the token in each document,
+an expression is evaluated by set algebra on the sorted row arrays instead of scanning the documents,
+    TEXT_MATCH(field, 'a b')    the union of the rows of the tokens
+    PHRASE_MATCH(field, 'a b', slop)    the intersection of the rows, then the positions of the candidates
+    and / or / not    intersection / union / difference with all rows
+"""
+
+WORD_PATTERN = re.compile(r"\w+")
+EMPTY_ROWS = np.zeros(0, dtype=np.int64)
+
+
+def analyzer(language="en"):
+    """ The tokens of custom_tokenizer, lowercase and split by punctuation and space, jieba for chinese """
+    if language in ["zh", "cn", "chinese"]:
+        return lambda text: [t for t in jieba.cut_for_search(remove_punctuation(text.lower())) if t.strip()]
+    return lambda text: WORD_PATTERN.findall(text.lower())
+
+
+def match_positions_with_slop(positions, slop):
+    """
+    Whether the terms appear in order with at most slop tokens between two neighbours,
+    the same greedy intersection as the phrase scorer of tantivy
+    :param positions: the sorted positions of every term of the phrase in one document
+    """
+    left = positions[0]
+    for offset in range(1, len(positions)):
+        # positions are shifted by the offset of the term in the phrase, so adjacent terms have equal values
+        right = [p - offset for p in positions[offset]]
+        matched = []
+        i = j = 0
+        while i < len(left) and j < len(right):
+            if left[i] < right[j] - slop:
+                i += 1
+            elif left[i] <= right[j]:
+                # the closest left position not after right
+                while i + 1 < len(left) and left[i + 1] <= right[j]:
+                    i += 1
+                matched.append(right[j])
+                i += 1
+                j += 1
+            else:
+                j += 1
+        if not matched:
+            return False
+        left = matched
+    return True
+
+
+class InvertedIndex:
+    """ The positional inverted index of one text field, documents are identified by rows """
+
+    def __init__(self):
+        self.vocab = {}
+        self.num_rows = 0
+        # appended (token ids, rows, positions) of the occurrences
+        self._chunks = []
+        self._postings = None
+
+    def add(self, token_lists):
+        tids, rows, positions = [], [], []
+        for row, tokens in enumerate(token_lists, start=self.num_rows):
+            if not tokens:
+                continue
+            for token in tokens:
+                tid = self.vocab.get(token)
+                if tid is None:
+                    tid = self.vocab[token] = len(self.vocab)
+                tids.append(tid)
+            rows.append(np.full(len(tokens), row, dtype=np.int64))
+            positions.append(np.arange(len(tokens), dtype=np.int64))
+        if tids:
+            self._chunks.append((np.asarray(tids, dtype=np.int64), np.concatenate(rows), np.concatenate(positions)))
+            self._postings = None
+        self.num_rows += len(token_lists)
+
+    def postings(self):
+        """
+        Occurrences sorted by (token, row, position) and grouped into:
+            doc_rows[doc_ptr[t]:doc_ptr[t + 1]]    the sorted rows of token t
+            positions[occ_ptr[d]:occ_ptr[d + 1]]    the positions of the d-th (token, row) pair
+        """
+        if self._postings is not None:
+            return self._postings
+        if self._chunks:
+            tids, rows, positions = (np.concatenate(c) for c in zip(*self._chunks))
+            order = np.lexsort((positions, rows, tids))
+            tids, rows, positions = tids[order], rows[order], positions[order]
+            self._chunks = [(tids, rows, positions)]
+        else:
+            tids, rows, positions = EMPTY_ROWS, EMPTY_ROWS, EMPTY_ROWS
+        first = np.ones(len(tids), dtype=bool)
+        first[1:] = (tids[1:] != tids[:-1]) | (rows[1:] != rows[:-1])
+        occ_ptr = np.append(np.flatnonzero(first), len(tids))
+        doc_tids = tids[first]
+        doc_ptr = np.searchsorted(doc_tids, np.arange(len(self.vocab) + 1))
+        self._postings = (rows[first], doc_ptr, occ_ptr, positions)
+        return self._postings
+
+    def rows_of(self, token):
+        tid = self.vocab.get(token)
+        if tid is None:
+            return EMPTY_ROWS
+        doc_rows, doc_ptr, _, _ = self.postings()
+        return doc_rows[doc_ptr[tid]:doc_ptr[tid + 1]]
+
+    def match_any(self, tokens):
+        """ Sorted rows containing any of the tokens """
+        postings = [self.rows_of(t) for t in set(tokens)]
+        if not postings:
+            return EMPTY_ROWS
+        return postings[0] if len(postings) == 1 else np.unique(np.concatenate(postings))
+
+    def match_phrase(self, tokens, slop=0):
+        """ Sorted rows containing the tokens in order with at most slop tokens between two neighbours """
+        if not tokens:
+            return EMPTY_ROWS
+        tids = [self.vocab.get(t) for t in tokens]
+        if any(tid is None for tid in tids):
+            return EMPTY_ROWS
+        doc_rows, doc_ptr, occ_ptr, positions = self.postings()
+        # the rarest token first to shrink the candidates quickly
+        candidates = None
+        for tid in sorted(set(tids), key=lambda t: doc_ptr[t + 1] - doc_ptr[t]):
+            rows = doc_rows[doc_ptr[tid]:doc_ptr[tid + 1]]
+            candidates = rows if candidates is None else np.intersect1d(candidates, rows, assume_unique=True)
+        if len(tids) == 1 or len(candidates) == 0:
+            return candidates
+        # the (token, row) pair of every candidate and term, then the positions of the pairs
+        pairs = [doc_ptr[tid] + np.searchsorted(doc_rows[doc_ptr[tid]:doc_ptr[tid + 1]], candidates) for tid in tids]
+        starts = [occ_ptr[p].tolist() for p in pairs]
+        ends = [occ_ptr[p + 1].tolist() for p in pairs]
+        matched = [i for i in range(len(candidates))
+                   if match_positions_with_slop([positions[s[i]:e[i]].tolist() for s, e in zip(starts, ends)], slop)]
+        return candidates[matched]
+
+
+class TextMatchIndex:
+    """
+    Inverted indexes of the text match fields of a dataset, built once and appended by later inserts,
+    the results are the ids of the documents
+    """
+
+    def __init__(self, fields, language="en", tokenize=None):
+        self.fields = list(fields)
+        self.tokenize = tokenize if tokenize is not None else analyzer(language)
+        self.indexes = {field: InvertedIndex() for field in self.fields}
+        self._id_chunks = []
+        self._ids = None
+
+    @classmethod
+    def from_dataframe(cls, df, fields, id_field="id", language="en", tokenize=None):
+        """ The index of a DataFrame, the cells can be texts or token lists of split_dataframes """
+        index = cls(fields, language=language, tokenize=tokenize)
+        index.add(df[id_field].tolist(), {field: df[field].tolist() for field in fields})
+        return index
+
+    def __len__(self):
+        return sum(len(c) for c in self._id_chunks)
+
+    @property
+    def ids(self):
+        if self._ids is None or len(self._ids) != len(self):
+            self._ids = np.concatenate(self._id_chunks) if self._id_chunks else EMPTY_ROWS
+            self._id_chunks = [self._ids]
+        return self._ids
+
+    def analyze(self, doc):
+        if isinstance(doc, str):
+            return self.tokenize(doc)
+        if isinstance(doc, (list, tuple)):
+            # already split into tokens
+            return list(doc)
+        return []
+
+    def add(self, ids, docs):
+        """
+        Append documents
+        :param ids: the primary keys of the documents
+        :param docs: {field: texts} or rows as dicts, the fields missing in a row have no tokens
+        """
+        ids = list(ids)
+        if isinstance(docs, dict):
+            columns = {field: list(docs.get(field, [None] * len(ids))) for field in self.fields}
+        else:
+            columns = {field: [row.get(field) for row in docs] for field in self.fields}
+        for field, texts in columns.items():
+            if len(texts) != len(ids):
+                raise Exception(f"{len(texts)} documents of {field} with {len(ids)} ids")
+            self.indexes[field].add([self.analyze(text) for text in texts])
+        self._id_chunks.append(np.asarray(ids))
+
+    def text_match_rows(self, field, value):
+        return self.indexes[field].match_any(self.analyze(value))
+
+    def phrase_match_rows(self, field, phrase, slop=0):
+        """ phrase is a text or the list of its tokens """
+        return self.indexes[field].match_phrase(self.analyze(phrase), slop)
+
+    def evaluate_rows(self, node):
+        """
+        Sorted rows of a query node of generate_text_match_expr:
+            {"field": f, "value": v}    TEXT_MATCH(f, 'v')
+            {"field": f, "value": v, "slop": s}    PHRASE_MATCH(f, 'v', s)
+            {"not": node}
+            [node, "and" | "or", node, ...]    "and" binds tighter than "or", nested lists are inlined
+        """
+        if isinstance(node, dict) and "not" in node:
+            return np.setdiff1d(np.arange(len(self)), self.evaluate_rows(node["not"]), assume_unique=True)
+        if isinstance(node, dict) and "slop" in node:
+            return self.phrase_match_rows(node["field"], node["value"], node["slop"])
+        if isinstance(node, dict) and "field" in node and "value" in node:
+            return self.text_match_rows(node["field"], node["value"])
+        if isinstance(node, list):
+            # a union of the intersections between "or"
+            union, conjunction, operator = None, None, "and"
+            for item in node:
+                if isinstance(item, str):
+                    if item not in ("and", "or"):
+                        raise ValueError(f"Invalid operator: {item}")
+                    operator = item
+                    continue
+                rows = self.evaluate_rows(item)
+                if conjunction is None:
+                    conjunction = rows
+                elif operator == "and":
+                    conjunction = np.intersect1d(conjunction, rows, assume_unique=True)
+                else:
+                    union = conjunction if union is None else np.union1d(union, conjunction)
+                    conjunction = rows
+            if conjunction is None:
+                return EMPTY_ROWS
+            return conjunction if union is None else np.union1d(union, conjunction)
+        raise ValueError(f"Invalid node type: {type(node)}")
+
+    def text_match(self, field, value):
+        """ ids of TEXT_MATCH(field, 'value') """
+        return self.ids[self.text_match_rows(field, value)].tolist()
+
+    def phrase_match(self, field, phrase, slop=0):
+        """ ids of PHRASE_MATCH(field, 'phrase', slop) """
+        return self.ids[self.phrase_match_rows(field, phrase, slop)].tolist()
+
+    def evaluate(self, node):
+        """ ids of a query node, see evaluate_rows """
+        rows = self.evaluate_rows(node)
+        log.debug(f"text match reference: {len(rows)} of {len(self)} documents matched")
+        return self.ids[rows].tolist()
@@ -0,0 +1,214 @@
+import os
+import time
+import math
+import shutil
+import hashlib
+import logging
+import threading
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+from minio.error import S3Error
+
+"""
+Concurrent transfer of local files to a bucket:
+    files are uploaded by a pool of workers, each file in multipart of part_size,
+    a file is skipped if the object in the bucket has the same etag as the local file,
+    progress and throughput are logged after every file.
+The client can be a minio.Minio or LocalObjectStore, a filesystem stand-in for tests without minio.
+The module does not import the utils of a test suite, the suites share it and pass their own logger.
+"""
+
+MB = 1024 * 1024
+DEFAULT_WORKERS = 4
+DEFAULT_PART_SIZE = 64 * MB
+MIN_PART_SIZE = 5 * MB
+# parallel part uploads inside one file
+DEFAULT_PARALLEL_PARTS = 3
+HASH_CHUNK_SIZE = 8 * MB
+
+
+def file_etag(file_path, part_size=DEFAULT_PART_SIZE):
+    """
+    The etag S3 gives to the file uploaded with part_size:
+    md5 of the content for a single part, md5 of the part md5s and the part count for multipart
+    """
+    size = os.path.getsize(file_path)
+    part_count = max(1, math.ceil(size / part_size))
+    part_digests = []
+    with open(file_path, "rb") as f:
+        for _ in range(part_count):
+            md5 = hashlib.md5()
+            remaining = part_size
+            while remaining > 0:
+                data = f.read(min(HASH_CHUNK_SIZE, remaining))
+                if not data:
+                    break
+                md5.update(data)
+                remaining -= len(data)
+            part_digests.append(md5)
+    if part_count == 1:
+        return part_digests[0].hexdigest()
+    return f"{hashlib.md5(b''.join(d.digest() for d in part_digests)).hexdigest()}-{part_count}"
+
+
+class TransferStats:
+    def __init__(self, total_files=0, total_bytes=0):
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.uploaded_files = 0
+        self.uploaded_bytes = 0
+        self.skipped_files = 0
+        self.failed_files = []
+        self.start = time.perf_counter()
+        self.end = None
+        self._lock = threading.Lock()
+
+    def add(self, size, skipped=False):
+        with self._lock:
+            if skipped:
+                self.skipped_files += 1
+            else:
+                self.uploaded_files += 1
+                self.uploaded_bytes += size
+
+    def add_failed(self, object_name):
+        with self._lock:
+            self.failed_files.append(object_name)
+
+    @property
+    def elapsed(self):
+        end = self.end if self.end is not None else time.perf_counter()
+        return end - self.start
+
+    @property
+    def throughput(self):
+        """ uploaded MB per second """
+        elapsed = self.elapsed
+        return self.uploaded_bytes / MB / elapsed if elapsed > 0 else 0.0
+
+    def to_dict(self):
+        return {
+            "total_files": self.total_files,
+            "total_mb": round(self.total_bytes / MB, 3),
+            "uploaded_files": self.uploaded_files,
+            "uploaded_mb": round(self.uploaded_bytes / MB, 3),
+            "skipped_files": self.skipped_files,
+            "failed_files": self.failed_files,
+            "elapsed": round(self.elapsed, 3),
+            "throughput_mb_per_sec": round(self.throughput, 3),
+        }
+
+
+class TransferError(Exception):
+    def __init__(self, stats):
+        super().__init__(f"fail to copy {len(stats.failed_files)} of {stats.total_files} files: {stats.failed_files}")
+        self.stats = stats
+
+
+class TransferManager:
+    def __init__(self, client, bucket_name, workers=DEFAULT_WORKERS, part_size=DEFAULT_PART_SIZE,
+                 parallel_parts=DEFAULT_PARALLEL_PARTS, skip_same_etag=True, log=None):
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(f"part size {part_size} is less than the minimum {MIN_PART_SIZE}")
+        self.client = client
+        self.bucket_name = bucket_name
+        self.workers = workers
+        self.part_size = part_size
+        self.parallel_parts = parallel_parts
+        self.skip_same_etag = skip_same_etag
+        self.log = log if log is not None else logging.getLogger(__name__)
+
+    def _remote_object(self, object_name):
+        try:
+            return self.client.stat_object(self.bucket_name, object_name)
+        except S3Error:
+            return None
+
+    def _is_same(self, file_path, remote):
+        if remote.size != os.path.getsize(file_path):
+            return False
+        if not self.skip_same_etag:
+            return True
+        return remote.etag.strip('"') == file_etag(file_path, self.part_size)
+
+    def upload_file(self, file_path, object_name, force=False, stats=None):
+        """ Upload one file, return True if uploaded and False if skipped """
+        size = os.path.getsize(file_path)
+        if not force:
+            remote = self._remote_object(object_name)
+            if remote is not None and self._is_same(file_path, remote):
+                self.log.info(f"skip copy {object_name} to {self.bucket_name}, the object is the same")
+                if stats is not None:
+                    stats.add(size, skipped=True)
+                return False
+        self.client.fput_object(self.bucket_name, object_name, file_path, part_size=self.part_size,
+                                num_parallel_uploads=self.parallel_parts)
+        if stats is not None:
+            stats.add(size)
+            self.log.info(f"copied {object_name} to {self.bucket_name}, "
+                          f"progress: {stats.uploaded_files + stats.skipped_files}/{stats.total_files} files, "
+                          f"{stats.uploaded_bytes / MB:.1f} MB, {stats.throughput:.1f} MB/s")
+        return True
+
+    def upload_files(self, files, force=False):
+        """
+        Upload files concurrently
+        :param files: list of (file_path, object_name)
+        :return: TransferStats, TransferError with the stats is raised if any file failed
+        """
+        stats = TransferStats(len(files), sum(os.path.getsize(file_path) for file_path, _ in files))
+
+        def upload(file_path, object_name):
+            try:
+                self.upload_file(file_path, object_name, force=force, stats=stats)
+            except (S3Error, OSError, ValueError) as exc:
+                stats.add_failed(object_name)
+                self.log.error(f"fail to copy {file_path} to {self.bucket_name}/{object_name}: {exc}")
+
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as executor:
+            futures = [executor.submit(upload, file_path, object_name) for file_path, object_name in files]
+            for f in futures:
+                f.result()
+        stats.end = time.perf_counter()
+        self.log.info(f"transfer to {self.bucket_name} finished: {stats.to_dict()}")
+        if stats.failed_files:
+            raise TransferError(stats)
+        return stats
+
+
+class LocalObjectStore:
+    """
+    A filesystem stand-in of the minio client used by TransferManager,
+    buckets are folders under root and the etag is computed like S3
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, bucket_name, object_name=""):
+        return os.path.join(self.root, bucket_name, object_name)
+
+    def bucket_exists(self, bucket_name):
+        return os.path.isdir(self._path(bucket_name))
+
+    def make_bucket(self, bucket_name):
+        os.makedirs(self._path(bucket_name), exist_ok=True)
+
+    def stat_object(self, bucket_name, object_name):
+        path = self._path(bucket_name, object_name)
+        if not os.path.isfile(path):
+            raise S3Error("NoSuchKey", "Object does not exist", object_name, None, None, None,
+                          bucket_name=bucket_name, object_name=object_name)
+        etag_file = path + ".etag"
+        etag = open(etag_file).read() if os.path.exists(etag_file) else file_etag(path)
+        return SimpleNamespace(bucket_name=bucket_name, object_name=object_name, size=os.path.getsize(path),
+                               etag=etag)
+
+    def fput_object(self, bucket_name, object_name, file_path, part_size=DEFAULT_PART_SIZE, **kwargs):
+        path = self._path(bucket_name, object_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(file_path, path)
+        etag = file_etag(path, part_size)
+        with open(path + ".etag", "w") as f:
+            f.write(etag)
+        return SimpleNamespace(bucket_name=bucket_name, object_name=object_name, etag=etag)
@@ -10,6 +10,7 @@ from utils.util_pymilvus import *
 from common.common_type import CaseLabel, CheckTasks
 from common import common_type as ct
 from common import common_func as cf
+from common.hybrid_rerank import weighted_rerank
 from utils.util_log import test_log as log
 from base.client_base import TestcaseBase
 import heapq
@@ -167,8 +168,6 @@ class TestCollectionHybridSearchValid(TestcaseBase):
         req_list = []
         weights = [0.2, 0.3, 0.5]
         metrics = []
-        search_res_dict_array = []
-        search_res_dict_array_nq = []
         vectors = cf.gen_vectors_based_on_vector_type(nq, dim, vector_data_type)
 
         # get hybrid search req list
@@ -183,33 +182,25 @@ class TestCollectionHybridSearchValid(TestcaseBase):
             req_list.append(req)
             metrics.append("COSINE")
 
-        # get the result of search with the same params of the following hybrid search
-        single_search_param = {"metric_type": "COSINE", "params": {"nprobe": 32}, "offset": offset}
-        for k in range(nq):
-            for i in range(len(vector_name_list)):
-                search_res_dict = {}
-                search_res_dict_array = []
-                vectors_search = vectors[k]
-                # 5. search to get the baseline of hybrid_search
-                search_res = collection_w.search([vectors_search], vector_name_list[i],
-                                                 single_search_param, default_limit,
-                                                 default_search_exp,
-                                                 check_task=CheckTasks.check_search_results,
-                                                 check_items={"nq": 1,
-                                                              "ids": insert_ids,
-                                                              "limit": default_limit})[0]
-                ids = search_res[0].ids
-                distance_array = search_res[0].distances
-                for j in range(len(ids)):
-                    search_res_dict[ids[j]] = distance_array[j]
-                search_res_dict_array.append(search_res_dict)
-            search_res_dict_array_nq.append(search_res_dict_array)
-
-        # 6. calculate hybrid search baseline
-        score_answer_nq = []
-        for k in range(nq):
-            ids_answer, score_answer = cf.get_hybrid_search_base_results(search_res_dict_array_nq[k], weights, metrics)
-            score_answer_nq.append(score_answer)
+        # get the result of search with the same params of the following hybrid search,
+        # without offset: the offset is applied once to the fused results
+        single_search_param = {"metric_type": "COSINE", "params": {"nprobe": 32}}
+        ids_per_req, distances_per_req = [], []
+        for i in range(len(vector_name_list)):
+            # 5. search all nq at once to get the baseline of hybrid_search
+            search_res = collection_w.search(vectors, vector_name_list[i],
+                                             single_search_param, default_limit + offset,
+                                             default_search_exp,
+                                             check_task=CheckTasks.check_search_results,
+                                             check_items={"nq": nq,
+                                                          "ids": insert_ids,
+                                                          "limit": default_limit + offset})[0]
+            ids_per_req.append([hits.ids for hits in search_res])
+            distances_per_req.append([hits.distances for hits in search_res])
+
+        # 6. calculate hybrid search baseline of all nq
+        _, score_answer_nq = weighted_rerank(ids_per_req, distances_per_req, weights, metrics,
+                                             limit=default_limit, offset=offset)
         # 7. hybrid search
         hybrid_res = collection_w.hybrid_search(req_list, WeightedRanker(*weights), default_limit,
                                                 offset=offset,
@@ -1514,7 +1505,6 @@ class TestCollectionHybridSearchValid(TestcaseBase):
         weights = [0.2, 0.3, 0.5]
         metrics = []
         search_res_dict_array = []
-        search_res_dict_array_nq = []
         vectors = cf.gen_vectors_based_on_vector_type(nq, dim, vector_data_type)
 
         # get hybrid search req list
@@ -1531,31 +1521,21 @@ class TestCollectionHybridSearchValid(TestcaseBase):
 
         # get the result of search with the same params of the following hybrid search
         single_search_param = {"metric_type": "COSINE", "params": {"nprobe": 10}}
-        for k in range(nq):
-            for i in range(len(vector_name_list)):
-                search_res_dict = {}
-                search_res_dict_array = []
-                vectors_search = vectors[k]
-                # 5. search to get the base line of hybrid_search
-                search_res = collection_w.search([vectors_search], vector_name_list[i],
-                                                 single_search_param, default_limit,
-                                                 default_search_exp,
-                                                 check_task=CheckTasks.check_search_results,
-                                                 check_items={"nq": 1,
-                                                              "ids": insert_ids,
-                                                              "limit": default_limit})[0]
-                ids = search_res[0].ids
-                distance_array = search_res[0].distances
-                for j in range(len(ids)):
-                    search_res_dict[ids[j]] = distance_array[j]
-                search_res_dict_array.append(search_res_dict)
-            search_res_dict_array_nq.append(search_res_dict_array)
-
-        # 6. calculate hybrid search base line
-        score_answer_nq = []
-        for k in range(nq):
-            ids_answer, score_answer = cf.get_hybrid_search_base_results(search_res_dict_array_nq[k], weights, metrics)
-            score_answer_nq.append(score_answer)
+        ids_per_req, distances_per_req = [], []
+        for i in range(len(vector_name_list)):
+            # 5. search all nq at once to get the baseline of hybrid_search
+            search_res = collection_w.search(vectors, vector_name_list[i],
+                                             single_search_param, default_limit,
+                                             default_search_exp,
+                                             check_task=CheckTasks.check_search_results,
+                                             check_items={"nq": nq,
+                                                          "ids": insert_ids,
+                                                          "limit": default_limit})[0]
+            ids_per_req.append([hits.ids for hits in search_res])
+            distances_per_req.append([hits.distances for hits in search_res])
+
+        # 6. calculate hybrid search baseline of all nq
+        _, score_answer_nq = weighted_rerank(ids_per_req, distances_per_req, weights, metrics)
         # 7. hybrid search
         output_fields = [default_int64_field_name]
         hybrid_res = collection_w.hybrid_search(req_list, WeightedRanker(*weights), default_limit,
@@ -1595,7 +1575,6 @@ class TestCollectionHybridSearchValid(TestcaseBase):
         weights = [0.2, 0.3, 0.5]
         metrics = []
         search_res_dict_array = []
-        search_res_dict_array_nq = []
         vectors = cf.gen_vectors_based_on_vector_type(nq, dim, vector_data_type)
 
         # get hybrid search req list
@@ -1612,31 +1591,21 @@ class TestCollectionHybridSearchValid(TestcaseBase):
 
         # get the result of search with the same params of the following hybrid search
         single_search_param = {"metric_type": "COSINE", "params": {"nprobe": 10}}
-        for k in range(nq):
-            for i in range(len(vector_name_list)):
-                search_res_dict = {}
-                search_res_dict_array = []
-                vectors_search = vectors[k]
-                # 5. search to get the base line of hybrid_search
-                search_res = collection_w.search([vectors_search], vector_name_list[i],
-                                                 single_search_param, default_limit,
-                                                 default_search_exp,
-                                                 check_task=CheckTasks.check_search_results,
-                                                 check_items={"nq": 1,
-                                                              "ids": insert_ids,
-                                                              "limit": default_limit})[0]
-                ids = search_res[0].ids
-                distance_array = search_res[0].distances
-                for j in range(len(ids)):
-                    search_res_dict[ids[j]] = distance_array[j]
-                search_res_dict_array.append(search_res_dict)
-            search_res_dict_array_nq.append(search_res_dict_array)
-
-        # 6. calculate hybrid search base line
-        score_answer_nq = []
-        for k in range(nq):
-            ids_answer, score_answer = cf.get_hybrid_search_base_results(search_res_dict_array_nq[k], weights, metrics)
-            score_answer_nq.append(score_answer)
+        ids_per_req, distances_per_req = [], []
+        for i in range(len(vector_name_list)):
+            # 5. search all nq at once to get the baseline of hybrid_search
+            search_res = collection_w.search(vectors, vector_name_list[i],
+                                             single_search_param, default_limit,
+                                             default_search_exp,
+                                             check_task=CheckTasks.check_search_results,
+                                             check_items={"nq": nq,
+                                                          "ids": insert_ids,
+                                                          "limit": default_limit})[0]
+            ids_per_req.append([hits.ids for hits in search_res])
+            distances_per_req.append([hits.distances for hits in search_res])
+
+        # 6. calculate hybrid search baseline of all nq
+        _, score_answer_nq = weighted_rerank(ids_per_req, distances_per_req, weights, metrics)
         # 7. hybrid search
         output_fields = [default_int64_field_name, default_float_field_name, default_string_field_name,
                          default_json_field_name]
@@ -1678,7 +1647,6 @@ class TestCollectionHybridSearchValid(TestcaseBase):
         weights = [0.2, 0.3, 0.5]
         metrics = []
         search_res_dict_array = []
-        search_res_dict_array_nq = []
         vectors = cf.gen_vectors_based_on_vector_type(nq, dim, vector_data_type)
 
         # get hybrid search req list
@@ -1695,31 +1663,21 @@ class TestCollectionHybridSearchValid(TestcaseBase):
 
         # get the result of search with the same params of the following hybrid search
         single_search_param = {"metric_type": "COSINE", "params": {"nprobe": 10}}
-        for k in range(nq):
-            for i in range(len(vector_name_list)):
-                search_res_dict = {}
-                search_res_dict_array = []
-                vectors_search = vectors[k]
-                # 5. search to get the base line of hybrid_search
-                search_res = collection_w.search([vectors_search], vector_name_list[i],
-                                                 single_search_param, default_limit,
-                                                 default_search_exp,
-                                                 check_task=CheckTasks.check_search_results,
-                                                 check_items={"nq": 1,
-                                                              "ids": insert_ids,
-                                                              "limit": default_limit})[0]
-                ids = search_res[0].ids
-                distance_array = search_res[0].distances
-                for j in range(len(ids)):
-                    search_res_dict[ids[j]] = distance_array[j]
-                search_res_dict_array.append(search_res_dict)
-            search_res_dict_array_nq.append(search_res_dict_array)
-
-        # 6. calculate hybrid search base line
-        score_answer_nq = []
-        for k in range(nq):
-            ids_answer, score_answer = cf.get_hybrid_search_base_results(search_res_dict_array_nq[k], weights, metrics)
-            score_answer_nq.append(score_answer)
+        ids_per_req, distances_per_req = [], []
+        for i in range(len(vector_name_list)):
+            # 5. search all nq at once to get the baseline of hybrid_search
+            search_res = collection_w.search(vectors, vector_name_list[i],
+                                             single_search_param, default_limit,
+                                             default_search_exp,
+                                             check_task=CheckTasks.check_search_results,
+                                             check_items={"nq": nq,
+                                                          "ids": insert_ids,
+                                                          "limit": default_limit})[0]
+            ids_per_req.append([hits.ids for hits in search_res])
+            distances_per_req.append([hits.distances for hits in search_res])
+
+        # 6. calculate hybrid search baseline of all nq
+        _, score_answer_nq = weighted_rerank(ids_per_req, distances_per_req, weights, metrics)
         # 7. hybrid search
         hybrid_res = collection_w.hybrid_search(req_list, WeightedRanker(*weights), default_limit,
                                                 output_fields=["*"],
@@ -1756,7 +1714,6 @@ class TestCollectionHybridSearchValid(TestcaseBase):
         weights = [0.2, 0.3, 0.5]
         metrics = []
         search_res_dict_array = []
-        search_res_dict_array_nq = []
         vectors = cf.gen_vectors_based_on_vector_type(nq, default_dim, "FLOAT_VECTOR")
 
         # get hybrid search req list
@@ -1773,35 +1730,25 @@ class TestCollectionHybridSearchValid(TestcaseBase):
 
         # get the result of search with the same params of the following hybrid search
         single_search_param = {"metric_type": "COSINE", "params": {"nprobe": 10}}
-        for k in range(nq):
-            for i in range(len(vector_name_list)):
-                search_res_dict = {}
-                search_res_dict_array = []
-                vectors_search = vectors[k]
-                # 5. search to get the base line of hybrid_search
-                search_res = collection_w.search([vectors_search], vector_name_list[i],
-                                                 single_search_param, default_limit,
-                                                 default_search_exp, _async=_async,
-                                                 check_task=CheckTasks.check_search_results,
-                                                 check_items={"nq": 1,
-                                                              "ids": insert_ids,
-                                                              "limit": default_limit,
-                                                              "_async": _async})[0]
-                if _async:
-                    search_res.done()
-                    search_res = search_res.result()
-                ids = search_res[0].ids
-                distance_array = search_res[0].distances
-                for j in range(len(ids)):
-                    search_res_dict[ids[j]] = distance_array[j]
-                search_res_dict_array.append(search_res_dict)
-            search_res_dict_array_nq.append(search_res_dict_array)
-
-        # 6. calculate hybrid search base line
-        score_answer_nq = []
-        for k in range(nq):
-            ids_answer, score_answer = cf.get_hybrid_search_base_results(search_res_dict_array_nq[k], weights, metrics)
-            score_answer_nq.append(score_answer)
+        ids_per_req, distances_per_req = [], []
+        for i in range(len(vector_name_list)):
+            # 5. search all nq at once to get the baseline of hybrid_search
+            search_res = collection_w.search(vectors, vector_name_list[i],
+                                             single_search_param, default_limit,
+                                             default_search_exp, _async=_async,
+                                             check_task=CheckTasks.check_search_results,
+                                             check_items={"nq": nq,
+                                                          "ids": insert_ids,
+                                                          "limit": default_limit,
+                                                          "_async": _async})[0]
+            if _async:
+                search_res.done()
+                search_res = search_res.result()
+            ids_per_req.append([hits.ids for hits in search_res])
+            distances_per_req.append([hits.distances for hits in search_res])
+
+        # 6. calculate hybrid search baseline of all nq
+        _, score_answer_nq = weighted_rerank(ids_per_req, distances_per_req, weights, metrics)
         # 7. hybrid search
         hybrid_res = collection_w.hybrid_search(req_list, WeightedRanker(*weights), default_limit,
                                                 output_fields=output_fields, _async=_async,
@@ -1879,7 +1826,6 @@ class TestCollectionHybridSearchValid(TestcaseBase):
         weights = [0.2, 0.3, 0.5]
         metrics = []
         search_res_dict_array = []
-        search_res_dict_array_nq = []
         vectors = cf.gen_vectors_based_on_vector_type(nq, default_dim, vector_data_type)
 
         # get hybrid search req list
@@ -1896,31 +1842,21 @@ class TestCollectionHybridSearchValid(TestcaseBase):
 
         # get the result of search with the same params of the following hybrid search
         single_search_param = {"metric_type": "COSINE", "params": {"nprobe": 10}}
-        for k in range(nq):
-            for i in range(len(vector_name_list)):
-                search_res_dict = {}
-                search_res_dict_array = []
-                vectors_search = vectors[k]
-                # 5. search to get the base line of hybrid_search
-                search_res = collection_w.search([vectors_search], vector_name_list[i],
-                                                 single_search_param, default_limit,
-                                                 default_search_exp,
-                                                 check_task=CheckTasks.check_search_results,
-                                                 check_items={"nq": 1,
-                                                              "ids": insert_ids,
-                                                              "limit": default_limit})[0]
-                ids = search_res[0].ids
-                distance_array = search_res[0].distances
-                for j in range(len(ids)):
-                    search_res_dict[ids[j]] = distance_array[j]
-                search_res_dict_array.append(search_res_dict)
-            search_res_dict_array_nq.append(search_res_dict_array)
-
-        # 6. calculate hybrid search base line
-        score_answer_nq = []
-        for k in range(nq):
-            ids_answer, score_answer = cf.get_hybrid_search_base_results(search_res_dict_array_nq[k], weights, metrics)
-            score_answer_nq.append(score_answer)
+        ids_per_req, distances_per_req = [], []
+        for i in range(len(vector_name_list)):
+            # 5. search all nq at once to get the baseline of hybrid_search
+            search_res = collection_w.search(vectors, vector_name_list[i],
+                                             single_search_param, default_limit,
+                                             default_search_exp,
+                                             check_task=CheckTasks.check_search_results,
+                                             check_items={"nq": nq,
+                                                          "ids": insert_ids,
+                                                          "limit": default_limit})[0]
+            ids_per_req.append([hits.ids for hits in search_res])
+            distances_per_req.append([hits.distances for hits in search_res])
+
+        # 6. calculate hybrid search baseline of all nq
+        _, score_answer_nq = weighted_rerank(ids_per_req, distances_per_req, weights, metrics)
         # 7. hybrid search
         hybrid_res = collection_w.hybrid_search(req_list, WeightedRanker(*weights), default_limit,
                                                 check_task=CheckTasks.check_search_results,
@@ -6,6 +6,7 @@ from common.common_type import CaseLabel, CheckTasks
 from common import common_type as ct
 from common import common_func as cf
 from common.phrase_match_generator import KoreanTextGenerator
+from common.text_match_index import TextMatchIndex
 from common.code_mapping import ConnectionErrorMessage as cem
 from base.client_base import TestcaseBase
 from pymilvus.orm.types import CONSISTENCY_STRONG, CONSISTENCY_BOUNDED, CONSISTENCY_EVENTUALLY
@@ -5905,6 +5906,7 @@ class TestQueryTextMatch(TestcaseBase):
         df_new = cf.split_dataframes(df, fields=text_fields)
         log.info(f"df \n{df}")
         log.info(f"new df \n{df_new}")
+        text_match_index = TextMatchIndex.from_dataframe(df_new, text_fields)
         for field in text_fields:
             expr_list = []
             wf_counter = Counter(wf_map[field])
@@ -5913,7 +5915,7 @@ class TestQueryTextMatch(TestcaseBase):
                 tmp = f"text_match({field}, '{word}')"
                 log.info(f"tmp expr {tmp}")
                 expr_list.append(tmp)
-                tmp_res = cf.manual_check_text_match(df_new, word, field)
+                tmp_res = cf.manual_check_text_match(df_new, word, field, index=text_match_index)
                 log.info(f"manual check result for  {tmp} {len(tmp_res)}")
                 pd_tmp_res_list.append(tmp_res)
             log.info(f"manual res {len(pd_tmp_res_list)}, {pd_tmp_res_list}")
@@ -6018,6 +6020,7 @@ class TestQueryTextMatch(TestcaseBase):
 
         df_new = cf.split_dataframes(df, fields=text_fields)
         log.info(f"new df \n{df_new}")
+        text_match_index = TextMatchIndex.from_dataframe(df_new, text_fields)
         for i in range(2):
             query, text_match_expr, pandas_expr = (
                 cf.generate_random_query_from_freq_dict(
@@ -6048,7 +6051,7 @@ class TestQueryTextMatch(TestcaseBase):
                     tmp_idx = [r["id"] for r in res]
                     step_by_step_results.append(tmp_idx)
                     pandas_filter_res = cf.generate_pandas_text_match_result(
-                        expr, df_new
+                        expr, df_new, index=text_match_index
                     )
                     tmp_pd_idx = pandas_filter_res["id"].tolist()
                     diff_id = set(tmp_pd_idx).union(set(tmp_idx)) - set(
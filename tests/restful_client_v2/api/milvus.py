@@ -1,8 +1,10 @@
 import json
-import requests
 import time
 import uuid
 from utils.util_log import test_log as logger
+from api.transport import get_session, cache_json, AsyncTransport, DEFAULT_CONCURRENCY
+from common.transfer_manager import TransferManager, DEFAULT_WORKERS, DEFAULT_PART_SIZE
+from common.import_jobs import ImportJobOrchestrator, ImportJobRecord, restful_progress
 from minio import Minio
 from minio.error import S3Error
 from minio.commonconfig import CopySource
@@ -11,6 +13,7 @@ from requests.exceptions import ConnectionError
 import urllib.parse
 
 REQUEST_TIMEOUT = "120"
+DEFAULT_IMPORT_TIMEOUT = 1800
 
 ENABLE_LOG_SAVE = False
 
@@ -57,10 +60,13 @@ def build_curl_command(method, url, headers, data=None, params=None):
 
 
 def logger_request_response(response, url, tt, headers, data, str_data, str_response, method, params=None):
-    # save data to jsonl file
-
-    data_dict = json.loads(data) if data else {}
+    # data is the payload before serialization, the response json is parsed once by cache_json
+    data_dict = data if isinstance(data, dict) else {}
     data_dict_simple = simplify_dict(data_dict)
+    try:
+        rsp = response.json()
+    except Exception:
+        rsp = None
     if ENABLE_LOG_SAVE:
         with open('request_response.jsonl', 'a') as f:
             f.write(json.dumps({
@@ -69,13 +75,12 @@ def logger_request_response(response, url, tt, headers, data, str_data, str_resp
                 "headers": headers,
                 "params": params,
                 "data": data_dict_simple,
-                "response": response.json()
+                "response": rsp
             }) + "\n")
     data = json.dumps(data_dict_simple, indent=4)
     try:
         if response.status_code == 200:
-            if ('code' in response.json() and response.json()["code"] == 0) or (
-                    'Code' in response.json() and response.json()["Code"] == 0):
+            if isinstance(rsp, dict) and (rsp.get("code", None) == 0 or rsp.get("Code", None) == 0):
                 logger.debug(
                     f"\nmethod: {method}, \nurl: {url}, \ncost time: {tt}, \nheader: {headers}, \npayload: {data}, \nresponse: {str_response}")
 
@@ -90,6 +95,10 @@ def logger_request_response(response, url, tt, headers, data, str_data, str_resp
             f"method: \nmethod: {method}, \nurl: {url}, \ncost time: {tt}, \nheader: {headers}, \npayload: {data}, \nresponse: {response.text}, \nerror: {e}")
 
 
+def truncate_text(text):
+    return text[:200] + '...' + text[-200:] if len(text) > 400 else text
+
+
 class Requests():
     uuid = str(uuid.uuid1())
     api_key = None
@@ -121,60 +130,54 @@ class Requests():
         return headers
 
     # retry when request failed caused by network or server error
+    # every thread sends the requests through its own pooled session, so the connections are kept alive
 
-    @retry(retry=retry_if_exception_type(ConnectionError), stop=stop_after_attempt(3))
-    def post(self, url, headers=None, data=None, params=None):
+    def _send(self, method, url, headers=None, data=None, params=None):
         headers = headers if headers is not None else self.update_headers()
-        data = json.dumps(data)
-        str_data = data[:200] + '...' + data[-200:] if len(data) > 400 else data
+        # serialize the payload once
+        body = json.dumps(data)
+        str_data = truncate_text(body)
+        kwargs = {"headers": headers, "params": params}
+        if not (method == "get" and body == "null"):
+            kwargs["data"] = body
         t0 = time.time()
-        response = requests.post(url, headers=headers, data=data, params=params)
+        response = get_session().request(method, url, **kwargs)
         tt = time.time() - t0
-        str_response = response.text[:200] + '...' + response.text[-200:] if len(response.text) > 400 else response.text
-        logger_request_response(response, url, tt, headers, data, str_data, str_response, "post", params=params)
+        cache_json(response)
+        str_response = truncate_text(response.text)
+        logger_request_response(response, url, tt, headers, data, str_data, str_response, method, params=params)
         return response
 
+    @retry(retry=retry_if_exception_type(ConnectionError), stop=stop_after_attempt(3))
+    def post(self, url, headers=None, data=None, params=None):
+        return self._send("post", url, headers=headers, data=data, params=params)
+
     @retry(retry=retry_if_exception_type(ConnectionError), stop=stop_after_attempt(3))
     def get(self, url, headers=None, params=None, data=None):
-        headers = headers if headers is not None else self.update_headers()
-        data = json.dumps(data)
-        str_data = data[:200] + '...' + data[-200:] if len(data) > 400 else data
-        t0 = time.time()
-        if data is None or data == "null":
-            response = requests.get(url, headers=headers, params=params)
-        else:
-            response = requests.get(url, headers=headers, params=params, data=data)
-        tt = time.time() - t0
-        str_response = response.text[:200] + '...' + response.text[-200:] if len(response.text) > 400 else response.text
-        logger_request_response(response, url, tt, headers, data, str_data, str_response, "get", params=params)
-        return response
+        return self._send("get", url, headers=headers, data=data, params=params)
 
     @retry(retry=retry_if_exception_type(ConnectionError), stop=stop_after_attempt(3))
     def put(self, url, headers=None, data=None):
-        headers = headers if headers is not None else self.update_headers()
-        data = json.dumps(data)
-        str_data = data[:200] + '...' + data[-200:] if len(data) > 400 else data
-        t0 = time.time()
-        response = requests.put(url, headers=headers, data=data)
-        tt = time.time() - t0
-        str_response = response.text[:200] + '...' + response.text[-200:] if len(response.text) > 400 else response.text
-        logger_request_response(response, url, tt, headers, data, str_data, str_response, "put")
-        return response
+        return self._send("put", url, headers=headers, data=data)
 
     @retry(retry=retry_if_exception_type(ConnectionError), stop=stop_after_attempt(3))
     def delete(self, url, headers=None, data=None):
+        return self._send("delete", url, headers=headers, data=data)
+
+    def post_concurrently(self, url, payloads, headers=None, concurrency=DEFAULT_CONCURRENCY):
+        """
+        Post the payloads to url concurrently with the async transport,
+        return the responses in the order of payloads, a failed request returns its exception
+        """
         headers = headers if headers is not None else self.update_headers()
-        data = json.dumps(data)
-        str_data = data[:200] + '...' + data[-200:] if len(data) > 400 else data
-        t0 = time.time()
-        response = requests.delete(url, headers=headers, data=data)
-        tt = time.time() - t0
-        str_response = response.text[:200] + '...' + response.text[-200:] if len(response.text) > 400 else response.text
-        logger_request_response(response, url, tt, headers, data, str_data, str_response, "delete")
-        return response
+        transport = AsyncTransport(headers=headers, concurrency=concurrency)
+        return transport.run([{"method": "POST", "url": url, "data": payload} for payload in payloads])
 
 
 class VectorClient(Requests):
+    # seconds to wait before a read so that the data written just before is visible, set it to 0 for load tests
+    read_wait = 1
+
     def __init__(self, endpoint, token):
         super().__init__(url=endpoint, api_key=token)
         self.endpoint = endpoint
@@ -194,8 +197,12 @@ class VectorClient(Requests):
         }
         return headers
 
+    def wait_before_read(self):
+        if self.read_wait > 0:
+            time.sleep(self.read_wait)
+
     def vector_search(self, payload, db_name="default", timeout=10):
-        time.sleep(1)
+        self.wait_before_read()
         url = f'{self.endpoint}/v2/vectordb/entities/search'
         if self.db_name is not None:
             payload["dbName"] = self.db_name
@@ -220,7 +227,7 @@ class VectorClient(Requests):
         return response.json()
 
     def vector_advanced_search(self, payload, db_name="default", timeout=10):
-        time.sleep(1)
+        self.wait_before_read()
         url = f'{self.endpoint}/v2/vectordb/entities/advanced_search'
         if self.db_name is not None:
             payload["dbName"] = self.db_name
@@ -245,7 +252,7 @@ class VectorClient(Requests):
         return response.json()
 
     def vector_hybrid_search(self, payload, db_name="default", timeout=10):
-        time.sleep(1)
+        self.wait_before_read()
         url = f'{self.endpoint}/v2/vectordb/entities/hybrid_search'
         if self.db_name is not None:
             payload["dbName"] = self.db_name
@@ -270,7 +277,7 @@ class VectorClient(Requests):
         return response.json()
 
     def vector_query(self, payload, db_name="default", timeout=5):
-        time.sleep(1)
+        self.wait_before_read()
         url = f'{self.endpoint}/v2/vectordb/entities/query'
         if self.db_name is not None:
             payload["dbName"] = self.db_name
@@ -295,7 +302,7 @@ class VectorClient(Requests):
         return response.json()
 
     def vector_get(self, payload, db_name="default"):
-        time.sleep(1)
+        self.wait_before_read()
         url = f'{self.endpoint}/v2/vectordb/entities/get'
         if self.db_name is not None:
             payload["dbName"] = self.db_name
@@ -1032,19 +1039,27 @@ class ImportJobClient(Requests):
         res = response.json()
         return res
 
-    def wait_import_job_completed(self, job_id):
-        finished = False
-        t0 = time.time()
-        rsp = self.get_import_job_progress(job_id)
-        while not finished:
-            rsp = self.get_import_job_progress(job_id)
-            if rsp['data']['state'] == "Completed":
-                finished = True
-            time.sleep(5)
-            if time.time() - t0 > 120:
-                break
+    def orchestrator(self, db_name="default", timeout=DEFAULT_IMPORT_TIMEOUT, **kwargs):
+        """ Import jobs of db_name submitted concurrently and polled with adaptive backoff """
+        return ImportJobOrchestrator(
+            submit=lambda payload: self.create_import_jobs(payload, db_name=db_name)["data"]["jobId"],
+            get_progress=lambda job_id: restful_progress(self.get_import_job_progress(job_id, db_name=db_name)),
+            timeout=timeout, log=logger, **kwargs)
+
+    def wait_import_job_completed(self, job_id, timeout=DEFAULT_IMPORT_TIMEOUT):
+        record = ImportJobRecord(job_id)
+        finished = self.orchestrator(timeout=timeout).wait([record])
+        logger.info(f"import job {job_id}: {record.to_dict()}")
+        last_progress = record.last_progress
+        rsp = last_progress.raw if last_progress is not None and last_progress.raw is not None \
+            else self.get_import_job_progress(job_id)
         return rsp, finished
 
+    def run_import_jobs(self, payloads, db_name="default", timeout=DEFAULT_IMPORT_TIMEOUT, workers=8):
+        """ Create the import jobs concurrently and wait for them, return (all completed, job records) """
+        return self.orchestrator(db_name=db_name, timeout=timeout, workers=workers).run(
+            payloads, names=[p.get("collectionName") for p in payloads])
+
 
 class DatabaseClient(Requests):
     def __init__(self, endpoint, token):
@@ -1116,7 +1131,8 @@ class DatabaseClient(Requests):
 
 class StorageClient():
 
-    def __init__(self, endpoint, access_key, secret_key, bucket_name, root_path="file"):
+    def __init__(self, endpoint, access_key, secret_key, bucket_name, root_path="file", workers=DEFAULT_WORKERS,
+                 part_size=DEFAULT_PART_SIZE):
         self.endpoint = endpoint
         self.access_key = access_key
         self.secret_key = secret_key
@@ -1128,13 +1144,22 @@ class StorageClient():
             secret_key=secret_key,
             secure=False,
         )
+        self.transfer_manager = TransferManager(self.client, bucket_name, workers=workers, part_size=part_size,
+                                                log=logger)
 
-    def upload_file(self, file_path, object_name):
+    def upload_file(self, file_path, object_name, force=False):
         try:
-            self.client.fput_object(self.bucket_name, object_name, file_path)
+            self.transfer_manager.upload_file(file_path, object_name, force=force)
         except S3Error as exc:
             logger.error("fail to copy files to minio", exc)
 
+    def upload_files(self, files, force=False):
+        """
+        Upload files concurrently, files is a list of (file_path, object_name)
+        return the TransferStats with progress and throughput, raise TransferError if any file failed
+        """
+        return self.transfer_manager.upload_files(files, force=force)
+
     def copy_file(self, src_bucket, src_object, dst_bucket, dst_object):
         try:
             # if dst bucket not exist, create it
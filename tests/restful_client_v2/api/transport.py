@@ -0,0 +1,108 @@
+import json
+import asyncio
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from utils.util_log import test_log as logger
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+"""
+Transport of the RESTful client:
+    a requests.Session with a pooled HTTPAdapter for every thread, so connections are kept alive between calls,
+    an httpx.AsyncClient based transport to issue many requests concurrently from one thread.
+The payload is serialized once by the caller and the json of a response is parsed once and cached.
+"""
+
+POOL_CONNECTIONS = 16
+POOL_MAXSIZE = 64
+DEFAULT_CONCURRENCY = 32
+DEFAULT_TIMEOUT = 120
+
+_local = threading.local()
+
+
+def new_session(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session():
+    """ The session of the current thread, requests.Session is not safe to share between threads """
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = new_session()
+    return session
+
+
+def close_session():
+    session = getattr(_local, "session", None)
+    if session is not None:
+        session.close()
+        _local.session = None
+
+
+def dumps_payload(data):
+    """ Serialize the payload once, None is sent without body """
+    if data is None:
+        return None
+    if isinstance(data, (str, bytes)):
+        return data
+    return json.dumps(data)
+
+
+def cache_json(response):
+    """
+    Parse the json of the response once, later response.json() calls return the same object,
+    a response which is not json keeps the original json() so that it raises as before
+    """
+    try:
+        body = response.json()
+    except ValueError:
+        return response
+    response.json = lambda **kwargs: body
+    return response
+
+
+class AsyncTransport:
+    """
+    Issue requests concurrently with httpx.AsyncClient,
+    the responses have the same text/status_code/json() interface as requests.Response
+    """
+
+    def __init__(self, headers=None, concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT):
+        if httpx is None:
+            raise Exception("httpx is required by the async transport, please install it: pip install httpx")
+        self.headers = headers or {}
+        self.concurrency = concurrency
+        self.timeout = timeout
+
+    async def _request(self, client, semaphore, method, url, data=None, params=None, headers=None):
+        async with semaphore:
+            response = await client.request(method, url, content=dumps_payload(data), params=params,
+                                            headers=headers if headers is not None else self.headers)
+        return cache_json(response)
+
+    async def _gather(self, calls):
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        async with httpx.AsyncClient(limits=limits, timeout=self.timeout) as client:
+            tasks = [self._request(client, semaphore, **call) for call in calls]
+            return await asyncio.gather(*tasks, return_exceptions=True)
+
+    def run(self, calls):
+        """
+        :param calls: list of dict with method, url and optional data, params, headers
+        :return: responses in the order of calls, a failed call returns its exception
+        """
+        responses = asyncio.run(self._gather(calls))
+        failed = sum(1 for r in responses if isinstance(r, Exception))
+        if failed:
+            logger.warning(f"{failed} of {len(calls)} async requests failed")
+        return responses
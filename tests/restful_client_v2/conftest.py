@@ -1,6 +1,13 @@
+import os
+import sys
 import pytest
 import yaml
 
+# common.import_jobs and common.transfer_manager of the python client tests are shared, not copied,
+# they only depend on pymilvus and minio and take the logger of this suite, see python_client/common/__init__.py,
+# appended so that utils, base and api still resolve to this suite
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python_client"))
+
 
 def pytest_addoption(parser):
     parser.addoption("--endpoint", action="store", default="http://127.0.0.1:19530", help="endpoint")